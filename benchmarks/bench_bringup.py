@@ -0,0 +1,47 @@
+"""Time for a topology to converge: every switch and link announced and
+every bring-up burst acknowledged by its barrier.
+
+Usage: python benchmarks/bench_bringup.py [switches ...]
+"""
+import sys
+import time
+
+import networkx as nx
+
+from fakes import build_datapaths, switch_enter, link_add, barrier_replies
+
+from controller import Controller  # noqa: E402
+
+SIZES = (10, 100, 500, 1000)
+
+
+def converge(switches: int):
+    graph = nx.connected_watts_strogatz_graph(switches, 4, 0.1, seed=1)
+    dps, links = build_datapaths(graph)
+    app = Controller()
+
+    start = time.perf_counter()
+    for dp in dps.values():
+        app.new_switch(switch_enter(dp))
+    for src, dst in links:
+        app.new_link(link_add(src, dst))
+    for dp in dps.values():
+        for ev in barrier_replies(dp):
+            app.barrier_reply(ev)
+    elapsed = time.perf_counter() - start
+
+    flow_mods = sum(isinstance(msg, dp.ofproto_parser.OFPFlowMod)
+                    for dp in dps.values() for msg in dp.sent)
+    messages = sum(len(dp.sent) for dp in dps.values())
+    return elapsed, messages, flow_mods, app.flow_queue.deduplicated
+
+
+def main(*sizes: int):
+    print(f"{'switches':>8} {'converge s':>11} {'messages':>9} {'flowmods':>9} {'deduped':>8}")
+    for switches in sizes or SIZES:
+        elapsed, messages, flow_mods, deduped = converge(switches)
+        print(f"{switches:>8} {elapsed:>11.3f} {messages:>9} {flow_mods:>9} {deduped:>8}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
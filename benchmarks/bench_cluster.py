@@ -0,0 +1,164 @@
+"""PacketIn throughput of a controller cluster against its member count.
+
+Every member is a separate process running the Controller in cluster mode
+against the same fake topology. It announces every switch, but only the
+links whose LLDP frame arrives at a switch it owns and only the hosts of
+those switches; it learns the rest from the other members over the cluster
+bus. Once all members have the full view they are started together and each
+handles the PacketIns of the hosts on its own switches, every packet
+reaching the controller.
+
+Each member is pinned to a core of its own while there are enough of them,
+and the wall clock rate, events over the slowest member's run, is the
+result. With fewer cores than members they share them and the wall clock
+rate cannot grow with members: the run says so, and the rate bounded by the
+busiest member's CPU time is then only an estimate of what one core per
+member would give, not a measurement.
+
+Usage: python benchmarks/bench_cluster.py [packets [members ...]]
+"""
+import json
+import os
+import random
+import select
+import subprocess
+import sys
+import tempfile
+import time
+
+from ryu.lib import hub
+
+from fakes import switch_enter, link_add, packet_in, arp_frame
+from harness import Harness, GATEWAY, MATRICES
+
+import config  # noqa: E402
+from min_env import topologies  # noqa: E402
+
+TOPOLOGY = ("fat-tree-8", lambda: topologies.fat_tree(8))
+MEMBERS = (1, 2, 4)
+# Seconds members get to exchange links and hosts before giving up.
+CONVERGE_TIMEOUT = 60.0
+
+
+def converge(done, timeout: float = CONVERGE_TIMEOUT):
+    """Let the cluster bus run until done() holds"""
+    end = time.time() + timeout
+    while not done():
+        if time.time() > end:
+            raise RuntimeError("cluster did not converge")
+        hub.sleep(0.01)
+
+
+def cores() -> list:
+    return sorted(os.sched_getaffinity(0))
+
+
+def pin(index: int):
+    """Run on a core of its own, shared round robin once there are more
+    members than cores"""
+    available = cores()
+    os.sched_setaffinity(0, {available[index % len(available)]})
+
+
+def join(members: int, index: int, directory: str) -> Harness:
+    """Member index of a cluster of members on its own core, once it has
+    the links and hosts of every member"""
+    pin(index)
+    config.CLUSTER_MEMBERS = members
+    config.CLUSTER_INDEX = index
+    config.CLUSTER_DIR = directory
+    harness = Harness(TOPOLOGY[1]())
+    app = harness.app
+    if app.cluster is not None:
+        # The harness stops the controller's threads, the bus has to run.
+        app.cluster.start()
+
+    for dp in harness.dps.values():
+        harness.fire("new_switch", app.new_switch, switch_enter(dp))
+    for src, dst in harness.links:
+        # LLDP sent out of src is seen by the master of dst, and back.
+        if app.owns(dst.dpid):
+            harness.fire("new_link", app.new_link, link_add(src, dst))
+        if app.owns(src.dpid):
+            harness.fire("new_link", app.new_link, link_add(dst, src))
+    converge(lambda: sum(1 for _ in app.graph.links()) == len(harness.links))
+    harness.settle()
+    harness.acknowledge()
+    for ip, (dp, port_no) in harness.hosts.items():
+        if app.owns(dp.id):
+            harness.fire("arp", app.packet_in, packet_in(dp, port_no, arp_frame(ip, GATEWAY)))
+    converge(lambda: len(app.ip_to_dpid) == len(harness.hosts))
+    harness.acknowledge()
+    return harness
+
+
+def ready():
+    """Tell run the member is up and wait until every member is"""
+    print("ready", flush=True)
+    # Green select, the bus keeps serving the members still converging.
+    select.select([sys.stdin], [], [])
+    sys.stdin.readline()
+
+
+def member(members: int, index: int, directory: str, packets: int):
+    harness = join(members, index, directory)
+    app = harness.app
+    hosts = list(harness.hosts)
+    pairs = [(src, dst) for src, dst in MATRICES["uniform"](hosts, packets, random.Random(1))
+             if app.owns(harness.hosts[src][0].id)]
+    ready()
+    wall, cpu = time.perf_counter(), time.process_time()
+    harness.send(pairs, flow_table=False)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(json.dumps({"index": index, "events": len(pairs), "wall": wall, "cpu": cpu,
+                      "facts": app.cluster.received if app.cluster else 0}), flush=True)
+
+
+def run(members: int, *args, script: str = __file__):
+    """Start members processes of script, all at once when they are ready,
+    and collect the JSON line each prints at the end"""
+    with tempfile.TemporaryDirectory() as directory:
+        procs = [subprocess.Popen([sys.executable, script, "--member", str(members), str(index),
+                                   directory, *map(str, args)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for index in range(members)]
+        for proc in procs:
+            if proc.stdout.readline().strip() != "ready":
+                raise RuntimeError("cluster member failed to start")
+        for proc in procs:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        results = [json.loads(proc.stdout.readline()) for proc in procs]
+        for proc in procs:
+            proc.wait()
+    return results
+
+
+def main(packets: int = 20000, *members: int):
+    members = members or MEMBERS
+    available = len(cores())
+    if available < max(members):
+        print(f"only {available} core(s) for up to {max(members)} members: members share "
+              f"cores, so wall ev/s cannot scale with members here and cpu-bound ev/s is an "
+              f"estimate from CPU time, not a measurement")
+    print(f"{'topology':>12} {'members':>7} {'cores':>5} {'events':>7} {'facts':>6} "
+          f"{'wall ev/s':>10} {'speedup':>8} {'cpu-bound ev/s':>14}")
+    single = None
+    for count in members:
+        results = run(count, packets)
+        events = sum(r["events"] for r in results)
+        wall = events / max(r["wall"] for r in results)
+        bound = events / max(r["cpu"] for r in results)
+        single = single or wall
+        print(f"{TOPOLOGY[0]:>12} {count:>7} {min(count, available):>5} {events:>7} "
+              f"{sum(r['facts'] for r in results):>6} {wall:>10.0f} {wall / single:>7.2f}x "
+              f"{bound:>14.0f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--member"]:
+        hub.patch(thread=False)
+        count, index, directory, packets = sys.argv[2:]
+        member(int(count), int(index), directory, int(packets))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,98 @@
+"""Controller benchmark suite on generated topologies, no Mininet needed.
+
+For every topology the harness brings up the switches and links, lets every
+host ARP once, then replays traffic matrices as PacketIns. Packets the
+installed flows would forward do not reach the controller (skipped), the
+no-flows run sends all of them to measure the PacketIn path itself. Each
+topology runs REPEATS times with the same traffic and keeps the fastest run
+of every phase.
+
+Results are written to a JSON file when one is given. With a baseline file
+the run fails when a handler sends more messages per event than in the
+baseline, or, for phases of at least MIN_EVENTS events, got more than
+TOLERANCE slower.
+
+Usage: python benchmarks/bench_controller.py [results.json [baseline.json]]
+"""
+import json
+import random
+import sys
+
+from harness import Harness, MATRICES
+
+from min_env import topologies  # noqa: E402
+
+PACKETS = 20000
+REPEATS = 3  # runs per topology, the fastest of each phase is kept
+TOLERANCE = 0.3  # relative drop in events/s still accepted
+MIN_EVENTS = 1000  # fewer events are too noisy to compare timings
+
+SUITE = (
+    ("fat-tree-4", lambda: topologies.fat_tree(4)),
+    ("fat-tree-8", lambda: topologies.fat_tree(8)),
+    ("leaf-spine-4x32", lambda: topologies.leaf_spine(4, 32, 8)),
+    ("waxman-200", lambda: topologies.waxman(200, beta=0.2, alpha=0.1)),
+)
+
+
+def run(spec) -> dict:
+    rnd = random.Random(1)
+    harness = Harness(spec)
+    harness.bring_up()
+    harness.learn_hosts()
+    hosts = list(harness.hosts)
+    for name, matrix in MATRICES.items():
+        harness.app.flows.clear()
+        harness.send(matrix(hosts, PACKETS, rnd), f"packet_in/{name}")
+    harness.app.flows.clear()
+    harness.send(MATRICES["uniform"](hosts, PACKETS, rnd), "packet_in/no-flows", flow_table=False)
+    return harness.report()
+
+
+def best(runs) -> dict:
+    """Per phase the run with the highest throughput, same traffic in all of them"""
+    return {phase: max((r[phase] for r in runs), key=lambda report: report["events_per_s"])
+            for phase in runs[0]}
+
+
+def regressions(results: dict, baseline: dict):
+    for topology, phases in results.items():
+        for phase, report in phases.items():
+            before = baseline.get(topology, {}).get(phase)
+            if before is None:
+                continue
+            if (report["events"] >= MIN_EVENTS
+                    and report["events_per_s"] < before["events_per_s"] * (1 - TOLERANCE)):
+                yield (f"{topology} {phase}: {report['events_per_s']:.0f} events/s, "
+                       f"was {before['events_per_s']:.0f}")
+            if report["messages_per_event"] > before["messages_per_event"] + 1e-9:
+                yield (f"{topology} {phase}: {report['messages_per_event']:.2f} messages/event, "
+                       f"was {before['messages_per_event']:.2f}")
+
+
+def main(output: str = None, baseline: str = None):
+    results = {}
+    print(f"{'topology':>16} {'phase':>22} {'events':>7} {'events/s':>9} {'p50 us':>8} "
+          f"{'p99 us':>8} {'msgs/ev':>8} {'skipped':>8}")
+    for topology, build in SUITE:
+        spec = build()
+        results[topology] = best([run(spec) for _ in range(REPEATS)])
+        for phase, r in results[topology].items():
+            print(f"{topology:>16} {phase:>22} {r['events']:>7} {r['events_per_s']:>9.0f} "
+                  f"{r['p50_us']:>8.1f} {r['p99_us']:>8.1f} {r['messages_per_event']:>8.2f} "
+                  f"{r['skipped']:>8}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if baseline:
+        with open(baseline) as f:
+            found = list(regressions(results, json.load(f)))
+        for line in found:
+            print("regression:", line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,89 @@
+"""Host discovery time and probe count for large host populations.
+
+Hosts answer probes immediately, so the time measured is the controller's own
+cost of sweeping and learning. The legacy column is what the fixed sweep of
+10.0.0.1-19 on every live port would have sent.
+
+Usage: python benchmarks/bench_discovery.py [switches] [hosts]
+"""
+import ipaddress
+import random
+import socket
+import sys
+import time
+
+import networkx as nx
+
+from fakes import (FakeDatapath, FakePort, build_datapaths, switch_enter, link_add,
+                   packet_in, arp_frame)
+
+import utils  # noqa: E402
+from controller import Controller  # noqa: E402
+from discovery import HostDiscovery  # noqa: E402
+
+
+class Responder:
+    """Turns probes leaving a host port into ARP replies from that host"""
+
+    def __init__(self, app, hosts):
+        self.app = app
+        self.hosts = hosts  # (dpid, port_no) -> ip
+        self.replies = []
+
+    def watch(self, dp: FakeDatapath):
+        send = dp.send_msg
+
+        def send_msg(msg):
+            send(msg)
+            if isinstance(msg, dp.ofproto_parser.OFPPacketOut) and msg.data:
+                target = socket.inet_ntoa(bytes(msg.data[38:42]))
+                for action in msg.actions:
+                    if self.hosts.get((dp.id, action.port)) == target:
+                        frame = arp_frame(target, utils.PROBE_IP, reply_to=utils.PROBE_MAC)
+                        self.replies.append(packet_in(dp, action.port, frame))
+        dp.send_msg = send_msg
+
+
+def main(switches: int = 100, hosts: int = 2000):
+    rnd = random.Random(1)
+    graph = nx.connected_watts_strogatz_graph(switches, 4, 0.1, seed=1)
+    dps, links = build_datapaths(graph)
+    subnet = f"10.0.0.0/{32 - (hosts + 2).bit_length()}"
+    addresses = [str(ip) for ip in ipaddress.ip_network(subnet).hosts()
+                 if str(ip) != utils.PROBE_IP][:hosts]
+
+    app = Controller()
+    app.discovery = HostDiscovery(app.ip_to_dpid, app.edge_ports, subnets=[subnet], rounds=0)
+    responder = Responder(app, {})
+    for ip in addresses:
+        dp = dps[rnd.choice(list(dps))]
+        port = FakePort(dp.id, len(dp.ports) + 1)
+        dp.ports[port.port_no] = port
+        responder.hosts[(dp.id, port.port_no)] = ip
+
+    legacy = sum(len(dp.ports) for dp in dps.values()) * 19
+    for dp in dps.values():
+        app.new_switch(switch_enter(dp))
+        responder.watch(dp)
+    for src, dst in links:
+        app.new_link(link_add(src, dst))
+
+    start = time.perf_counter()
+    rounds = 0
+    while not app.discovery.done() and rounds < 3:
+        rounds += 1
+        for dp in dps.values():
+            app.discovery.sweep(dp)
+            for ev in responder.replies:
+                app.packet_in(ev)
+            responder.replies.clear()
+    elapsed = time.perf_counter() - start
+
+    report = app.discovery.report()
+    print(f"switches={switches} hosts={hosts} rounds={rounds} time={elapsed:.3f}s "
+          f"learned={report['learned']}/{report['targets']} probes={report['messages']} "
+          f"legacy_probes={legacy}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
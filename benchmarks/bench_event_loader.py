@@ -0,0 +1,141 @@
+"""Startup time and peak memory of loading an event file: the JSON list
+loader Emulation used before (json.load, then every event into the heap)
+vs. streaming a JSON Lines file through EventFeeder.
+
+Each run is a separate interpreter so peak RSS is its own. After start-up
+the whole file is dispatched on a simulated clock to check that
+streaming stays bounded while running too.
+
+Usage: python benchmarks/bench_event_loader.py [events ...]
+"""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from min_env.events import EventFeeder, event_handlers, read_events  # noqa: E402
+from min_env.minished import scheduler  # noqa: E402
+
+SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+# Events per second of emulated time.
+RATE = 100
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Target:
+    """Stands in for Emulation"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def iperf(self, **kwargs):
+        self.calls += 1
+
+    def test_network(self, **kwargs):
+        self.calls += 1
+
+
+def submit(scheduled, action, kwargs):
+    action(**kwargs)
+
+
+def debug(message):
+    pass
+
+
+def legacy(path, s, target):
+    """Emulation.load_events as it was"""
+    json_events = json.load(open(path))
+    for event in json_events:
+        event_type = event['type']
+        if 'bunch' in event_type:
+            getattr(target, event_type)(event)
+            continue
+        debug("processing event: time "
+              "{time}, type {type}, params {params}\n".format(**event))
+        s.enter(event['time'], 1, getattr(target, event_type),
+                kwargs=event['params'])
+
+
+def streaming(path, s, target):
+    EventFeeder(s, read_events(path), event_handlers(target), submit).start()
+
+
+def write_files(directory, events):
+    rnd = random.Random(1)
+    hosts = ['h{}'.format(h) for h in range(1, 11)]
+    rows = []
+    for i in range(events):
+        src, dst = rnd.sample(hosts, 2)
+        rows.append({'time': i / RATE, 'type': 'iperf',
+                     'params': {'src': src, 'dst': dst, 'protocol': 'UDP',
+                                'duration': 10, 'bw': 100000}})
+    listing = os.path.join(directory, 'events.json')
+    lines = os.path.join(directory, 'events.jsonl')
+    with open(listing, 'w') as f:
+        json.dump(rows, f)
+    with open(lines, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    return listing, lines
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(loader, path):
+    clock = Clock()
+    s = scheduler(clock.time, clock.sleep)
+    target = Target()
+    base = peak_mb()
+    start = time.perf_counter()
+    LOADERS[loader](path, s, target)
+    startup = time.perf_counter() - start
+    startup_peak = peak_mb() - base
+    start = time.perf_counter()
+    s.run()
+    print(json.dumps({'startup': startup, 'startup_mb': startup_peak,
+                      'run': time.perf_counter() - start, 'run_mb': peak_mb() - base,
+                      'events': target.calls}))
+
+
+LOADERS = {'legacy': legacy, 'streaming': streaming}
+
+
+def main(*sizes: int):
+    print(f"{'events':>8} {'loader':>10} {'startup s':>10} {'startup MB':>11} "
+          f"{'run s':>7} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for events in sizes or SIZES:
+            listing, lines = write_files(directory, events)
+            for loader, path in (('legacy', listing), ('streaming', lines)):
+                out = subprocess.run([sys.executable, __file__, '--measure', loader, path],
+                                     capture_output=True, text=True, check=True)
+                r = json.loads(out.stdout)
+                assert r['events'] == events, r
+                print(f"{events:>8} {loader:>10} {r['startup']:>10.3f} {r['startup_mb']:>11.1f} "
+                      f"{r['run']:>7.2f} {r['run_mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,87 @@
+"""Event lateness with actions run inline vs. on a thread pool.
+
+Replays a synthetic event file through the min_env scheduler and
+EventExecutor. Actions sleep like the blocking parts of Emulation.iperf
+(telnet polling) and test_network (2 s server start-up) do, and record
+whether two actions ever ran on the same node at once.
+
+Usage: python benchmarks/bench_executor.py [events] [seconds]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from min_env.executor import EventExecutor  # noqa: E402
+from min_env.minished import scheduler  # noqa: E402
+
+HOSTS = ['h{}'.format(h) for h in range(1, 11)]
+WORKERS = (0, 4, 16, 64)
+
+
+class FakeNodes:
+    """Stands in for Emulation, counts overlapping commands per node"""
+
+    def __init__(self):
+        self.busy = set()
+        self.overlaps = 0
+        self.lock = threading.Lock()
+
+    def _hold(self, hosts, seconds):
+        with self.lock:
+            if self.busy & set(hosts):
+                self.overlaps += 1
+            self.busy.update(hosts)
+        time.sleep(seconds)
+        with self.lock:
+            self.busy.difference_update(hosts)
+
+    def iperf(self, src, dst, wait=0.5, **kwargs):
+        self._hold([src, dst], wait)
+
+    def test_network(self, hosts, **kwargs):
+        self._hold(hosts, 2)
+
+
+def make_events(rnd, count, seconds):
+    events = []
+    for _ in range(int(count)):
+        at = rnd.random() * seconds
+        if rnd.random() < 0.01:
+            events.append((at, 'test_network', {'hosts': rnd.sample(HOSTS, 3)}))
+        else:
+            src, dst = rnd.sample(HOSTS, 2)
+            events.append((at, 'iperf', {'src': src, 'dst': dst,
+                                         'wait': rnd.choice((0, 0, 0.01, 0.5))}))
+    return sorted(events)
+
+
+def run(events, workers):
+    nodes = FakeNodes()
+    executor = EventExecutor(workers, time.monotonic)
+    s = scheduler(time.monotonic, time.sleep)
+    start = time.monotonic() + 0.1
+    for at, name, params in events:
+        s.enterabs(start + at, 1, executor.submit,
+                   argument=(start + at, getattr(nodes, name), dict(params)))
+    s.run()
+    executor.join()
+    elapsed = time.monotonic() - start
+    executor.shutdown()
+    return executor.lateness(), nodes.overlaps, elapsed
+
+
+def main(count: int = 100, seconds: float = 10):
+    events = make_events(random.Random(1), count, seconds)
+    print(f"{'workers':>7} {'p50 s':>8} {'p99 s':>8} {'max s':>8} {'overlaps':>8} {'total s':>8}")
+    for workers in WORKERS:
+        late, overlaps, elapsed = run(events, workers)
+        print(f"{workers:>7} {late['p50']:>8.3f} {late['p99']:>8.3f} {late['max']:>8.3f} "
+              f"{overlaps:>8} {elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""Frames/s of the PacketIn classifier: full ryu.lib.packet decode vs. fastpath.parse.
+
+Usage: python benchmarks/bench_fastpath.py [frames]
+"""
+import sys
+import time
+
+from ryu.lib.packet import packet, ethernet, lldp
+from ryu.ofproto import ether
+
+from fakes import arp_frame, ipv4_frame
+
+import fastpath  # noqa: E402
+
+
+def lldp_frame() -> bytes:
+    p = packet.Packet()
+    p.add_protocol(ethernet.ethernet(lldp.LLDP_MAC_NEAREST_BRIDGE, '02:00:00:00:00:01',
+                                     ether.ETH_TYPE_LLDP))
+    p.add_protocol(lldp.lldp([
+        lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED, chassis_id=b'dpid:1'),
+        lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT, port_id=b'\x00\x01'),
+        lldp.TTL(ttl=120),
+        lldp.End(),
+    ]))
+    p.serialize()
+    return bytes(p.data)
+
+
+def legacy(data):
+    """What packet_in did before fastpath"""
+    pkt = packet.Packet(data)
+    eth_pkt = pkt.get_protocol(ethernet.ethernet)
+    if eth_pkt.ethertype == ether.ETH_TYPE_LLDP:
+        return None
+    return pkt
+
+
+def rate(func, frames):
+    start = time.perf_counter()
+    for data in frames:
+        func(data)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main(count: int = 100000):
+    mixes = {
+        "ipv4": [ipv4_frame('10.0.0.1', '10.0.0.2')],
+        "arp": [arp_frame('10.0.0.1', '10.0.0.2')],
+        "lldp": [lldp_frame()],
+    }
+    mixes["mixed"] = mixes["ipv4"] * 6 + mixes["arp"] * 2 + mixes["lldp"] * 2
+    print(f"{'frames':>6} {'ryu f/s':>10} {'full f/s':>10} {'fast f/s':>10} {'speedup':>8}")
+    for name, mix in mixes.items():
+        frames = (mix * (count // len(mix) + 1))[:count]
+        old = rate(legacy, frames)
+        full = rate(fastpath.parse_full, frames)
+        fast = rate(fastpath.parse, frames)
+        print(f"{name:>6} {old:>10.0f} {full:>10.0f} {fast:>10.0f} {fast / old:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,67 @@
+"""PacketIn throughput with instrumentation off, on, and on with the
+sampling profiler running.
+
+Instrumentation is fixed when the controller is imported, so every mode
+runs in its own interpreter.
+
+Usage: python benchmarks/bench_instrumentation.py [events]
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+SWITCHES = 100
+HOSTS_PER_SWITCH = 5
+MODES = {
+    "off": {},
+    "on": {"WHY_SO_INSTRUMENTATION": "1"},
+    "on+profiler": {"WHY_SO_INSTRUMENTATION": "1", "WHY_SO_PROFILER": "1"},
+}
+
+
+def measure(events: int):
+    import networkx as nx
+    from harness import Harness, MATRICES
+    from instrumentation import registry
+
+    harness = Harness(nx.connected_watts_strogatz_graph(SWITCHES, 4, 0.1, seed=1),
+                      hosts_per_switch=HOSTS_PER_SWITCH)
+    harness.bring_up()
+    harness.learn_hosts()
+    app = harness.app
+    pairs = MATRICES["uniform"](list(harness.hosts), events, random.Random(1))
+    start = time.perf_counter()
+    harness.send(pairs, flow_table=False)
+    elapsed = time.perf_counter() - start
+    registry.profiler.stop()
+    snapshot = app.instrumentation_snapshot()
+    print(json.dumps({"rate": events / elapsed,
+                      "packet_in": snapshot["handlers"].get("packet_in"),
+                      "hotspots": registry.profiler.top(3)}))
+
+
+def main(events: int = 20000):
+    print(f"{'mode':>12} {'events/s':>9} {'overhead':>9} {'p50 us':>7} {'p99 us':>7}")
+    baseline = None
+    for mode, env in MODES.items():
+        out = subprocess.run(
+            [sys.executable, __file__, "--measure", str(events)],
+            env=dict(os.environ, **env), capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        rate = result["rate"]
+        baseline = baseline or rate
+        handler = result["packet_in"] or {}
+        print(f"{mode:>12} {rate:>9.0f} {baseline / rate - 1:>8.1%} "
+              f"{handler.get('p50_us', 0):>7.0f} {handler.get('p99_us', 0):>7.0f}")
+        if result["hotspots"]:
+            print(f"{'':>12} hotspots: {result['hotspots']}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--measure"]:
+        measure(int(sys.argv[2]))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""PacketIn handling rate with per-packet Dijkstra vs. PathCache.
+
+The harness brings up a Watts-Strogatz topology of fake datapaths with one
+host per switch, every host ARPs once, then PacketIns between a fixed set
+of hot host pairs go through the controller's packet_in handler, every one
+reaching the controller. The per-packet Dijkstra run swaps the controller's
+PathCache for nx.shortest_path on the same graph, as the controller routed
+before the cache, so the rates compare whole PacketIn handling: parsing,
+routing, actions and the messages sent.
+
+Usage: python benchmarks/bench_path_cache.py [packets]
+"""
+import random
+import sys
+
+import networkx as nx
+
+from harness import Harness
+
+import utils  # noqa: E402
+
+SIZES = (10, 100, 1000)
+HOT_PAIRS = 200
+
+
+class Dijkstra:
+    """Stands in for PathCache, one shortest path search per PacketIn"""
+
+    def __init__(self, graph: nx.Graph):
+        self.graph = graph
+
+    def get(self, src: int, dst: int):
+        return utils.get_shortest_path(self.graph, src, dst)
+
+
+def rate(harness: Harness, pairs, name: str) -> float:
+    harness.app.flows.clear()
+    harness.send(pairs, name, flow_table=False)
+    return harness.get_phase(name).report()["events_per_s"]
+
+
+def main(packets: int = 20000):
+    rnd = random.Random(1)
+    print(f"{'switches':>8} {'old pkt/s':>12} {'cached pkt/s':>13} {'speedup':>8}")
+    for switches in SIZES:
+        harness = Harness(nx.connected_watts_strogatz_graph(switches, 4, 0.1, seed=1))
+        harness.bring_up()
+        harness.learn_hosts()
+        hosts = list(harness.hosts)
+        hot = [tuple(rnd.sample(hosts, 2)) for _ in range(HOT_PAIRS)]
+        pairs = [rnd.choice(hot) for _ in range(packets)]
+
+        app = harness.app
+        cache = app.paths
+        app.paths = Dijkstra(app.graph.to_networkx())
+        old = rate(harness, pairs, "packet_in/dijkstra")
+        app.paths = cache
+        new = rate(harness, pairs, "packet_in/cached")
+        print(f"{switches:>8} {old:>12.0f} {new:>13.0f} {new / old:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""Link failure recovery with and without fast-failover groups.
+
+Installs routes between random host pairs, then fails one link at a time.
+For the flows routed over the failed link it reports the share the data
+plane still delivers before the controller reacts (failover groups only),
+and after it reacted (rerouted ingress flows), next to the share that
+still has any path at all, with the controller's handling time and
+messages per failure. The link is restored before the
+next one fails.
+
+Usage: python benchmarks/bench_recovery.py [failures]
+"""
+import random
+import sys
+
+import networkx as nx
+
+from harness import Harness, MATRICES
+
+import config  # noqa: E402
+from min_env import topologies  # noqa: E402
+
+PAIRS = 2000
+
+SUITE = (
+    ("fat-tree-4", lambda: topologies.fat_tree(4)),
+    ("fat-tree-8", lambda: topologies.fat_tree(8)),
+    ("leaf-spine-4x16", lambda: topologies.leaf_spine(4, 16, 4)),
+    ("waxman-100", lambda: topologies.waxman(100, beta=0.3, alpha=0.15)),
+)
+
+
+def crosses(hops, link) -> bool:
+    return any(frozenset(pair) == link for pair in zip(hops, hops[1:]))
+
+
+def run(spec, failures: int, failover: bool):
+    config.FAST_FAILOVER = failover
+    rnd = random.Random(1)
+    harness = Harness(spec)
+    harness.bring_up()
+    harness.learn_hosts()
+    pairs = MATRICES["uniform"](list(harness.hosts), PAIRS, rnd)
+    harness.send(pairs)
+    pairs = sorted(set(pairs))
+
+    affected = before = after = reachable = 0
+    for src, dst in rnd.sample(harness.links, min(failures, len(harness.links))):
+        link = frozenset((src.dpid, dst.dpid))
+        paths = {pair: harness.trace(*pair) for pair in pairs}
+        hit = [pair for pair, hops in paths.items() if hops and crosses(hops, link)]
+        affected += len(hit)
+        graph = harness.app.graph.to_networkx()
+        graph.remove_edge(src.dpid, dst.dpid)
+        located = harness.app.ip_to_dpid
+        reachable += sum(nx.has_path(graph, located[a], located[b]) for a, b in hit)
+        before += sum(bool(harness.trace(*pair, dead={link})) for pair in hit)
+        harness.fail_link(src, dst)
+        after += sum(bool(harness.trace(*pair, dead={link})) for pair in hit)
+        harness.restore_link(src, dst)
+    return affected, reachable, before, after, harness
+
+
+def main(failures: int = 50):
+    print(f"{'topology':>16} {'failover':>8} {'groups':>7} {'affected':>8} {'reachable %':>11} "
+          f"{'dataplane %':>11} {'controller %':>12} {'handle us':>9} {'msgs':>6}")
+    for name, build in SUITE:
+        spec = build()
+        for failover in (False, True):
+            affected, reachable, before, after, harness = run(spec, failures, failover)
+            down = [harness.phases[phase] for phase in ("port_down", "link_delete")]
+            handle = sum(sum(phase.latency) for phase in down) / failures * 1e6
+            messages = sum(sum(phase.messages.values()) for phase in down) / failures
+            share = (lambda n: 100 * n / affected if affected else 100.0)
+            print(f"{name:>16} {str(failover):>8} {len(harness.app.failover):>7} {affected:>8} "
+                  f"{share(reachable):>11.1f} {share(before):>11.1f} {share(after):>12.1f} "
+                  f"{handle:>9.0f} {messages:>6.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,188 @@
+"""Replays recorded PacketIns against a controller cluster of growing size.
+
+A trace holds PacketIn messages as OpenFlow 1.4 bytes, each with the time
+it arrived and the switch it came from. It is recorded from a pcap taken on
+the hosts (tcpdump -w), every IPv4 frame sent by the switch of its source
+address, or from IPv4 frames between random host pairs at a given rate.
+
+The trace is replayed by 1, 2 and 4 cluster members, set up as in
+bench_cluster. The switches are sharded between them by datapath id, so
+each member replays the PacketIns of its own switches in trace order, and
+the PacketIns of one switch are handled in the order they arrived. Every
+member parses each message as ryu does and hands it to packet_in. Latency
+runs on a virtual clock per member, as in bench_storm: a PacketIn is handled
+when it arrives or when the previous one is done, whichever is later, and
+takes the CPU time its parsing and handling really took. The latency of a
+PacketIn runs from its arrival until its handler returned.
+
+The served rate, events over the last member's virtual finish, counts CPU
+time only and so holds for one core per member. The wall clock rate is
+measured, and only grows with members when they have cores of their own.
+
+Usage:
+    python benchmarks/bench_replay.py [packets [rate [members ...]]]
+    python benchmarks/bench_replay.py --record trace [packets [rate]] | --pcap trace pcap
+    python benchmarks/bench_replay.py --replay trace [members ...]
+"""
+import json
+import os
+import random
+import socket
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from typing import Iterator, Tuple
+
+from ryu.controller import ofp_event
+from ryu.lib import hub, pcaplib
+from ryu.lib.pack_utils import msg_pack_into
+from ryu.ofproto import ofproto_parser
+
+from bench_cluster import TOPOLOGY, MEMBERS, cores, join, ready, run
+from fakes import packet_in, ipv4_frame
+from harness import Harness, MATRICES
+
+# Arrival in seconds from the start of the trace and datapath id, then the
+# OpenFlow message, which carries its own length.
+RECORD = struct.Struct('!dQ')
+HEADER = struct.Struct('!BBHI')
+PACKETS = 20000
+# PacketIns per second offered, more than one member handles.
+RATE = 20000
+
+
+def encode(msg) -> bytes:
+    """OpenFlow bytes of an OFPPacketIn, ryu only parses them"""
+    ofproto = msg.datapath.ofproto
+    buf = bytearray()
+    msg_pack_into(ofproto.OFP_PACKET_IN_PACK_STR, buf, ofproto.OFP_HEADER_SIZE, msg.buffer_id,
+                  msg.total_len, msg.reason, msg.table_id, msg.cookie)
+    # The match is padded to 8 bytes, 2 more pad the frame.
+    offset = ofproto.OFP_PACKET_IN_SIZE - ofproto.OFP_MATCH_SIZE
+    offset += msg.match.serialize(buf, offset)
+    buf += bytes(2) + msg.data
+    msg_pack_into(ofproto.OFP_HEADER_PACK_STR, buf, 0, ofproto.OFP_VERSION,
+                  ofproto.OFPT_PACKET_IN, len(buf), msg.xid or 0)
+    return bytes(buf)
+
+
+def write(path: str, packets: Iterator[Tuple[float, object]]) -> int:
+    """Write (arrival, EventOFPPacketIn) to the trace at path, returns how many"""
+    count = 0
+    with open(path, 'wb') as f:
+        for arrival, ev in packets:
+            f.write(RECORD.pack(arrival, ev.msg.datapath.id))
+            f.write(encode(ev.msg))
+            count += 1
+    return count
+
+
+def read(path: str) -> Iterator[Tuple[float, int, bytes]]:
+    """(arrival, dpid, message) of every PacketIn in the trace at path"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        arrival, dpid = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        _, _, length, _ = HEADER.unpack_from(data, offset)
+        yield arrival, dpid, data[offset:offset + length]
+        offset += length
+
+
+def generated(harness: Harness, packets: int = PACKETS, rate: float = RATE):
+    """PacketIns between uniform random host pairs, Poisson arrivals at rate"""
+    rnd = random.Random(1)
+    arrival = 0.0
+    for src, dst in MATRICES["uniform"](list(harness.hosts), packets, rnd):
+        dp, port_no = harness.hosts[src]
+        yield arrival, packet_in(dp, port_no, ipv4_frame(src, dst))
+        arrival += rnd.expovariate(rate)
+
+
+def captured(harness: Harness, pcap: str):
+    """PacketIns of the IPv4 frames in pcap sent by hosts of the topology,
+    at the switch of their source"""
+    with open(pcap, 'rb') as f:
+        start = None
+        for timestamp, frame in pcaplib.Reader(f):
+            if frame[12:14] != b'\x08\x00':
+                continue
+            src = socket.inet_ntoa(frame[26:30])
+            if src not in harness.hosts:
+                continue
+            start = timestamp if start is None else start
+            dp, port_no = harness.hosts[src]
+            yield timestamp - start, packet_in(dp, port_no, frame)
+
+
+def member(members: int, index: int, directory: str, trace: str):
+    harness = join(members, index, directory)
+    app = harness.app
+    records = [(arrival, harness.dps[dpid], data) for arrival, dpid, data in read(trace)
+               if app.owns(dpid)]
+    ready()
+    finish = 0.0
+    latency = []
+    wall, cpu = time.perf_counter(), time.process_time()
+    for arrival, dp, data in records:
+        start = max(finish, arrival)
+        began = time.thread_time()
+        version, msg_type, length, xid = HEADER.unpack_from(data)
+        msg = ofproto_parser.msg(dp, version, msg_type, length, xid, data)
+        app.packet_in(ofp_event.EventOFPPacketIn(msg))
+        finish = start + time.thread_time() - began
+        latency.append(finish - arrival)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(json.dumps({"index": index, "events": len(records), "wall": wall, "cpu": cpu,
+                      "finish": finish, "latency": latency}), flush=True)
+
+
+def replay(trace: str, *members: int):
+    members = members or MEMBERS
+    records = list(read(trace))
+    duration = records[-1][0] if records else 0.0
+    print(f"{len(records)} PacketIns offered over {duration:.2f} s "
+          f"({len(records) / duration if duration else 0:.0f} per s)")
+    available = len(cores())
+    if available < max(members):
+        print(f"only {available} core(s) for up to {max(members)} members: members share "
+              f"cores, so wall ev/s cannot scale with members here, served ev/s assumes one "
+              f"core per member")
+    print(f"{'topology':>12} {'members':>7} {'cores':>5} {'events':>7} {'wall ev/s':>10} "
+          f"{'served ev/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    for count in members:
+        results = run(count, trace, script=__file__)
+        events = sum(r["events"] for r in results)
+        latency = sorted(x for r in results for x in r["latency"])
+        wall = events / max(r["wall"] for r in results)
+        served = events / max(r["finish"] for r in results)
+        print(f"{TOPOLOGY[0]:>12} {count:>7} {min(count, available):>5} {events:>7} "
+              f"{wall:>10.0f} {served:>11.0f} {statistics.median(latency) * 1e3:>8.2f} "
+              f"{latency[int(len(latency) * .99)] * 1e3:>8.2f}")
+
+
+def main(packets: int = PACKETS, rate: float = RATE, *members: int):
+    with tempfile.TemporaryDirectory() as directory:
+        trace = os.path.join(directory, "trace.bin")
+        write(trace, generated(Harness(TOPOLOGY[1]()), packets, rate))
+        replay(trace, *members)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--member"]:
+        hub.patch(thread=False)
+        count, index, directory, trace = sys.argv[2:]
+        member(int(count), int(index), directory, trace)
+    elif sys.argv[1:2] == ["--record"]:
+        trace, *args = sys.argv[2:]
+        print(write(trace, generated(Harness(TOPOLOGY[1]()), *map(int, args))), "PacketIns recorded")
+    elif sys.argv[1:2] == ["--pcap"]:
+        trace, pcap = sys.argv[2:]
+        print(write(trace, captured(Harness(TOPOLOGY[1]()), pcap)), "PacketIns recorded")
+    elif sys.argv[1:2] == ["--replay"]:
+        replay(sys.argv[2], *map(int, sys.argv[3:]))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,101 @@
+"""Per-pair throughput percentiles from iperf output files: re-parsing every
+raw file for each query vs. querying the columnar store the files were
+tailed into.
+
+Files grow in steps while a Tailer follows them, the way they do during an
+emulation, then both ways answer the same query and are checked to agree.
+
+Usage: python benchmarks/bench_results.py [files ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from min_env.store import ResultStore, Tailer, file_meta  # noqa: E402
+from min_env.traffic import parse_csv  # noqa: E402
+
+SIZES = (100, 1000, 5000)
+DURATION = 60  # interval reports per file
+STEPS = 6  # passes of the tailer while the files grow
+HOSTS = ['h{}'.format(h) for h in range(1, 51)]
+
+
+def report(rnd, second, server_ip):
+    bps = rnd.gauss(8e6, 1e6)
+    return '20260101{:06d},10.0.0.1,40000,{},5001,3,{:.1f}-{:.1f},{},{}\n'.format(
+        second, server_ip, second, second + 1.0, int(bps / 8), int(bps))
+
+
+def grow(directory, files, step, rnd):
+    per_step = DURATION // STEPS
+    for run, (src, dst) in files:
+        path = os.path.join(directory, 'iperf-tcp-client-{}-{}-{}.txt'.format(src, dst, run))
+        with open(path, 'a') as f:
+            for second in range(step * per_step, (step + 1) * per_step):
+                f.write(report(rnd, second, '10.0.0.2'))
+            if step == STEPS - 1:
+                f.write('20260101000100,10.0.0.1,40000,10.0.0.2,5001,3,0.0-{:.1f},{},{}\n'.format(
+                    float(DURATION), 60000000, 8000000))
+
+
+def raw_query(directory):
+    """Parse every file again and group in Python"""
+    groups = {}
+    for name in os.listdir(directory):
+        meta = file_meta(name)
+        if meta is None:
+            continue
+        with open(os.path.join(directory, name)) as f:
+            for s in parse_csv(f, meta['run'], meta['src'], meta['dst'], meta['protocol']):
+                if s.end - s.start <= 1.5:
+                    groups.setdefault((s.src, s.dst, s.protocol), []).append(s.bps)
+    return {key: np.percentile(values, (50, 90, 99)) for key, values in groups.items()}
+
+
+def main(*sizes: int):
+    print(f"{'files':>6} {'rows':>8} {'ingest s':>9} {'raw query s':>12} {'store query s':>14} "
+          f"{'pair query ms':>14} {'speedup':>8}")
+    for count in sizes or SIZES:
+        rnd = random.Random(1)
+        with tempfile.TemporaryDirectory() as directory:
+            files = [(run, tuple(rnd.sample(HOSTS, 2))) for run in range(1, count + 1)]
+            store = ResultStore(os.path.join(directory, 'store'))
+            tailer = Tailer(directory, store)
+            ingest = 0.0
+            for step in range(STEPS):
+                grow(directory, files, step, rnd)
+                start = time.perf_counter()
+                tailer.poll()
+                ingest += time.perf_counter() - start
+            start = time.perf_counter()
+            tailer.stop()
+            ingest += time.perf_counter() - start
+
+            start = time.perf_counter()
+            raw = raw_query(directory)
+            raw_s = time.perf_counter() - start
+
+            store.columns()  # merged once, like after the last tail pass
+            start = time.perf_counter()
+            stored = store.percentiles()
+            store_s = time.perf_counter() - start
+
+            src, dst = files[0][1]
+            start = time.perf_counter()
+            store.select(src=src, dst=dst, protocol='tcp', kind='interval')
+            pair_ms = (time.perf_counter() - start) * 1000
+
+            assert raw.keys() == stored.keys()
+            assert all(np.allclose(raw[key], stored[key]) for key in raw)
+            print(f"{count:>6} {len(store):>8} {ingest:>9.2f} {raw_s:>12.3f} {store_s:>14.3f} "
+                  f"{pair_ms:>14.3f} {raw_s / store_s:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
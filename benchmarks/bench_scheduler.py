@@ -0,0 +1,102 @@
+"""Enqueue, cancel and dispatch throughput and timing jitter of the min_env
+scheduler, against the standard sched module it started as a copy of.
+
+cancel cancels half of the events, which is quadratic for sched, so sched
+is only asked to cancel up to SCHED_MAX_CANCEL events. Jitter spreads the
+events over at least a second of real time and reports how late actions
+ran.
+
+Usage: python benchmarks/bench_scheduler.py [events ...]
+"""
+import os
+import random
+import sched
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from min_env.minished import scheduler  # noqa: E402
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+SCHED_MAX_CANCEL = 10 ** 4
+# Events per second of real time in the jitter run.
+JITTER_RATE = 50000
+
+IMPLEMENTATIONS = {"sched": sched.scheduler, "minished": scheduler}
+
+
+def nothing():
+    pass
+
+
+def throughput(factory, events: int, rnd: random.Random):
+    """Events per second for enterabs, cancel and run of due events"""
+    s = factory(time.monotonic, time.sleep)
+    times = [rnd.random() for _ in range(events)]
+    start = time.perf_counter()
+    handles = [s.enterabs(t, 1, nothing) for t in times]
+    enqueue = events / (time.perf_counter() - start)
+
+    cancel = None
+    if factory is not sched.scheduler or events <= SCHED_MAX_CANCEL:
+        victims = rnd.sample(handles, events // 2)
+        start = time.perf_counter()
+        for event in victims:
+            s.cancel(event)
+        cancel = len(victims) / (time.perf_counter() - start)
+    else:
+        # Leave the same number of events to dispatch.
+        s = factory(time.monotonic, time.sleep)
+        for t in times[:events - events // 2]:
+            s.enterabs(t, 1, nothing)
+
+    remaining = events - events // 2
+    start = time.perf_counter()
+    s.run()
+    dispatch = remaining / (time.perf_counter() - start)
+    return enqueue, cancel, dispatch
+
+
+def jitter(factory, events: int, rnd: random.Random):
+    """Lateness percentiles in microseconds with the real clock"""
+    # Time 0 is set once every event is in, so slow enqueueing does not
+    # count as lateness.
+    origin = [float("inf")]
+
+    def clock():
+        return time.monotonic() - origin[0]
+
+    s = factory(clock, time.sleep)
+    late = []
+
+    def action(due):
+        late.append(clock() - due)
+
+    window = max(1.0, events / JITTER_RATE)
+    for _ in range(events):
+        due = rnd.random() * window
+        s.enterabs(due, 1, action, (due,))
+    origin[0] = time.monotonic() + 0.05
+    s.run()
+    late.sort()
+    return tuple(late[min(int(p * len(late)), len(late) - 1)] * 1e6 for p in (0.5, 0.99, 1.0))
+
+
+def rate(value):
+    return f"{value:>10.0f}" if value is not None else f"{'-':>10}"
+
+
+def main(*sizes: int):
+    print(f"{'events':>8} {'impl':>9} {'enqueue/s':>10} {'cancel/s':>10} {'run/s':>10} "
+          f"{'p50 us':>8} {'p99 us':>8} {'max us':>9}")
+    for events in sizes or SIZES:
+        for name, factory in IMPLEMENTATIONS.items():
+            enqueue, cancel, dispatch = throughput(factory, events, random.Random(1))
+            p50, p99, worst = jitter(factory, events, random.Random(2))
+            print(f"{events:>8} {name:>9} {rate(enqueue)} {rate(cancel)} {rate(dispatch)} "
+                  f"{p50:>8.0f} {p99:>8.0f} {worst:>9.0f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
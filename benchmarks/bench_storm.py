@@ -0,0 +1,123 @@
+"""Latency of ordinary PacketIns while one host floods the controller.
+
+One host of a fat tree scans every other host as fast as it can, each probe
+a new flow that reaches the controller, while the hosts of the other
+switches keep starting flows at a modest rate. Events run on a virtual
+clock through the controller's one event queue: each is handled when it
+arrives or when the previous one is done, whichever is later, and takes as
+long as its handler really took. The latency of a PacketIn is the time
+from its arrival until its handler returned.
+
+Three setups are compared: no protection, token-bucket admission in front
+of packet_in, and admission behind the table-miss meter, modelled as a
+token bucket on every switch that drops what exceeds the meter band before
+it reaches the controller. Latencies are those of the PacketIns from
+switches other than the flooding one.
+
+Usage: python benchmarks/bench_storm.py [storm-pps [background-pps]]
+"""
+import gc
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+from fakes import packet_in, ipv4_frame
+from harness import Harness
+
+from admission import Admission, TokenBucket  # noqa: E402
+from min_env import topologies  # noqa: E402
+
+TOPOLOGY = ("fat-tree-8", lambda: topologies.fat_tree(8))
+DURATION = 2.0
+# The storm runs in the middle of the run.
+STORM = (0.5, 1.5)
+SETUPS = (("unprotected", False, False), ("admission", True, False), ("admission+meter", True, True))
+# Table-miss meter of the metered setup, packets per second and burst. It is
+# off by default in config, not every switch has meters.
+METER_RATE = 1000
+METER_BURST = 200
+
+
+def arrivals(harness: Harness, attacker: str, storm_rate: float, background_rate: float,
+             rnd: random.Random):
+    """(time, src, dst) of every packet, sorted by time"""
+    hosts = list(harness.hosts)
+    attacked_dp = harness.hosts[attacker][0].id
+    others = [ip for ip in hosts if harness.hosts[ip][0].id != attacked_dp]
+    packets = []
+    t = 0.0
+    while t < DURATION:
+        src = rnd.choice(others)
+        packets.append((t, src, rnd.choice([ip for ip in hosts if ip != src])))
+        t += rnd.expovariate(background_rate)
+    t, end = STORM
+    targets = [ip for ip in hosts if ip != attacker]
+    while t < end:
+        packets.append((t, attacker, rnd.choice(targets)))
+        t += 1 / storm_rate
+    packets.sort()
+    return packets
+
+
+def run(harness: Harness, packets, attacker: str, admission: bool, meter: bool):
+    app = harness.app
+    clock = [0.0]
+    app.admission = Admission(clock=lambda: clock[0]) if admission else None
+    meters = {}
+    attacked_dp = harness.hosts[attacker][0].id
+    events = {}
+    finish = 0.0
+    latency = []
+    outcome = Counter()
+    for arrival, src, dst in packets:
+        dp, port_no = harness.hosts[src]
+        if meter:
+            bucket = meters.get(dp.id)
+            if bucket is None:
+                bucket = meters[dp.id] = TokenBucket(METER_RATE, METER_BURST, arrival)
+            if not bucket.take(arrival):
+                outcome["metered"] += 1
+                continue
+        ev = events.get((src, dst))
+        if ev is None:
+            ev = events[src, dst] = packet_in(dp, port_no, ipv4_frame(src, dst))
+        start = clock[0] = max(finish, arrival)
+        throttled = app.counters["packet_in_throttled"]
+        began = time.perf_counter()
+        app.packet_in(ev)
+        finish = start + time.perf_counter() - began
+        if app.counters["packet_in_throttled"] > throttled:
+            outcome["throttled"] += 1
+        elif src == attacker:
+            outcome["storm_handled"] += 1
+        if src != attacker and dp.id != attacked_dp:
+            latency.append(finish - arrival)
+    return latency, outcome, finish
+
+
+def main(storm_rate: float = 50000, background_rate: float = 1000):
+    print(f"{'setup':>16} {'storm pkts':>10} {'metered':>8} {'throttled':>9} {'handled':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'drained s':>9}")
+    for name, admission, meter in SETUPS:
+        # Fresh controller every time, routes installed by one run would
+        # make the next one cheaper.
+        harness = Harness(TOPOLOGY[1]())
+        harness.bring_up()
+        harness.learn_hosts()
+        rnd = random.Random(1)
+        attacker = rnd.choice(list(harness.hosts))
+        packets = arrivals(harness, attacker, storm_rate, background_rate, rnd)
+        storm = sum(1 for _, src, _ in packets if src == attacker)
+        gc.collect()
+        latency, outcome, finish = run(harness, packets, attacker, admission, meter)
+        ordered = sorted(latency)
+        print(f"{name:>16} {storm:>10} {outcome['metered']:>8} {outcome['throttled']:>9} "
+              f"{outcome['storm_handled']:>8} {statistics.median(ordered) * 1e3:>8.2f} "
+              f"{ordered[int(len(ordered) * .99)] * 1e3:>8.2f} {ordered[-1] * 1e3:>8.2f} "
+              f"{finish:>9.2f}")
+
+
+if __name__ == '__main__':
+    main(*map(float, sys.argv[1:]))
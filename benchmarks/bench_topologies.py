@@ -0,0 +1,61 @@
+"""Generating large topologies and routing over them without Mininet.
+
+Builds every topology type at a few sizes, exports it with to_networkx and
+looks up routes between random switch pairs through the controller's
+PathCache with the delay metric.
+
+Usage: python benchmarks/bench_topologies.py [lookups]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "controller"))
+
+from min_env import topologies  # noqa: E402
+from path_cache import PathCache  # noqa: E402
+from topology_store import TopologyStore  # noqa: E402
+
+VARIED = {'bw': {'dist': 'choice', 'values': [100, 1000]},
+          'delay': {'dist': 'lognormal', 'mean': 0.5, 'sigma': 0.8, 'max': 50},
+          'loss': {'dist': 'uniform', 'low': 0, 'high': 1}, 'max_queue_size': 30}
+
+CASES = (
+    ('fat_tree', dict(k=8)),
+    ('fat_tree', dict(k=16)),
+    ('fat_tree', dict(k=24)),
+    ('leaf_spine', dict(spines=16, leaves=128, hosts_per_leaf=16)),
+    ('waxman', dict(switches=1000, beta=0.1, alpha=0.05, delay_scale=40)),
+    ('erdos_renyi', dict(switches=1000, p=0.005)),
+)
+
+
+def main(lookups: int = 2000):
+    rnd = random.Random(1)
+    print(f"{'topology':>22} {'switches':>8} {'hosts':>6} {'links':>6} {'build s':>8} "
+          f"{'export s':>9} {'routes/s':>9}")
+    for kind, args in CASES:
+        start = time.perf_counter()
+        spec = topologies.GENERATORS[kind](switch_link=VARIED, **args)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        graph = topologies.to_networkx(spec)
+        export = time.perf_counter() - start
+        for u, v, data in graph.edges(data=True):
+            data['weight'] = data['delay']
+        paths = PathCache(TopologyStore.from_networkx(graph))
+        nodes = list(graph.nodes)
+        pairs = [rnd.sample(nodes, 2) for _ in range(lookups)]
+        start = time.perf_counter()
+        for src, dst in pairs:
+            paths.get(src, dst)
+        rate = lookups / (time.perf_counter() - start)
+        print(f"{spec.name:>22} {len(spec.switches):>8} {len(spec.hosts):>6} "
+              f"{len(spec.links):>6} {build:>8.3f} {export:>9.3f} {rate:>9.0f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
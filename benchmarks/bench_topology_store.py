@@ -0,0 +1,95 @@
+"""Memory and all-pairs recompute time of the topology representations.
+
+For every size the same small-world graph is held the old way (an nx.Graph
+with an "id" node attribute and weighted edges, plus the dpid_ports dict of
+dicts) and in a TopologyStore, and the memory each takes is measured with
+tracemalloc. All-pairs shortest paths are then recomputed from every switch:
+with networkx one Dijkstra per source, timed on SAMPLE sources and scaled up,
+and with the store in chunks of BUILD_CHUNK sources through scipy's csgraph,
+the way PathCache.build does it. Results of the chunks are dropped as they
+come, keeping all of them takes switches^2 * 12 bytes.
+
+Usage: python benchmarks/bench_topology_store.py [switches ...]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import networkx as nx
+
+import fakes  # noqa: F401
+
+from path_cache import BUILD_CHUNK  # noqa: E402
+from topology_store import TopologyStore  # noqa: E402
+
+SIZES = (1000, 10000)
+SAMPLE = 20
+
+
+def edges(switches: int, seed: int = 1):
+    graph = nx.connected_watts_strogatz_graph(switches, 4, 0.1, seed=seed)
+    rnd = random.Random(seed)
+    return [(u + 1, v + 1, rnd.choice((1.0, 2.0, 5.0))) for u, v in graph.edges]
+
+
+def build_old(switches: int, links):
+    graph = nx.Graph()
+    dpid_ports = defaultdict(dict)
+    for dpid in range(1, switches + 1):
+        graph.add_node(dpid, id=dpid)
+    for u, v, weight in links:
+        dpid_ports[u][v] = len(dpid_ports[u]) + 1
+        dpid_ports[v][u] = len(dpid_ports[v]) + 1
+        graph.add_edge(u, v, weight=weight)
+    return graph, dpid_ports
+
+
+def build_store(switches: int, links) -> TopologyStore:
+    store = TopologyStore()
+    degree = defaultdict(int)
+    for dpid in range(1, switches + 1):
+        store.add_switch(dpid, dpid)
+    for u, v, weight in links:
+        degree[u] += 1
+        degree[v] += 1
+        store.add_link(u, v, degree[u], degree[v], weight)
+    return store
+
+
+def measured(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main(*sizes: int):
+    print(f"{'switches':>8} {'links':>6} {'nx MB':>7} {'store MB':>9} {'nx build s':>10} "
+          f"{'store build s':>13} {'nx all-pairs s':>14} {'store all-pairs s':>17} {'speedup':>8}")
+    for switches in sizes or SIZES:
+        links = edges(switches)
+        (graph, _), old_size, old_build = measured(lambda: build_old(switches, links))
+        store, new_size, new_build = measured(lambda: build_store(switches, links))
+
+        sample = random.Random(1).sample(list(graph.nodes), SAMPLE)
+        start = time.perf_counter()
+        for src in sample:
+            nx.dijkstra_predecessor_and_distance(graph, src)
+        old = (time.perf_counter() - start) * switches / SAMPLE
+
+        sources = list(store)
+        start = time.perf_counter()
+        for i in range(0, len(sources), BUILD_CHUNK):
+            store.shortest_paths(sources[i:i + BUILD_CHUNK])
+        new = time.perf_counter() - start
+        print(f"{switches:>8} {len(links):>6} {old_size / 2 ** 20:>7.1f} {new_size / 2 ** 20:>9.1f} "
+              f"{old_build:>10.2f} {new_build:>13.2f} {old:>14.1f} {new:>17.1f} {old / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""Full-mesh orchestration overhead of min_env.traffic at 10 to 200 hosts.
+
+Hosts are local processes and iperf is a shell stand-in that prints the
+listening banner, sleeps for the test duration and prints one -y C report,
+so this measures start-up, readiness detection, completion tracking and
+parsing without Mininet. The mesh starts in the background, "returned s"
+is how long the call blocked. The ideal time is
+ceil((hosts - 1) / per_host) * duration.
+
+Usage: python benchmarks/bench_traffic.py [hosts ...]
+"""
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from min_env import traffic  # noqa: E402
+
+SIZES = (10, 50, 100, 200)
+PER_HOST = (1, 4)
+DURATION = 0.2
+
+# Stand-in iperf, plain shell so process start-up does not dominate.
+FAKE_SERVER = 'echo Server listening on TCP port {port}; exec sleep 3600'
+FAKE_CLIENT = ('sleep {duration}; '
+               'echo 20260101000000,10.0.0.1,40000,{server_ip},{port},3,0.0-{duration},1250000,10000000')
+
+
+class FakeHost:
+    def __init__(self, name, ip):
+        self.name = name
+        self.ip = ip
+
+    def IP(self):
+        return self.ip
+
+    def popen(self, cmd, **kwargs):
+        return subprocess.Popen(cmd, **kwargs)
+
+
+class FakeNet:
+    def __init__(self, count):
+        self.hosts = {'h{}'.format(i): FakeHost('h{}'.format(i), '10.0.{}.{}'.format(i // 250, i % 250 + 1))
+                      for i in range(1, count + 1)}
+
+    def get(self, *names):
+        hosts = [self.hosts[name] for name in names]
+        return hosts[0] if len(hosts) == 1 else hosts
+
+
+def main(*sizes: int):
+    with tempfile.TemporaryDirectory() as directory:
+        traffic.SERVER_CMD = FAKE_SERVER
+        traffic.CLIENT_CMD = FAKE_CLIENT
+
+        print(f"{'hosts':>6} {'per host':>8} {'runs':>6} {'returned s':>10} {'ideal s':>8} "
+              f"{'total s':>8} {'failed':>7} {'samples':>8}")
+        for count in sizes or SIZES:
+            for per_host in PER_HOST:
+                net = FakeNet(count)
+                t = traffic.Traffic(net, output_dir=os.path.join(directory, f"{count}-{per_host}"))
+                hosts = sorted(net.hosts)
+                start = time.perf_counter()
+                mesh = t.full_mesh(hosts, duration=DURATION, per_host=per_host)
+                returned = time.perf_counter() - start
+                mesh.wait()
+                total = time.perf_counter() - start
+                t.stop()
+                assert not mesh.late, mesh.late
+                ideal = math.ceil((count - 1) / per_host) * DURATION
+                print(f"{count:>6} {per_host:>8} {len(mesh.runs):>6} {returned:>10.4f} {ideal:>8.1f} "
+                      f"{total:>8.1f} {len(t.results.failed()):>7} {len(t.results.select()):>8}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
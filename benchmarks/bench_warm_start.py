@@ -0,0 +1,173 @@
+"""Restart-to-first-routed-packet of a cold and of a warm controller restart.
+
+A controller brings the topology up, learns every host, installs routes and
+saves a snapshot. It is then replaced by a new controller while the fake
+switches keep their flow and group tables. After a cold restart the new one
+starts from nothing: LLDP finds the links one port every LLDP_SEND_GUARD
+seconds, the pace of ryu's switches app, and hosts are learned from their
+own packets. After a warm restart it loads the snapshot, reads the tables
+of every switch back and reconciles them.
+
+Events run on a virtual clock: each one is handled when it arrives or when
+the controller is done with the previous one, whichever is later, and takes
+as long as its handler really took. A host sends a packet to another random
+host every PACKET_INTERVAL seconds, every packet reaching the controller.
+The run reports when the first of them was routed, the share routed until
+LLDP has been through every port, when the last one failed, and the FlowMods,
+GroupMods and flow deletions the restart sent.
+
+Usage: python benchmarks/bench_warm_start.py [packets-before-restart]
+"""
+import heapq
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import networkx as nx
+from ryu.topology.switches import Switches
+
+from fakes import switch_enter, link_add, packet_in, ipv4_frame
+from harness import Harness, MATRICES
+
+import config  # noqa: E402
+from controller import Controller  # noqa: E402
+from min_env import topologies  # noqa: E402
+
+SUITE = (
+    ("fat-tree-4", lambda: topologies.fat_tree(4)),
+    ("fat-tree-8", lambda: topologies.fat_tree(8)),
+    ("leaf-spine-4x16", lambda: topologies.leaf_spine(4, 16, 4)),
+)
+PACKET_INTERVAL = 0.005
+# Seconds a switch takes to answer the table reads.
+TABLE_RTT = 0.001
+# Phases whose messages are part of the restart, not of routing packets.
+RESTART_PHASES = ("new_switch", "new_link", "reconcile", "failover_settle")
+
+
+def prepare(spec, path: str, packets: int) -> Harness:
+    """Harness whose switches hold the tables of a controller that ran for a while"""
+    config.SNAPSHOT_FILE = path
+    if os.path.exists(path):
+        os.unlink(path)
+    harness = Harness(spec)
+    harness.bring_up()
+    harness.learn_hosts()
+    harness.send(MATRICES["uniform"](list(harness.hosts), packets, random.Random(1)))
+    harness.acknowledge()
+    harness.app.save_state()
+    return harness
+
+
+def restart(harness: Harness, warm: bool):
+    if not warm:
+        config.SNAPSHOT_FILE = None
+    harness.phases.clear()
+    start = time.perf_counter()
+    harness.restart(Controller())
+    app = harness.app
+    now = time.perf_counter() - start
+
+    events = []
+    seq = 0
+
+    def at(when, kind, payload=None):
+        nonlocal seq
+        heapq.heappush(events, (when, seq, kind, payload))
+        seq += 1
+
+    ends = {(src.dpid, src.port_no): (src, dst) for src, dst in harness.links}
+    ends.update({(dst.dpid, dst.port_no): (dst, src) for src, dst in harness.links})
+    for dp in harness.dps.values():
+        at(0.0, "switch", dp)
+    slot = 0
+    for dp in harness.dps.values():
+        for port_no in sorted(dp.ports):
+            link = ends.get((dp.id, port_no))
+            if link is not None:
+                at(slot * Switches.LLDP_SEND_GUARD, "link", link)
+            slot += 1
+    horizon = slot * Switches.LLDP_SEND_GUARD + 1.0
+    hosts = list(harness.hosts)
+    rnd = random.Random(2)
+    tick = 0.0
+    while tick < horizon:
+        at(tick, "packet", tuple(rnd.sample(hosts, 2)))
+        tick += PACKET_INTERVAL
+
+    outcome = Counter()
+    first = last_failed = None
+    settle = False
+    while events:
+        when, _, kind, payload = heapq.heappop(events)
+        now = max(now, when)
+        start = time.perf_counter()
+        if kind == "switch":
+            harness.fire("new_switch", app.new_switch, switch_enter(payload))
+            if payload.id in app.tables._reads:
+                at(now + TABLE_RTT, "tables", payload)
+        elif kind == "tables":
+            harness.reconcile(payload)
+        elif kind == "link":
+            harness.fire("new_link", app.new_link, link_add(*payload))
+        elif kind == "settle":
+            harness.settle()
+            settle = False
+        else:
+            src, dst = payload
+            dp, port_no = harness.hosts[src]
+            routed = app.counters["packet_out"]
+            try:
+                harness.fire("packet_in", app.packet_in, packet_in(dp, port_no, ipv4_frame(src, dst)))
+            except nx.NetworkXNoPath:
+                harness.phase = None
+            if app.counters["packet_out"] > routed:
+                outcome["routed"] += 1
+                if first is None:
+                    first = now
+            else:
+                outcome["failed"] += 1
+                last_failed = now
+        now += time.perf_counter() - start
+        if app._settle is not None and not settle:
+            settle = True
+            at(now + config.FAILOVER_SETTLE, "settle")
+    harness.acknowledge()
+
+    sent = Counter()
+    for name in RESTART_PHASES:
+        phase = harness.phases.get(name)
+        if phase is not None:
+            sent.update(phase.messages)
+    return {
+        "first": first,
+        "routed": outcome["routed"] / max(sum(outcome.values()), 1),
+        "last_failed": last_failed,
+        "flow_mods": sent["OFPFlowMod"],
+        "group_mods": sent["OFPGroupMod"],
+        "adopted": app.flow_queue.adopted + app.counters["routes_adopted"],
+        "stale": app.counters["flows_stale"],
+    }
+
+
+def main(packets: int = 2000):
+    print(f"{'topology':>16} {'restart':>7} {'first routed s':>14} {'routed':>7} "
+          f"{'last failed s':>13} {'flow mods':>9} {'group mods':>10} {'adopted':>7} {'stale':>5}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.bin")
+        for name, build in SUITE:
+            for warm in (False, True):
+                harness = prepare(build(), path, packets)
+                result = restart(harness, warm)
+                first = f"{result['first']:.3f}" if result["first"] is not None else "never"
+                failed = f"{result['last_failed']:.3f}" if result["last_failed"] is not None else "-"
+                print(f"{name:>16} {'warm' if warm else 'cold':>7} {first:>14} "
+                      f"{result['routed']:>6.1%} {failed:>13} {result['flow_mods']:>9} "
+                      f"{result['group_mods']:>10} {result['adopted']:>7} {result['stale']:>5}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,212 @@
+"""Stand-ins for the Ryu objects the controller talks to."""
+import os
+import sys
+from types import SimpleNamespace
+
+# ryu.controller.controller, imported by the controller modules, can only be
+# imported once app_manager is loaded, as ryu-manager does.
+from ryu.base import app_manager  # noqa: F401
+from ryu.ofproto import ofproto_v1_4, ofproto_v1_4_parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'controller'))
+
+
+class FakeDatapath:
+    """Datapath that serializes every message it is given and keeps it.
+
+    ``sink``, when given, is called with the datapath and every message sent.
+    """
+    ofproto = ofproto_v1_4
+    ofproto_parser = ofproto_v1_4_parser
+
+    def __init__(self, dpid: int, ports=None, sink=None):
+        self.id = dpid
+        self.ports = ports or {}
+        self.sink = sink
+        self.sent = []
+        self.xid = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.sent.append(msg)
+        if self.sink is not None:
+            self.sink(self, msg)
+        return True
+
+
+class FakePort:
+    """Both a datapath port (state) and a topology link end (dpid)."""
+
+    def __init__(self, dpid: int, port_no: int, state: int = 4):
+        self.dpid = dpid
+        self.port_no = port_no
+        self.state = state
+
+
+def build_datapaths(graph, sink=None):
+    """Fake datapaths and link ends for every node and edge of a networkx graph"""
+    dps = {node: FakeDatapath(node, sink=sink) for node in graph.nodes}
+    links = []
+    for u, v in graph.edges:
+        src = FakePort(u, len(dps[u].ports) + 1)
+        dst = FakePort(v, len(dps[v].ports) + 1)
+        dps[u].ports[src.port_no] = src
+        dps[v].ports[dst.port_no] = dst
+        links.append((src, dst))
+    return dps, links
+
+
+def switch_enter(dp):
+    from ryu.topology import event as topo_event
+    return topo_event.EventSwitchEnter(SimpleNamespace(dp=dp))
+
+
+def link_add(src, dst):
+    from ryu.topology import event as topo_event
+    return topo_event.EventLinkAdd(SimpleNamespace(src=src, dst=dst))
+
+
+def link_delete(src, dst):
+    from ryu.topology import event as topo_event
+    return topo_event.EventLinkDelete(SimpleNamespace(src=src, dst=dst))
+
+
+def switch_leave(dp):
+    from ryu.topology import event as topo_event
+    return topo_event.EventSwitchLeave(SimpleNamespace(dp=dp))
+
+
+def port_status(dp, port_no: int, live: bool):
+    """PortStatus for a port whose link went down or came back up"""
+    from ryu.controller import ofp_event
+    ofproto = dp.ofproto
+    parser = dp.ofproto_parser
+    desc = parser.OFPPort(port_no=port_no, hw_addr='02:00:00:00:00:00', name=f'p{port_no}',
+                          config=0, state=ofproto.OFPPS_LIVE if live else ofproto.OFPPS_LINK_DOWN,
+                          properties=[])
+    msg = parser.OFPPortStatus(dp, reason=ofproto.OFPPR_MODIFY, desc=desc)
+    return ofp_event.EventOFPPortStatus(msg)
+
+
+def barrier_replies(dp):
+    """Replies to every barrier request the datapath has been sent"""
+    from ryu.controller import ofp_event
+    parser = dp.ofproto_parser
+    for msg in dp.sent:
+        if isinstance(msg, parser.OFPBarrierRequest):
+            reply = parser.OFPBarrierReply(dp)
+            reply.xid = msg.xid
+            yield ofp_event.EventOFPBarrierReply(reply)
+
+
+def tables(dp):
+    """Flow and group tables the datapath holds after every FlowMod and
+    GroupMod it has been sent, as flow stats and group descs"""
+    from flow_queue import signature
+    ofproto = dp.ofproto
+    parser = dp.ofproto_parser
+    flows, groups = {}, {}
+    for msg in dp.sent:
+        if isinstance(msg, parser.OFPFlowMod):
+            key = signature(msg.table_id, msg.priority, msg.match, [])
+            if msg.command == ofproto.OFPFC_ADD:
+                flows[key] = msg
+            elif msg.command == ofproto.OFPFC_DELETE_STRICT:
+                flows.pop(key, None)
+        elif isinstance(msg, parser.OFPGroupMod):
+            if msg.command == ofproto.OFPGC_ADD:
+                groups.setdefault(msg.group_id, msg)
+            elif msg.command == ofproto.OFPGC_MODIFY:
+                groups[msg.group_id] = msg
+            elif msg.command == ofproto.OFPGC_DELETE:
+                # Flows sending to a deleted group go with it.
+                gone = set(groups) if msg.group_id == ofproto.OFPG_ALL else {msg.group_id}
+                for group_id in gone:
+                    groups.pop(group_id, None)
+                flows = {key: mod for key, mod in flows.items()
+                         if not gone & {action.group_id for inst in mod.instructions
+                                        for action in getattr(inst, 'actions', ())
+                                        if action.type == ofproto.OFPAT_GROUP}}
+    stats = [parser.OFPFlowStats(table_id=mod.table_id, duration_sec=0, duration_nsec=0,
+                                 priority=mod.priority, idle_timeout=mod.idle_timeout,
+                                 hard_timeout=mod.hard_timeout, flags=mod.flags, importance=0,
+                                 cookie=mod.cookie, packet_count=0, byte_count=0,
+                                 match=mod.match, instructions=mod.instructions)
+             for mod in flows.values()]
+    descs = [parser.OFPGroupDescStats(type_=mod.type, group_id=mod.group_id, buckets=mod.buckets)
+             for mod in groups.values()]
+    return stats, descs
+
+
+def table_replies(dp):
+    """Replies to the flow stats and group desc requests the datapath was
+    sent last, from the tables it holds now"""
+    from ryu.controller import ofp_event
+    parser = dp.ofproto_parser
+    flows, groups = tables(dp)
+    replies = []
+    for msg in reversed(dp.sent):
+        if isinstance(msg, parser.OFPFlowStatsRequest) and flows is not None:
+            reply = parser.OFPFlowStatsReply(dp, body=flows, flags=0)
+            replies.append(ofp_event.EventOFPFlowStatsReply(reply))
+            flows = None
+        elif isinstance(msg, parser.OFPGroupDescStatsRequest) and groups is not None:
+            reply = parser.OFPGroupDescStatsReply(dp, body=groups, flags=0)
+            replies.append(ofp_event.EventOFPGroupDescStatsReply(reply))
+            groups = None
+        else:
+            continue
+        reply.xid = msg.xid
+    return replies
+
+
+def packet_in(dp, in_port: int, data: bytes):
+    from ryu.controller import ofp_event
+    parser = dp.ofproto_parser
+    msg = parser.OFPPacketIn(
+        dp, buffer_id=dp.ofproto.OFP_NO_BUFFER, total_len=len(data),
+        reason=dp.ofproto.OFPR_TABLE_MISS, table_id=0, cookie=0,
+        match=parser.OFPMatch(in_port=in_port), data=data)
+    return ofp_event.EventOFPPacketIn(msg)
+
+
+def host_mac(ip: str) -> str:
+    return '02:00:' + ':'.join(f'{int(octet):02x}' for octet in ip.split('.'))
+
+
+def arp_frame(src_ip: str, dst_ip: str, reply_to: str = None) -> bytes:
+    """ARP request from src_ip, or a reply to reply_to when it is given"""
+    from ryu.lib.packet import packet, ethernet, arp
+    from ryu.ofproto import ether
+    src_mac = host_mac(src_ip)
+    if reply_to is None:
+        e = ethernet.ethernet('ff:ff:ff:ff:ff:ff', src_mac, ether.ETH_TYPE_ARP)
+        a = arp.arp(opcode=arp.ARP_REQUEST, src_mac=src_mac, src_ip=src_ip,
+                    dst_mac='00:00:00:00:00:00', dst_ip=dst_ip)
+    else:
+        e = ethernet.ethernet(reply_to, src_mac, ether.ETH_TYPE_ARP)
+        a = arp.arp(opcode=arp.ARP_REPLY, src_mac=src_mac, src_ip=src_ip,
+                    dst_mac=reply_to, dst_ip=dst_ip)
+    p = packet.Packet()
+    p.add_protocol(e)
+    p.add_protocol(a)
+    p.serialize()
+    return bytes(p.data)
+
+
+def ipv4_frame(src_ip: str, dst_ip: str, payload: bytes = bytes(18)) -> bytes:
+    from ryu.lib.packet import packet, ethernet, ipv4
+    from ryu.ofproto import ether
+    p = packet.Packet()
+    p.add_protocol(ethernet.ethernet(host_mac(dst_ip), host_mac(src_ip), ether.ETH_TYPE_IP))
+    p.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=17))
+    p.add_protocol(payload)
+    p.serialize()
+    return bytes(p.data)
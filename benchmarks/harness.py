@@ -0,0 +1,296 @@
+"""Runs the Controller in-process against fake datapaths.
+
+A Harness builds one FakeDatapath per switch of a generated topology (a
+min_env.topologies spec or a networkx graph), hangs host ports off them and
+feeds synthetic EventSwitchEnter, EventLinkAdd, EventOFPBarrierReply and
+EventOFPPacketIn events straight into the controller's handlers. Every
+handler call is timed and every message the controller sends is counted
+against the phase that caused it, so a run reports throughput, latency and
+messages per event without Mininet, OVS or root.
+"""
+import ipaddress
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from ryu.controller import ofp_event
+from ryu.lib import hub
+from ryu.ofproto import ether
+
+from fakes import (FakePort, build_datapaths, switch_enter, switch_leave, link_add, link_delete,
+                   port_status, packet_in, arp_frame, ipv4_frame, table_replies)
+
+# Appended: the controller directory has to shadow the controller package.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    from controller import Controller  # noqa: E402
+except ImportError:
+    # Under pytest the package was imported first, the app is its module.
+    from controller.controller import Controller  # noqa: E402
+from discovery import HostDiscovery  # noqa: E402
+from min_env import topologies  # noqa: E402
+
+# Address of the gateway hosts ARP for when they come up, as Mininet hosts do.
+GATEWAY = '10.0.0.254'
+# Switches a traced packet may cross before it counts as looping.
+MAX_HOPS = 64
+
+
+def host_ip(name: str) -> str:
+    """hN gets 10.0.0.0/8 + N, the addresses Mininet hands out"""
+    return str(ipaddress.ip_address('10.0.0.0') + int(name[1:]))
+
+
+class Phase:
+    """Handler timings and messages sent for one kind of event"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency: List[float] = []
+        self.messages = Counter()
+        self.bytes = 0
+        self.skipped = 0
+
+    def report(self) -> Dict:
+        events = len(self.latency)
+        busy = sum(self.latency)
+        ordered = sorted(self.latency)
+        sent = sum(self.messages.values())
+        return {
+            "events": events,
+            "events_per_s": events / busy if busy else 0.0,
+            "p50_us": statistics.median(ordered) * 1e6 if events else 0.0,
+            "p99_us": ordered[int(events * .99)] * 1e6 if events else 0.0,
+            "messages": sent,
+            "messages_per_event": sent / events if events else 0.0,
+            "bytes_per_event": self.bytes / events if events else 0.0,
+            "by_type": dict(self.messages),
+            "skipped": self.skipped,
+        }
+
+
+class Harness:
+    """Controller wired to fake datapaths for one topology.
+
+    Background green threads (stats polling, discovery sweeps) are not
+    started, so the messages counted are the ones the events caused.
+    PacketIn admission is off, events are fired far faster than any switch
+    sends them.
+    """
+
+    def __init__(self, topology, hosts_per_switch: int = 1, app: Controller = None):
+        if isinstance(topology, topologies.TopologySpec):
+            graph = topologies.to_networkx(topology, hosts=True)
+            switches = graph.subgraph(n for n, kind in graph.nodes(data="kind") if kind == "switch")
+            attached = [(host, next(iter(graph[host])))
+                        for host, kind in graph.nodes(data="kind") if kind == "host"]
+        else:
+            switches = topology
+            attached = [(f"h{i * hosts_per_switch + j + 1}", node)
+                        for i, node in enumerate(topology.nodes) for j in range(hosts_per_switch)]
+
+        self.phases: Dict[str, Phase] = {}
+        self.phase: Phase = None
+        self.dps, self.links = build_datapaths(switches, sink=self.record)
+        # ip -> (datapath, port_no) of the host
+        self.hosts: Dict[str, Tuple] = {}
+        for name, dpid in attached:
+            dp = self.dps[dpid]
+            port = FakePort(dpid, len(dp.ports) + 1)
+            dp.ports[port.port_no] = port
+            self.hosts[host_ip(name)] = (dp, port.port_no)
+
+        # dpid -> number of sent messages already searched for barriers
+        self._acknowledged = Counter()
+        self._events: Dict[Tuple[str, str], object] = {}
+        self.restart(app)
+
+    def restart(self, app: Controller = None):
+        """Replace the controller, the fake switches keep every flow and group"""
+        self.app = app or Controller()
+        for thread in self.app.threads:
+            hub.kill(thread)
+        self.app.threads.clear()
+        self.app.discovery = HostDiscovery(self.app.ip_to_dpid, self.app.edge_ports, rounds=0)
+        self.app.admission = None
+
+    def record(self, dp, msg):
+        if self.phase is not None:
+            self.phase.messages[type(msg).__name__] += 1
+            self.phase.bytes += len(msg.buf)
+
+    def get_phase(self, name: str) -> Phase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        return phase
+
+    def fire(self, name: str, handler, ev):
+        """Call handler with ev, timed and with its messages counted under name"""
+        phase = self.phase = self.get_phase(name)
+        start = time.perf_counter()
+        handler(ev)
+        phase.latency.append(time.perf_counter() - start)
+        self.phase = None
+
+    def acknowledge(self):
+        """Answer every barrier request sent since the last call"""
+        for dp in self.dps.values():
+            parser = dp.ofproto_parser
+            new = dp.sent[self._acknowledged[dp.id]:]
+            self._acknowledged[dp.id] = len(dp.sent)
+            for msg in new:
+                if isinstance(msg, parser.OFPBarrierRequest):
+                    reply = parser.OFPBarrierReply(dp)
+                    reply.xid = msg.xid
+                    self.fire("barrier_reply", self.app.barrier_reply,
+                              ofp_event.EventOFPBarrierReply(reply))
+
+    def bring_up(self):
+        """Announce every switch, then every link, and acknowledge the bursts"""
+        for dp in self.dps.values():
+            self.fire("new_switch", self.app.new_switch, switch_enter(dp))
+        for src, dst in self.links:
+            self.fire("new_link", self.app.new_link, link_add(src, dst))
+        self.settle()
+        self.acknowledge()
+
+    def reconcile(self, dp):
+        """Answer the table reads of a restored switch from its fake tables"""
+        for ev in table_replies(dp):
+            handler = (self.app.flow_stats_reply if isinstance(ev, ofp_event.EventOFPFlowStatsReply)
+                       else self.app.group_desc_stats_reply)
+            self.fire("reconcile", handler, ev)
+
+    def settle(self):
+        """Run the failover update the controller defers after new links"""
+        self.fire("failover_settle", lambda ev: self.app.settle_failover(), None)
+
+    def fail_link(self, src, dst):
+        """Both ends report their port down, then LLDP reports the link gone"""
+        for port in (src, dst):
+            self.fire("port_down", self.app.port_status,
+                      port_status(self.dps[port.dpid], port.port_no, live=False))
+        self.fire("link_delete", self.app.link_delete, link_delete(src, dst))
+        self.fire("link_delete", self.app.link_delete, link_delete(dst, src))
+        self.acknowledge()
+
+    def restore_link(self, src, dst):
+        self.fire("new_link", self.app.new_link, link_add(src, dst))
+        self.fire("new_link", self.app.new_link, link_add(dst, src))
+        self.settle()
+        self.acknowledge()
+
+    def remove_switch(self, dpid: int):
+        self.fire("switch_leave", self.app.switch_leave, switch_leave(self.dps[dpid]))
+
+    def trace(self, src: str, dst: str, dead=frozenset()) -> List[int]:
+        """
+        Switches the next packet from src to dst crosses when the links in
+        dead (dpid pairs) are down, following the installed ingress flow,
+        table 1 flows and failover groups the controller believes are on the
+        switches. Empty when the packet is dropped or loops.
+        """
+        app = self.app
+        dp, _ = self.hosts[src]
+        route = app.flows.get((dp.id, ether.ETH_TYPE_IP, dst))
+        if route is None:
+            return []
+        nodes = {label: dpid for dpid, label in app.mpls_ids.items()}
+        first, labels = route
+        stack = [app.mpls_ids[node] for node in labels]
+        hops = [dp.id]
+        peer = first
+        while len(hops) < MAX_HOPS:
+            here = hops[-1]
+            group = app.failover.groups.get(here, {}).get(peer)
+            if group is not None:
+                buckets = group[1]
+            elif app.graph.has_link(here, peer):
+                buckets = ((app.graph.port(here, peer), ()),)
+            else:
+                return []
+            ports = {port_no: neighbour for neighbour, port_no in app.graph.ports(here).items()}
+            for port_no, pushed in buckets:
+                neighbour = ports.get(port_no)
+                if neighbour is not None and frozenset((here, neighbour)) not in dead:
+                    stack.extend(pushed)
+                    hops.append(neighbour)
+                    break
+            else:
+                return []
+            if not stack:
+                return hops if app.ip_to_dpid.get(dst) == hops[-1] else []
+            peer = nodes[stack.pop()]
+        return []
+
+    def learn_hosts(self):
+        """Every host ARPs for the gateway once, the controller learns it"""
+        for ip, (dp, port_no) in self.hosts.items():
+            self.fire("arp", self.app.packet_in, packet_in(dp, port_no, arp_frame(ip, GATEWAY)))
+        self.acknowledge()
+
+    def switched(self, src: str, dst: str) -> bool:
+        """Whether the flow table of src's switch already delivers the packet"""
+        dp, _ = self.hosts[src]
+        app = self.app
+        return (app.ip_to_dpid.get(dst) == dp.id
+                or (dp.id, ether.ETH_TYPE_IP, dst) in app.flows)
+
+    def send(self, pairs: Iterable[Tuple[str, str]], name: str = "packet_in",
+             flow_table: bool = True):
+        """
+        One IPv4 packet per (src, dst) pair of host addresses. With flow_table
+        packets the installed flows would forward never reach the controller
+        and only count as skipped.
+        """
+        for src, dst in pairs:
+            if flow_table and self.switched(src, dst):
+                self.get_phase(name).skipped += 1
+                continue
+            ev = self._events.get((src, dst))
+            if ev is None:
+                dp, port_no = self.hosts[src]
+                ev = self._events[src, dst] = packet_in(dp, port_no, ipv4_frame(src, dst))
+            self.fire(name, self.app.packet_in, ev)
+
+    def report(self) -> Dict[str, Dict]:
+        return {name: phase.report() for name, phase in self.phases.items()}
+
+
+def uniform(hosts: List[str], count: int, rnd: random.Random) -> List[Tuple[str, str]]:
+    """count packets between random host pairs"""
+    return [tuple(rnd.sample(hosts, 2)) for _ in range(count)]
+
+
+def permutation(hosts: List[str], count: int, rnd: random.Random) -> List[Tuple[str, str]]:
+    """Every host sends to one other host, count packets spread over the pairs"""
+    targets = hosts[:]
+    rnd.shuffle(targets)
+    pairs = [(src, dst) for src, dst in zip(hosts, targets[1:] + targets[:1]) if src != dst]
+    return [rnd.choice(pairs) for _ in range(count)]
+
+
+def hotspot(hosts: List[str], count: int, rnd: random.Random, hot: float = .05,
+            share: float = .8) -> List[Tuple[str, str]]:
+    """share of the packets go to the hot fraction of the hosts"""
+    hot_hosts = hosts[:max(1, int(len(hosts) * hot))]
+    pairs = []
+    while len(pairs) < count:
+        dst = rnd.choice(hot_hosts if rnd.random() < share else hosts)
+        src = rnd.choice(hosts)
+        if src != dst:
+            pairs.append((src, dst))
+    return pairs
+
+
+MATRICES = {
+    "uniform": uniform,
+    "permutation": permutation,
+    "hotspot": hotspot,
+}
@@ -0,0 +1,75 @@
+"""Aggregate iperf throughput on the min_env topology for each routing metric.
+
+Starts ryu-manager with the controller once per metric and measures TCP
+throughput between host pairs on different switches. The pairs all run at
+once, so they compete for the links their routes share and a metric that
+spreads them out shows up in the sum. Needs root, Mininet, Open vSwitch and
+ryu-manager on PATH:
+
+    sudo python benchmarks/routing_iperf.py [metric ...]
+"""
+import os
+import subprocess
+import sys
+import time
+from functools import partial
+
+from mininet.link import TCLink
+from mininet.log import setLogLevel
+from mininet.net import Mininet
+from mininet.node import OVSSwitch, RemoteController
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from min_env.env import CustomTopo, export_link_properties  # noqa: E402
+from min_env.traffic import Traffic  # noqa: E402
+
+METRICS = ('hop', 'delay', 'bandwidth', 'etx', 'utilization')
+PAIRS = [('h1', 'h4'), ('h2', 'h9'), ('h3', 'h5'), ('h7', 'h6'), ('h1', 'h10')]
+SETTLE = 10
+# Long enough for a few port stats polls, the utilization metric only moves
+# flows once it measured the load.
+DURATION = 30
+
+
+def run(metric: str, links_file: str):
+    env = dict(os.environ, WHY_SO_ROUTING_METRIC=metric, WHY_SO_LINKS_FILE=links_file)
+    ryu = subprocess.Popen(['ryu-manager', '--observe-links', 'controller/controller.py'],
+                           env=env, cwd=ROOT)
+    net = Mininet(topo=CustomTopo(), link=TCLink, controller=RemoteController,
+                  switch=partial(OVSSwitch, protocols='OpenFlow14'))
+    try:
+        net.start()
+        time.sleep(SETTLE)
+        net.pingAll()
+        traffic = Traffic(net, output_dir=os.path.join(ROOT, 'output', f'routing-{metric}'))
+        try:
+            traffic.run(PAIRS, duration=DURATION)
+            rates = traffic.results.throughput()
+        finally:
+            traffic.stop()
+        return {pair: rates.get(pair, 0.0) / 1e6 for pair in PAIRS}
+    finally:
+        net.stop()
+        ryu.terminate()
+        ryu.wait()
+
+
+def main(*metrics: str):
+    setLogLevel('warning')
+    links_file = os.path.join(ROOT, 'links.json')
+    export_link_properties(links_file)
+    totals = {}
+    for metric in metrics or METRICS:
+        results = run(metric, links_file)
+        totals[metric] = sum(results.values())
+        pairs = ' '.join(f'{src}-{dst}={bw:.2f}' for (src, dst), bw in results.items())
+        print(f'{metric:>10}: {totals[metric]:8.2f} Mbit/s  ({pairs})')
+    if 'hop' in totals:
+        for metric, total in totals.items():
+            print(f'{metric:>10}: {total / totals["hop"]:.2f}x hop count')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,72 @@
+from typing import Dict, List, Tuple
+from collections import defaultdict
+from ryu.controller.controller import Datapath
+
+import utils
+
+
+class ActionCache:
+    """Per-datapath cache of the MPLS push actions sent in PacketOut and FlowMod.
+
+    Action objects are never modified after construction, so one list can be
+    shared by every message that pushes the same label sequence. Path entries
+    are evicted on topology changes, label entries only when the datapath
+    goes away.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._labels: Dict[int, Dict[int, List]] = defaultdict(dict)
+        self._paths: Dict[int, Dict[Tuple, List]] = defaultdict(dict)
+        self._instructions: Dict[int, Dict[Tuple, List]] = defaultdict(dict)
+
+    def label(self, dp: Datapath, mpls_id: int) -> List:
+        labels = self._labels[dp.id]
+        actions = labels.get(mpls_id)
+        if actions is None:
+            actions = labels[mpls_id] = utils.construct_mpls(dp, mpls_id)
+        return actions
+
+    def path(self, dp: Datapath, labels: Tuple[int, ...], out_port: int,
+             group_id: int = None) -> List:
+        """Push actions for every label followed by the output action, or by
+        a group action when group_id is given"""
+        paths = self._paths[dp.id]
+        key = (labels, out_port, group_id)
+        actions = paths.get(key)
+        if actions is not None:
+            self.hits += 1
+            return actions
+
+        self.misses += 1
+        actions = []
+        for mpls_id in labels:
+            actions.extend(self.label(dp, mpls_id))
+        if group_id is None:
+            actions.append(dp.ofproto_parser.OFPActionOutput(out_port))
+        else:
+            actions.append(dp.ofproto_parser.OFPActionGroup(group_id))
+        paths[key] = actions
+        return actions
+
+    def instructions(self, dp: Datapath, labels: Tuple[int, ...], out_port: int,
+                     group_id: int = None) -> List:
+        """Apply-actions instruction list for a FlowMod of the same path"""
+        instructions = self._instructions[dp.id]
+        key = (labels, out_port, group_id)
+        inst = instructions.get(key)
+        if inst is None:
+            parser = dp.ofproto_parser
+            inst = instructions[key] = [parser.OFPInstructionActions(
+                dp.ofproto.OFPIT_APPLY_ACTIONS, self.path(dp, labels, out_port, group_id))]
+        return inst
+
+    def evict_paths(self):
+        self._paths.clear()
+        self._instructions.clear()
+
+    def evict(self, dpid: int):
+        self._labels.pop(dpid, None)
+        self._paths.pop(dpid, None)
+        self._instructions.pop(dpid, None)
@@ -0,0 +1,90 @@
+import time
+from typing import Callable, Dict, Hashable
+
+import config
+
+
+class TokenBucket:
+    """Admits ``rate`` events per second on average, ``burst`` at once"""
+
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if tokens < 1:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1
+        return True
+
+
+class Admission:
+    """Token buckets in front of PacketIn handling, per datapath and per
+    source MAC address on it.
+
+    A host flooding the controller runs out of its own bucket first and
+    only its PacketIns are dropped, a switch sending too much in total runs
+    out of the datapath bucket. Either way the other switches keep being
+    served. Dropping costs a dict lookup and a bit of arithmetic, the frame
+    is never parsed. Source buckets are kept for at most ``max_sources``
+    sources, the oldest is dropped to make room.
+    """
+
+    def __init__(self, datapath_rate: float = config.ADMISSION_DATAPATH_RATE,
+                 datapath_burst: float = config.ADMISSION_DATAPATH_BURST,
+                 source_rate: float = config.ADMISSION_SOURCE_RATE,
+                 source_burst: float = config.ADMISSION_SOURCE_BURST,
+                 max_sources: int = config.ADMISSION_MAX_SOURCES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.datapath_rate = datapath_rate
+        self.datapath_burst = datapath_burst
+        self.source_rate = source_rate
+        self.source_burst = source_burst
+        self.max_sources = max_sources
+        self.clock = clock
+        self.admitted = 0
+        self.throttled_datapath = 0
+        self.throttled_source = 0
+        # dpid -> PacketIns dropped from it, either reason
+        self.throttled: Dict[int, int] = {}
+        self._datapaths: Dict[int, TokenBucket] = {}
+        self._sources: Dict[Hashable, TokenBucket] = {}
+
+    def admit(self, dpid: int, data: bytes) -> bool:
+        """Whether a PacketIn from dpid with frame data should be handled"""
+        now = self.clock()
+        if self.source_rate:
+            key = (dpid, bytes(data[6:12]))
+            bucket = self._sources.get(key)
+            if bucket is None:
+                if len(self._sources) >= self.max_sources:
+                    del self._sources[next(iter(self._sources))]
+                bucket = self._sources[key] = TokenBucket(self.source_rate, self.source_burst, now)
+            if not bucket.take(now):
+                self.throttled_source += 1
+                self.throttled[dpid] = self.throttled.get(dpid, 0) + 1
+                return False
+        if self.datapath_rate:
+            bucket = self._datapaths.get(dpid)
+            if bucket is None:
+                bucket = self._datapaths[dpid] = TokenBucket(self.datapath_rate,
+                                                             self.datapath_burst, now)
+            if not bucket.take(now):
+                self.throttled_datapath += 1
+                self.throttled[dpid] = self.throttled.get(dpid, 0) + 1
+                return False
+        self.admitted += 1
+        return True
+
+    def forget(self, dpid: int):
+        self._datapaths.pop(dpid, None)
+        self.throttled.pop(dpid, None)
+        for key in [key for key in self._sources if key[0] == dpid]:
+            del self._sources[key]
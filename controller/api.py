@@ -0,0 +1,40 @@
+import json
+from ryu.app.wsgi import ControllerBase, Response, route
+
+from instrumentation import registry
+
+APP_NAME = "why_so_app"
+
+
+def json_response(body) -> Response:
+    return Response(content_type="application/json", charset="utf-8",
+                    body=json.dumps(body, default=str).encode())
+
+
+class InstrumentationApi(ControllerBase):
+    """REST access to the instrumentation snapshot and the sampling profiler"""
+
+    def __init__(self, req, link, data, **config):
+        super().__init__(req, link, data, **config)
+        self.app = data[APP_NAME]
+
+    @route("why_so", "/why-so/instrumentation", methods=["GET"])
+    def instrumentation(self, req, **kwargs):
+        return json_response(self.app.instrumentation_snapshot())
+
+    @route("why_so", "/why-so/profiler", methods=["GET"])
+    def profile(self, req, **kwargs):
+        """Collapsed stacks, ready for flamegraph.pl"""
+        return Response(content_type="text/plain", charset="utf-8",
+                        body=registry.profiler.collapsed().encode())
+
+    @route("why_so", "/why-so/profiler/start", methods=["PUT", "POST"])
+    def profiler_start(self, req, **kwargs):
+        registry.profiler.start()
+        return json_response({"running": registry.profiler.running})
+
+    @route("why_so", "/why-so/profiler/stop", methods=["PUT", "POST"])
+    def profiler_stop(self, req, **kwargs):
+        registry.profiler.stop()
+        return json_response({"running": registry.profiler.running,
+                              "top": registry.profiler.top()})
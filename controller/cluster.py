@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import socket
+import time
+from typing import Callable, Dict, Hashable, List, Tuple
+from ryu.lib import hub
+
+import config
+
+LOG = logging.getLogger(__name__)
+
+# Largest fact datagram, facts are a few dozen bytes.
+MAX_DATAGRAM = 65536
+
+
+def owner(dpid: int, members: int) -> int:
+    """Index of the member that is master of dpid"""
+    return dpid % members
+
+
+def fact_key(fact: Dict) -> Hashable:
+    """What a fact is about, a later fact about the same replaces it"""
+    if "ip" in fact:
+        return "host", fact["ip"]
+    return "link", min(fact["src"], fact["dst"]), max(fact["src"], fact["dst"])
+
+
+class ClusterBus:
+    """Replicates what one controller process learns to the others on the host.
+
+    Every member owns the datapaths ``owner`` maps to its index: it is their
+    master, installs their flows and gets their PacketIns. Links are only
+    seen by the owner of the switch the LLDP frame arrives at and hosts by
+    the owner of their switch, so both are published as facts to every
+    other member over unix datagram sockets in ``directory``, one socket per
+    member. Members apply them to their own copy of the topology and route
+    any pair from it. Facts a member cannot apply yet, a link to a switch
+    it has not seen, wait for ``retry``: the latest one per link or host,
+    at most ``max_waiting`` of them and for ``timeout`` seconds.
+
+    A member that starts late says hello and gets every fact the others
+    published so far, facts sent while it was down are dropped. Facts go
+    out through one sender thread, so a member whose queue is full never
+    keeps the receiving thread from draining its own.
+    """
+
+    def __init__(self, index: int, members: int, apply: Callable[[Dict], bool],
+                 directory: str = config.CLUSTER_DIR, timeout: float = config.CLUSTER_FACT_TIMEOUT,
+                 max_waiting: int = config.CLUSTER_MAX_WAITING):
+        if not 0 <= index < members:
+            raise ValueError(f"Cluster index {index} is not one of {members} members")
+        self.index = index
+        self.members = members
+        self.apply = apply
+        self.directory = directory
+        # Role requests carry it, a restarted member has a newer one.
+        self.generation = int(time.time() * 1000)
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        # Waiting facts given up on, after timeout or to stay under max_waiting
+        self.expired = 0
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        # key -> fact this member published and still holds, replayed on hello
+        self.facts: Dict[Hashable, Dict] = {}
+        # fact_key -> (fact, monotonic deadline) of facts waiting for a switch, oldest first
+        self.waiting: Dict[Hashable, Tuple[Dict, float]] = {}
+        self._socket = None
+        self._outbox = hub.Queue()
+
+    def owns(self, dpid: int) -> bool:
+        return owner(dpid, self.members) == self.index
+
+    def path(self, member: int) -> str:
+        return os.path.join(self.directory, f"member-{member}.sock")
+
+    def start(self) -> List:
+        """Listen for facts and ask the members already up for theirs,
+        returns the receiving and sending threads"""
+        if self._socket is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(self.index)
+            if os.path.exists(path):
+                os.unlink(path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(path)
+        threads = [hub.spawn(self._serve), hub.spawn(self._sender)]
+        self._send({"type": "hello", "member": self.index}, self._peers())
+        return threads
+
+    def publish(self, key: Hashable, fact: Dict):
+        self.facts[key] = fact
+        self._send(fact, self._peers())
+
+    def retract(self, key: Hashable, fact: Dict):
+        """Take back the fact under key by sending fact, which undoes it"""
+        self.facts.pop(key, None)
+        self._send(fact, self._peers())
+
+    def retry(self):
+        """Apply the facts that were waiting for a switch again, drop the
+        ones that waited too long"""
+        now = time.monotonic()
+        waiting, self.waiting = self.waiting, {}
+        for key, (fact, deadline) in waiting.items():
+            if self.apply(fact):
+                continue
+            if deadline < now:
+                self.expired += 1
+            else:
+                self.waiting[key] = (fact, deadline)
+
+    def wait(self, fact: Dict):
+        """Keep a fact that cannot be applied yet, in place of an older one
+        about the same link or host"""
+        now = time.monotonic()
+        key = fact_key(fact)
+        self.waiting.pop(key, None)
+        # Oldest first, so the expired ones are in front.
+        for oldest, (_, deadline) in list(self.waiting.items()):
+            if deadline >= now and len(self.waiting) < self.max_waiting:
+                break
+            del self.waiting[oldest]
+            self.expired += 1
+        self.waiting[key] = (fact, now + self.timeout)
+
+    def _peers(self) -> List[int]:
+        return [member for member in range(self.members) if member != self.index]
+
+    def _send(self, fact: Dict, members: List[int]):
+        data = json.dumps(fact).encode()
+        for member in members:
+            self._outbox.put((data, self.path(member)))
+
+    def _sender(self):
+        while True:
+            data, path = self._outbox.get()
+            try:
+                self._socket.sendto(data, path)
+                self.sent += 1
+            except OSError:
+                # Not up yet, it gets the facts when it says hello.
+                self.dropped += 1
+
+    def _serve(self):
+        while True:
+            data = self._socket.recv(MAX_DATAGRAM)
+            try:
+                fact = json.loads(data)
+            except ValueError:
+                LOG.warning("cluster: dropped malformed fact %r", data[:80])
+                continue
+            self.received += 1
+            if fact["type"] == "hello":
+                for known in list(self.facts.values()):
+                    self._send(known, [fact["member"]])
+            elif self.apply(fact):
+                # An older version still waiting would undo it.
+                self.waiting.pop(fact_key(fact), None)
+            else:
+                self.wait(fact)
@@ -0,0 +1,115 @@
+import os
+
+# Install a table-0 flow with the label stack on the ingress switch for every
+# routed destination, so later packets of the flow never reach the controller.
+PROACTIVE_FLOWS = True
+FLOW_PRIORITY = 2
+FLOW_IDLE_TIMEOUT = 30
+FLOW_HARD_TIMEOUT = 300
+
+# Subnets swept with ARP probes to find hosts, and the pace of the sweep.
+DISCOVERY_SUBNETS = ["10.0.0.0/27"]
+DISCOVERY_RATE = 200  # probes per second per datapath
+DISCOVERY_ROUNDS = 3
+DISCOVERY_INTERVAL = 5.0  # seconds between rounds
+
+# PacketIns admitted per datapath and per source MAC address on it, token
+# buckets refilled at the rate (per second) holding up to the burst. The
+# rest are dropped before they are parsed. 0 rate disables that limit.
+ADMISSION_DATAPATH_RATE = 2000
+ADMISSION_DATAPATH_BURST = 500
+ADMISSION_SOURCE_RATE = 200
+ADMISSION_SOURCE_BURST = 50
+ADMISSION_MAX_SOURCES = 65536
+# Meter on the table-miss flow, so the switch itself drops table misses
+# beyond TABLE_MISS_METER_RATE packets per second. 0 leaves it unmetered:
+# switches without meters, like the OVS kernel datapath, reject the meter
+# and the flow using it. A switch that rejects it gets an unmetered
+# table-miss flow instead.
+TABLE_MISS_METER = 1
+TABLE_MISS_METER_RATE = int(os.environ.get("WHY_SO_TABLE_MISS_METER_RATE", "0"))
+TABLE_MISS_METER_BURST = 200
+# Bytes of a table miss sent in the PacketIn by switches that report
+# buffers in their features reply, they keep the frame and the PacketOut
+# refers to it by buffer_id. Switches without buffers (OVS since 2.7) always
+# send whole frames. 0xffff (OFPCML_NO_BUFFER) sends whole frames from every
+# switch.
+PACKET_IN_MAX_LEN = 128
+
+# Fast-failover group per neighbour on every switch: the direct port first,
+# then up to FAILOVER_BACKUPS detours of at most FAILOVER_DETOUR_HOPS hops
+# through other neighbours, so a dead port is routed around by the switch
+# before the controller hears of it. Three hops cover fat trees and
+# leaf-spine fabrics, which have no triangles.
+FAST_FAILOVER = True
+FAILOVER_BACKUPS = 2
+FAILOVER_DETOUR_HOPS = 3
+# Seconds to let a burst of new links settle before the groups of switches
+# around them are recomputed, the ends of a new link are updated at once.
+FAILOVER_SETTLE = 0.05
+# Failover groups get FAILOVER_GROUP_BASE + the neighbour's MPLS label as id,
+# select groups for multipath count up from 1. With 20-bit labels they stay
+# below OFPG_MAX.
+FAILOVER_GROUP_BASE = 0x10000000
+
+# Controller processes sharing the switches of this host. Member
+# CLUSTER_INDEX is master of the datapaths with dpid % CLUSTER_MEMBERS ==
+# CLUSTER_INDEX and learns links and hosts from the others through unix
+# sockets in CLUSTER_DIR. 1 runs a single controller for every switch.
+# Members use datapath ids as MPLS labels, switches whose dpid does not fit
+# in a 20-bit label are refused.
+# Members are processes of their own, the way PacketIns of different
+# switches are handled in parallel.
+CLUSTER_MEMBERS = int(os.environ.get("WHY_SO_CLUSTER_MEMBERS", "1"))
+CLUSTER_INDEX = int(os.environ.get("WHY_SO_CLUSTER_INDEX", "0"))
+CLUSTER_DIR = os.environ.get("WHY_SO_CLUSTER_DIR", "/tmp/why-so-cluster")
+# Facts naming a switch this member has not seen wait for it at most
+# CLUSTER_FACT_TIMEOUT seconds, and at most CLUSTER_MAX_WAITING of them.
+CLUSTER_FACT_TIMEOUT = 120.0
+CLUSTER_MAX_WAITING = 65536
+
+# Graph, MPLS labels and hosts are saved to SNAPSHOT_FILE every
+# SNAPSHOT_INTERVAL seconds they changed in and restored from it on start, so
+# a restarted controller routes before LLDP and the ARP sweep found
+# everything again and pushes the labels the switches' flows already use.
+# Restored switches and links that are not seen again within
+# SNAPSHOT_CONFIRM_TIMEOUT seconds are dropped. Unset disables snapshots,
+# cluster members need one file each.
+SNAPSHOT_FILE = os.environ.get("WHY_SO_SNAPSHOT_FILE")
+SNAPSHOT_INTERVAL = 5.0
+SNAPSHOT_CONFIRM_TIMEOUT = 60.0
+
+# Read PacketIn addresses straight from the frame bytes instead of a full
+# ryu.lib.packet decode.
+FAST_PATH_PARSER = True
+
+# Link cost used for path computation: hop, delay, bandwidth, etx or utilization.
+ROUTING_METRIC = os.environ.get("WHY_SO_ROUTING_METRIC", "hop")
+# Link properties (bw, delay, loss) written by min_env.env.export_link_properties.
+LINK_PROPERTIES_FILE = os.environ.get("WHY_SO_LINKS_FILE", "links.json")
+# Relative weight change needed before a measured link load reroutes traffic.
+ROUTING_REWEIGHT_THRESHOLD = 0.2
+# Routes spread over by a select group in proactive flows, 1 disables multipath.
+ROUTING_PATHS = 1
+# Only use alternatives as cheap as the best route (ECMP) instead of the k cheapest.
+ROUTING_EQUAL_COST = True
+
+# Port and flow counters polled from every datapath, spread over the interval.
+# Buffers hold STATS_HISTORY samples for at most STATS_MAX_PORTS ports and
+# STATS_MAX_FLOWS flows, 0 interval disables polling.
+STATS_INTERVAL = 10.0
+STATS_HISTORY = 30
+STATS_MAX_PORTS = 4096
+STATS_MAX_FLOWS = 16384
+
+# Handler latency histograms, per-datapath message counts and gauges. Off
+# leaves the handlers undecorated. Snapshots are dumped to the file every
+# INSTRUMENTATION_DUMP_INTERVAL seconds when a file is set, and served over
+# Ryu's WSGI server (--wsapi-port) when the API is enabled.
+INSTRUMENTATION = os.environ.get("WHY_SO_INSTRUMENTATION", "") == "1"
+INSTRUMENTATION_DUMP_FILE = os.environ.get("WHY_SO_INSTRUMENTATION_FILE")
+INSTRUMENTATION_DUMP_INTERVAL = 10.0
+INSTRUMENTATION_API = os.environ.get("WHY_SO_INSTRUMENTATION_API", "") == "1"
+# Sampling profiler, started at boot when set, otherwise through the API.
+PROFILER = os.environ.get("WHY_SO_PROFILER", "") == "1"
+PROFILER_INTERVAL = 0.005  # seconds between stack samples
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# ryu.controller.controller, imported by the controller modules, can only be
+# imported once app_manager is loaded, as ryu-manager does.
+from ryu.base import app_manager  # noqa: F401
+
+# The modules import each other by name, as ryu-manager runs them, and
+# the tests drive the controller through the benchmark harness.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.append(os.path.join(HERE, '..', 'benchmarks'))
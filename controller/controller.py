@@ -1,46 +1,260 @@
-from typing import Dict
-from collections import defaultdict
+import time
+from typing import Dict, List, Set, Tuple
+from collections import defaultdict, Counter
 from ryu.base import app_manager
 from ryu.ofproto import ofproto_v1_4
 from ryu.controller import ofp_event
-from ryu.lib.packet import packet, ethernet, arp, ipv4
 from ryu.ofproto import ether
 from ryu.controller.controller import Datapath
 from ryu.controller.handler import set_ev_cls, MAIN_DISPATCHER, CONFIG_DISPATCHER
 from ryu.topology import event as topo_event, switches as topo_sw
+from ryu.lib import hub
+from ryu.app.wsgi import WSGIApplication
 import networkx as nx
 
+import config
+import fastpath
 import utils
+import warm_start
+from action_cache import ActionCache
+from admission import Admission
+from api import APP_NAME, InstrumentationApi
+from cluster import ClusterBus
+from discovery import HostDiscovery
+from failover import FailoverGroups, link_key
+from flow_queue import FlowQueue
+from instrumentation import registry, timed
+from path_cache import PathCache, Route
+from routing import RoutingEngine, load_link_properties
+from stats import StatsCollector
+from topology_store import TopologyStore
+from warm_start import TableReader
 
 
 class Controller(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_4.OFP_VERSION]
+    _CONTEXTS = {"wsgi": WSGIApplication} if config.INSTRUMENTATION_API else {}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.graph = nx.Graph()
+        state = warm_start.load(config.SNAPSHOT_FILE)
+        self.graph = TopologyStore() if state is None else warm_start.topology(state)
+        self.paths = PathCache(self.graph)
+        self.routing = RoutingEngine(
+            self.paths, properties=load_link_properties(config.LINK_PROPERTIES_FILE))
+        self.actions = ActionCache()
+        self.flow_queue = FlowQueue()
         self.id_counter = 1
-        self.dpid_ports: Dict[int, Dict[int, str]] = defaultdict(dict)
+        # dpid -> MPLS label, kept after the switch leaves so it returns with the same one
+        self.mpls_ids: Dict[int, int] = {}
+        # MPLS label -> dpid, for reading flows back from the switches
+        self.mpls_dpids: Dict[int, int] = {}
         self.ip_to_dpid: Dict[str, int] = {}
+        # ip -> port of the hosts learned on switches this member owns
+        self.host_ports: Dict[str, int] = {}
         self.dps: Dict[int, Datapath] = {}
+        # dpid -> packets the switch can buffer, from its features reply
+        self.buffers: Dict[int, int] = {}
+        # dpid -> xids of the meter add and metered table-miss flows sent to it
+        self.meter_xids: Dict[int, Set[int]] = {}
+        # Switches that rejected the table-miss meter
+        self.unmetered: Set[int] = set()
+        # (dpid, eth_type, dst_ip) -> route of the label-stack flow installed
+        self.flows: Dict[Tuple[int, int, str], Route] = {}
+        # (u, v) with u < v -> keys of self.flows whose route crosses the link
+        self.flow_links: Dict[Tuple[int, int], Set[Tuple[int, int, str]]] = {}
+        # dpid -> {bucket (labels, out_port) pairs: select group id}
+        self.groups: Dict[int, Dict[Tuple, int]] = defaultdict(dict)
+        # key of self.flows -> select group id and routes of its buckets,
+        # for the flows installed through a multipath group
+        self.multipath: Dict[Tuple[int, int, str], Tuple[int, Tuple[Route, ...]]] = {}
+        # (dpid, select group id) -> flows sending through it
+        self.group_users: Counter = Counter()
+        self.failover = FailoverGroups(self.dps, self.graph, self.actions, self.flow_queue,
+                                       self.link_flow)
+        self._settle = None
+        self.counters = Counter()
+        self.discovery = HostDiscovery(self.ip_to_dpid, self.edge_ports)
+        self.admission = None
+        if config.ADMISSION_DATAPATH_RATE or config.ADMISSION_SOURCE_RATE:
+            self.admission = Admission()
+        self.stats = StatsCollector(self.dps)
+        if config.STATS_INTERVAL:
+            self.threads.append(self.stats.start())
+        # Only set in cluster mode, self.dps then holds the datapaths this
+        # member owns and self.graph every switch.
+        self.cluster = None
+        if config.CLUSTER_MEMBERS > 1:
+            self.cluster = ClusterBus(config.CLUSTER_INDEX, config.CLUSTER_MEMBERS, self.apply_fact)
+            self.threads.extend(self.cluster.start())
+        # Switches and links of the snapshot that did not come back yet, and
+        # the restored switches whose tables are being read for reconciling.
+        self.restored: Set[int] = set()
+        self.unconfirmed: Set[Tuple[int, int]] = set()
+        self.tables = TableReader()
+        self.started = time.monotonic()
+        # Seconds from start until the first PacketIn was routed to another switch
+        self.first_routed = None
+        self._saved = None
+        if state is not None:
+            self.restore_state(state)
+        if config.SNAPSHOT_FILE:
+            self.threads.append(hub.spawn(self.keep_state))
+        self.setup_instrumentation(kwargs.get("wsgi"))
+
+    def restore_state(self, state: warm_start.State):
+        """Take labels and hosts from a snapshot, the graph already came from
+        it. What does not show up again within SNAPSHOT_CONFIRM_TIMEOUT is
+        dropped."""
+        self.id_counter = state.id_counter
+        for dpid, label, _ in state.switches.tolist():
+            self.mpls_ids[dpid] = label
+            self.mpls_dpids[label] = dpid
+        for ip, dpid, port_no in warm_start.hosts(state):
+            self.ip_to_dpid[ip] = dpid
+            if port_no:
+                self.host_ports[ip] = port_no
+        self.restored.update(self.graph)
+        self.unconfirmed.update(self.graph.links())
+        self.threads.append(hub.spawn_after(config.SNAPSHOT_CONFIRM_TIMEOUT, self.expire_restored))
+
+    def expire_restored(self):
+        for dpid in list(self.restored):
+            self.remove_switch(dpid)
+        for u, v in list(self.unconfirmed):
+            self.remove_link(u, v)
+        self.restored.clear()
+        self.unconfirmed.clear()
+
+    def save_state(self) -> bool:
+        """Write a snapshot if anything changed since the last one"""
+        state = warm_start.capture(self.graph, self.mpls_ids, self.id_counter,
+                                   self.ip_to_dpid, self.host_ports)
+        data = warm_start.encode(state._replace(taken=0.0))
+        if data == self._saved:
+            return False
+        warm_start.save(config.SNAPSHOT_FILE, warm_start.encode(state))
+        self._saved = data
+        self.counters["snapshots_saved"] += 1
+        return True
+
+    def keep_state(self):
+        while True:
+            hub.sleep(config.SNAPSHOT_INTERVAL)
+            self.save_state()
+
+    def close(self):
+        if config.SNAPSHOT_FILE:
+            self.save_state()
+
+    def setup_instrumentation(self, wsgi: WSGIApplication = None):
+        if registry.enabled:
+            registry.gauge("path_cache_hit_rate", lambda: hit_rate(self.paths))
+            registry.gauge("action_cache_hit_rate", lambda: hit_rate(self.actions))
+            registry.gauge("flow_queue_pending",
+                           lambda: sum(self.flow_queue.pending(dpid) for dpid in self.dps))
+            registry.gauge("datapaths", lambda: len(self.dps))
+            registry.gauge("routes_installed", lambda: len(self.flows))
+            registry.gauge("failover_groups", lambda: len(self.failover))
+            registry.gauge("first_routed_s", lambda: self.first_routed)
+            if self.admission is not None:
+                registry.gauge("packet_in_throttled_source", lambda: self.admission.throttled_source)
+                registry.gauge("packet_in_throttled_datapath",
+                               lambda: self.admission.throttled_datapath)
+            if config.SNAPSHOT_FILE:
+                registry.gauge("restored_unconfirmed",
+                               lambda: len(self.restored) + len(self.unconfirmed))
+            if self.cluster is not None:
+                registry.gauge("cluster_facts_received", lambda: self.cluster.received)
+                registry.gauge("cluster_facts_waiting", lambda: len(self.cluster.waiting))
+                registry.gauge("cluster_facts_expired", lambda: self.cluster.expired)
+            if config.INSTRUMENTATION_DUMP_FILE:
+                self.threads.append(registry.start_dumps(config.INSTRUMENTATION_DUMP_FILE,
+                                                         config.INSTRUMENTATION_DUMP_INTERVAL))
+        if wsgi is not None:
+            wsgi.register(InstrumentationApi, {APP_NAME: self})
+        if config.PROFILER:
+            registry.profiler.start()
+
+    def instrumentation_snapshot(self) -> Dict:
+        snapshot = registry.snapshot()
+        snapshot["counters"].update(self.counters)
+        return snapshot
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
+        self.buffers[datapath.id] = ev.msg.n_buffers
+        if not self.owns(datapath.id) or datapath.id in self.restored:
+            # Restored switches get it when reconciling, if they lost it.
+            return
+        if self.metered(datapath.id):
+            self.add_table_miss_meter(datapath)
+        datapath.send_msg(self.table_miss_flow(datapath))
+
+    def metered(self, dpid: int) -> bool:
+        return bool(config.TABLE_MISS_METER_RATE) and dpid not in self.unmetered
+
+    def add_table_miss_meter(self, datapath: Datapath):
+        """Limit the rate of table misses sent to the controller in the switch"""
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        # A meter left from before a reconnect would make the add fail,
+        # deleting it takes the old table-miss flow along.
+        datapath.send_msg(parser.OFPMeterMod(datapath, command=ofproto.OFPMC_DELETE,
+                                             meter_id=config.TABLE_MISS_METER))
+        bands = [parser.OFPMeterBandDrop(rate=config.TABLE_MISS_METER_RATE,
+                                         burst_size=config.TABLE_MISS_METER_BURST)]
+        mod = parser.OFPMeterMod(datapath, command=ofproto.OFPMC_ADD,
+                                 flags=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+                                 meter_id=config.TABLE_MISS_METER, bands=bands)
+        datapath.set_xid(mod)
+        self.meter_xids[datapath.id] = {mod.xid}
+        datapath.send_msg(mod)
+
+    def table_miss_flow(self, datapath: Datapath):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
         match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        # Only the head of the frame when the switch keeps the rest, a
+        # switch without buffers would send it cut short.
+        max_len = ofproto.OFPCML_NO_BUFFER
+        if self.buffers.get(datapath.id):
+            max_len = config.PACKET_IN_MAX_LEN
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, max_len)]
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        if not self.metered(datapath.id):
+            return parser.OFPFlowMod(datapath=datapath, priority=0, match=match, instructions=inst)
+        inst.insert(0, parser.OFPInstructionMeter(config.TABLE_MISS_METER, ofproto.OFPIT_METER))
+        mod = parser.OFPFlowMod(datapath=datapath, priority=0, match=match, instructions=inst)
+        # Rejected along with the meter by a switch without meters.
+        datapath.set_xid(mod)
+        self.meter_xids.setdefault(datapath.id, set()).add(mod.xid)
+        return mod
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def error_msg(self, ev: ofp_event.EventOFPErrorMsg):
+        """A switch that rejected the table-miss meter or the flow using it
+        would send no PacketIns at all, it gets an unmetered table-miss flow"""
+        msg = ev.msg
+        dp = msg.datapath
+        if msg.xid not in self.meter_xids.get(dp.id, ()):
+            return
+        del self.meter_xids[dp.id]
+        self.unmetered.add(dp.id)
+        self.counters["meter_rejected"] += 1
+        self.logger.warning("switch %016x rejected the table-miss meter (error type %d code %d), "
+                            "table misses are not metered", dp.id, msg.type, msg.code)
+        dp.send_msg(self.table_miss_flow(dp))
 
     def add_mpls_pop(self, dp: Datapath):
         ofproto = dp.ofproto
         parser = dp.ofproto_parser
 
         instructions = [
-            parser.OFPInstructionActions([parser.OFPActionPopMpls(ether.ETH_TYPE_MPLS)]),
+            parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                         [parser.OFPActionPopMpls(ether.ETH_TYPE_MPLS)]),
             parser.OFPInstructionGotoTable(1)]
         mod = parser.OFPFlowMod(
             datapath=dp,
@@ -50,9 +264,9 @@ class Controller(app_manager.RyuApp):
             instructions=instructions
         )
 
-        dp.send_msg(mod)
+        self.flow_queue.put(dp, mod)
 
-    def add_flow(self, datapath: Datapath, priority, match, actions, table_id=0):
+    def add_flow(self, datapath: Datapath, priority, match, actions, table_id=0, **kwargs):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
@@ -60,20 +274,199 @@ class Controller(app_manager.RyuApp):
                                              actions)]
 
         mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                match=match, instructions=inst, table_id=table_id)
+                                match=match, instructions=inst, table_id=table_id,
+                                **kwargs)
+        datapath.send_msg(mod)
+
+    def flow_mod(self, datapath: Datapath, priority, match, actions, table_id=0):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                             actions)]
+
+        return parser.OFPFlowMod(datapath=datapath, priority=priority,
+                                 match=match, instructions=inst, table_id=table_id)
+
+    def queue_flow(self, datapath: Datapath, priority, match, actions, table_id=0):
+        """Same as add_flow, but goes through the deduplicating bring-up queue"""
+        self.flow_queue.put(datapath, self.flow_mod(datapath, priority, match, actions, table_id))
+
+    def delete_flow(self, datapath: Datapath, table_id, priority, match):
+        ofproto = datapath.ofproto
+        mod = datapath.ofproto_parser.OFPFlowMod(
+            datapath=datapath, command=ofproto.OFPFC_DELETE_STRICT, table_id=table_id,
+            priority=priority, match=match, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY)
         datapath.send_msg(mod)
 
-    def add_link_flows(self, dpid: int, port: topo_sw.Port):
-        """Add to table flow to match by id and forward to this port"""
-        dp = self.dps[dpid]
+    def delete_queued(self, datapath: Datapath, mod):
+        """Delete a flow sent through the bring-up queue, it can be queued again later"""
+        self.flow_queue.discard(datapath, mod)
+        self.delete_flow(datapath, mod.table_id, mod.priority, mod.match)
+
+    def add_route_flow(self, dp: Datapath, eth_type: int, dst_ip: str, route: Route,
+                       labels: Tuple[int, ...], out_port: int, dst_dpid: int,
+                       group_id: int = None):
+        """Install the label stack for dst_ip on the ingress switch"""
+        key = (dp.id, eth_type, dst_ip)
+        if key in self.flows:
+            # FlowMod is already on its way, this packet raced it.
+            return
+
+        instructions = None
+        routes = ()
+        select_id = None
+        if config.ROUTING_PATHS > 1:
+            multipath = self.multipath_instructions(dp, dst_dpid)
+            if multipath is not None:
+                instructions, select_id, routes = multipath
+        if instructions is None:
+            instructions = self.actions.instructions(dp, labels, out_port, group_id)
+
         parser = dp.ofproto_parser
-        match = parser.OFPMatch(mpls_label=self.graph.nodes[port.dpid])
-        actions = [parser.OFPActionOutput(port.port_no)]
-        self.add_flow(dp, 10, match, actions, table_id=1)
-        self.add_mpls_pop(dp)
+        mod = parser.OFPFlowMod(
+            datapath=dp,
+            priority=config.FLOW_PRIORITY,
+            match=route_match(parser, eth_type, dst_ip),
+            instructions=instructions,
+            idle_timeout=config.FLOW_IDLE_TIMEOUT,
+            hard_timeout=config.FLOW_HARD_TIMEOUT,
+            flags=dp.ofproto.OFPFF_SEND_FLOW_REM
+        )
+        dp.send_msg(mod)
+        self.remember_flow(key, route, routes, select_id)
+        self.counters["flows_installed"] += 1
+
+    def remember_flow(self, key: Tuple[int, int, str], route: Route,
+                      alternatives: Tuple[Route, ...] = (), group_id: int = None):
+        """Track an installed ingress flow, under every link its route or
+        the buckets of its select group cross"""
+        self.flows[key] = route
+        if group_id is not None:
+            self.multipath[key] = (group_id, alternatives)
+            self.group_users[key[0], group_id] += 1
+        for link in routed_links(key[0], route, alternatives):
+            self.flow_links.setdefault(link, set()).add(key)
+
+    def forget_flow(self, key: Tuple[int, int, str]):
+        route = self.flows.pop(key, None)
+        if route is None:
+            return
+        alternatives = ()
+        multipath = self.multipath.pop(key, None)
+        if multipath is not None:
+            group_id, alternatives = multipath
+            self.release_route_group(key[0], group_id)
+        for link in routed_links(key[0], route, alternatives):
+            keys = self.flow_links.get(link)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.flow_links[link]
+
+    def reroute_link(self, u: int, v: int):
+        """Move the ingress flows routed over u-v to their new route, an add
+        with the same match replaces the old label stack. Flows left without
+        a route are deleted."""
+        for key in list(self.flow_links.get(link_key(u, v), ())):
+            dpid, eth_type, dst_ip = key
+            dst_dpid = self.ip_to_dpid.get(dst_ip)
+            if key not in self.multipath and self.unchanged(key, dst_dpid):
+                continue
+            self.forget_flow(key)
+            dp = self.dps.get(dpid)
+            if dp is None:
+                continue
+            if dst_dpid is not None and dst_dpid in self.graph:
+                try:
+                    self.route_actions(dp, dst_dpid, dst_ip, eth_type)
+                    self.counters["flows_rerouted"] += 1
+                    continue
+                except nx.NetworkXNoPath:
+                    pass
+            self.delete_flow(dp, 0, config.FLOW_PRIORITY,
+                             route_match(dp.ofproto_parser, eth_type, dst_ip))
+            self.counters["flows_invalidated"] += 1
+
+    def unchanged(self, key: Tuple[int, int, str], dst_dpid: int) -> bool:
+        """Whether the installed flow key still follows the shortest route"""
+        if dst_dpid is None or dst_dpid not in self.graph:
+            return False
+        try:
+            return self.paths.get(key[0], dst_dpid) == self.flows[key]
+        except nx.NetworkXNoPath:
+            return False
+
+    def multipath_instructions(self, dp: Datapath, dst_dpid: int):
+        """Instructions sending through a select group over the alternative
+        routes to dst_dpid with the group id and the routes, None if there
+        is only one route"""
+        if config.ROUTING_EQUAL_COST:
+            routes = self.routing.equal_cost(dp.id, dst_dpid, config.ROUTING_PATHS)
+        else:
+            routes = self.routing.alternatives(dp.id, dst_dpid, config.ROUTING_PATHS)
+        if len(routes) < 2:
+            return None
+
+        graph = self.graph
+        buckets = tuple((tuple(graph.label(point) for point in path), graph.port(dp.id, first))
+                        for first, path in routes)
+        group_id = self.add_route_group(dp, buckets)
+        parser = dp.ofproto_parser
+        instructions = [parser.OFPInstructionActions(dp.ofproto.OFPIT_APPLY_ACTIONS,
+                                                     [parser.OFPActionGroup(group_id)])]
+        return instructions, group_id, tuple(routes)
+
+    def add_route_group(self, dp: Datapath, buckets: Tuple) -> int:
+        groups = self.groups[dp.id]
+        group_id = groups.get(buckets)
+        if group_id is None:
+            group_id = groups[buckets] = max(groups.values(), default=0) + 1
+            ofproto = dp.ofproto
+            parser = dp.ofproto_parser
+            mod = parser.OFPGroupMod(
+                datapath=dp,
+                command=ofproto.OFPGC_ADD,
+                type_=ofproto.OFPGT_SELECT,
+                group_id=group_id,
+                buckets=[parser.OFPBucket(weight=1, watch_port=port,
+                                          actions=self.actions.path(dp, labels, port))
+                         for labels, port in buckets]
+            )
+            dp.send_msg(mod)
+        return group_id
+
+    def release_route_group(self, dpid: int, group_id: int):
+        """Delete a select group once no flow sends through it any more"""
+        users = self.group_users
+        users[dpid, group_id] -= 1
+        if users[dpid, group_id] > 0:
+            return
+        del users[dpid, group_id]
+        groups = self.groups.get(dpid, {})
+        for buckets in [buckets for buckets, used in groups.items() if used == group_id]:
+            del groups[buckets]
+        dp = self.dps.get(dpid)
+        if dp is not None:
+            dp.send_msg(dp.ofproto_parser.OFPGroupMod(dp, command=dp.ofproto.OFPGC_DELETE,
+                                                      group_id=group_id))
+
+    def add_link_flows(self, src: int, src_port: int, dst: int):
+        """Add to table flow on src switch to match by id of dst switch and forward to src port"""
+        dp = self.dps.get(src)
+        if dp is None:
+            return
+        actions = [dp.ofproto_parser.OFPActionOutput(src_port)]
+        self.flow_queue.put(dp, self.link_flow(dp, dst, actions))
+        self.flow_queue.flush(dp)
+
+    def link_flow(self, dp: Datapath, peer: int, actions: List):
+        """Table 1 flow handing packets labelled for neighbour peer to actions"""
+        match = dp.ofproto_parser.OFPMatch(mpls_label=self.mpls_ids[peer])
+        return self.flow_mod(dp, 10, match, actions, table_id=1)
 
     def send_arp_mod(self, dp: Datapath):
-        match = dp.ofproto_parser.OFPMatch(eth_type=ether.ETH_TYPE_ARP, eth_dst='fe:ee:ee:ee:ee:ef')
+        match = dp.ofproto_parser.OFPMatch(eth_type=ether.ETH_TYPE_ARP, eth_dst=utils.PROBE_MAC)
         actions = [
             dp.ofproto_parser.OFPActionOutput(dp.ofproto.OFPP_CONTROLLER, dp.ofproto.OFPCML_NO_BUFFER)
         ]
@@ -81,94 +474,465 @@ class Controller(app_manager.RyuApp):
             dp.ofproto_parser.OFPInstructionActions(dp.ofproto.OFPIT_APPLY_ACTIONS, actions=actions)
         ]
         mod = dp.ofproto_parser.OFPFlowMod(datapath=dp, match=match, instructions=instructions)
-        dp.send_msg(mod)
-
-    def send_arp(self, dp: Datapath, port):
-        for dst_id in range(1, 20):
-            actions = [dp.ofproto_parser.OFPActionOutput(port.port_no)]
-            out = dp.ofproto_parser.OFPPacketOut(
-                datapath=dp,
-                buffer_id=dp.ofproto.OFP_NO_BUFFER,
-                in_port=dp.ofproto.OFPP_CONTROLLER,
-                actions=actions,
-                data=utils.build_arp(dst_id)
-            )
-            dp.send_msg(out)
+        self.flow_queue.put(dp, mod)
+
+    def edge_ports(self, dp: Datapath) -> List[int]:
+        """Live ports of dp that are not known to lead to another switch"""
+        links = self.graph.ports(dp.id).values()
+        return [port.port_no for port in dp.ports.values()
+                if port.state & dp.ofproto.OFPPS_LIVE and port.port_no not in links]
+
+    def learn_host(self, dp: Datapath, ip: str, port_no: int):
+        """Remember where ip lives and deliver traffic for it to port_no"""
+        self.ip_to_dpid[ip] = dp.id
+        self.host_ports[ip] = port_no
+        if self.cluster is not None:
+            self.cluster.publish(("host", ip), {"type": "host", "ip": ip, "dpid": dp.id})
+        self.add_host_flows(dp, ip, port_no)
+        self.flow_queue.flush(dp)
+
+        if self.discovery.host_learned(ip):
+            self.logger.info("host discovery: %s", self.discovery.report())
+
+    def add_host_flows(self, dp: Datapath, ip: str, port_no: int):
+        parser = dp.ofproto_parser
+        actions = [parser.OFPActionOutput(port_no)]
+        for table_id in [0, 1]:
+            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, ipv4_dst=ip)
+            self.queue_flow(dp, 1, match, actions, table_id=table_id)
+            match = parser.OFPMatch(eth_type=ether.ETH_TYPE_ARP, arp_tpa=ip)
+            self.queue_flow(dp, 1, match, actions, table_id=table_id)
 
     @set_ev_cls(topo_event.EventSwitchEnter)
+    @timed("new_switch")
     def new_switch(self, ev: topo_event.EventSwitchEnter):
         dp: Datapath = ev.switch.dp
+        if dp.id in self.dps:
+            return
+        if self.cluster is not None and not 0 < dp.id <= utils.MPLS_LABEL_MAX:
+            # Every member pushes the dpid itself as label, see below.
+            self.logger.error("switch %016x refused: cluster mode needs datapath ids up to %d, "
+                              "they are its MPLS labels", dp.id, utils.MPLS_LABEL_MAX)
+            self.counters["switches_refused"] += 1
+            return
 
-        if dp.id not in self.graph.nodes:
-            self.graph.add_node(dp.id, id=self.id_counter)
-            self.dps[dp.id] = dp
-            self.id_counter += 1
-
-            for port in dp.ports.values():
-                if port.state == 4:
-                    self.send_arp_mod(dp)
-                    self.send_arp(dp, port)
+        # Switches restored from a snapshot are in the graph already.
+        restored = dp.id in self.restored
+        self.restored.discard(dp.id)
+        if dp.id not in self.graph:
+            mpls_id = self.mpls_ids.get(dp.id)
+            if mpls_id is None:
+                if self.cluster is not None:
+                    # Every member has to push the same labels, so they
+                    # cannot depend on the order switches connected in.
+                    # Mininet names switches sN and gives them dpid N.
+                    mpls_id = dp.id
+                else:
+                    mpls_id = self.id_counter
+                    self.id_counter += 1
+                self.mpls_ids[dp.id] = mpls_id
+                self.mpls_dpids[mpls_id] = dp.id
+            self.graph.add_switch(dp.id, mpls_id)
+        if self.cluster is not None:
+            self.request_role(dp)
+            self.cluster.retry()
+        if not self.owns(dp.id):
+            return
+        self.dps[dp.id] = dp
+        registry.count_sends(dp)
+
+        if restored:
+            # It kept its tables through our restart, read them back
+            # instead of installing everything again.
+            self.tables.read(dp)
+        else:
+            # Start from an empty group table, groups left from before a
+            # reconnect would make the adds fail.
+            dp.send_msg(dp.ofproto_parser.OFPGroupMod(dp, command=dp.ofproto.OFPGC_DELETE,
+                                                      group_id=dp.ofproto.OFPG_ALL))
+            self.send_arp_mod(dp)
+            self.add_mpls_pop(dp)
+            self.flow_queue.flush(dp)
+
+        self.discovery.add_datapath(dp)
+
+    def reconcile(self, dp: Datapath, flows: List, groups: List):
+        """Bring the tables a restored switch reported up to date: what would
+        be installed now and is there already is adopted, only what is
+        missing goes out and the rest is deleted"""
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        self.flow_queue.adopt(dp.id, flows)
+        if self.flow_queue.put(dp, self.table_miss_flow(dp)) and self.metered(dp.id):
+            self.add_table_miss_meter(dp)
+        self.send_arp_mod(dp)
+        self.add_mpls_pop(dp)
+        for ip, port_no in self.host_ports.items():
+            if self.ip_to_dpid.get(ip) == dp.id:
+                self.add_host_flows(dp, ip, port_no)
+        if config.FAST_FAILOVER:
+            others = self.failover.adopt(dp, groups, self.mpls_dpids)
+        else:
+            others = [group.group_id for group in groups]
+            for peer, port_no in self.graph.ports(dp.id).items():
+                self.flow_queue.put(dp, self.link_flow(dp, peer, [parser.OFPActionOutput(port_no)]))
+        # Select groups of multipath routes, their flows go with them.
+        for group_id in others:
+            dp.send_msg(parser.OFPGroupMod(dp, command=ofproto.OFPGC_DELETE, group_id=group_id))
+
+        adopted = stale = 0
+        for flow in self.flow_queue.unclaimed(dp.id):
+            if flow.table_id == 0 and flow.priority == config.FLOW_PRIORITY \
+                    and self.adopt_route(dp, flow):
+                adopted += 1
+                continue
+            self.delete_flow(dp, flow.table_id, flow.priority, flow.match)
+            stale += 1
+        self.flow_queue.flush(dp)
+        self.counters["routes_adopted"] += adopted
+        self.counters["flows_stale"] += stale
+        self.logger.info("switch %016x reconciled: %d of %d flows kept, %d deleted",
+                         dp.id, len(flows) - stale, len(flows), stale)
+
+    def adopt_route(self, dp: Datapath, flow) -> bool:
+        """Track an ingress flow installed before the restart, False if its
+        route is not in the graph any more"""
+        match = flow.match
+        dst_ip = match.get("ipv4_dst", match.get("arp_tpa"))
+        actions = [action for instruction in flow.instructions
+                   for action in getattr(instruction, "actions", ())]
+        labels, port_no, group_id = utils.read_path(dp.ofproto, actions)
+        if group_id is not None:
+            first = self.mpls_dpids.get(group_id - config.FAILOVER_GROUP_BASE)
+            if first is None or self.failover.group_id(dp.id, first) != group_id:
+                return False
+        else:
+            first = self.graph.peer(dp.id, port_no)
+        path = tuple(self.mpls_dpids.get(label) for label in labels)
+        if dst_ip is None or first is None or None in path:
+            return False
+        route = (first, path)
+        if not all(self.graph.has_link(u, v) for u, v in route_links(dp.id, route)):
+            return False
+        self.remember_flow((dp.id, match["eth_type"], dst_ip), route)
+        return True
 
     @set_ev_cls(topo_event.EventLinkAdd)
+    @timed("new_link")
     def new_link(self, ev: topo_event.EventLinkAdd):
         src: topo_sw.Port = ev.link.src
         dst: topo_sw.Port = ev.link.dst
+        if self.add_link(src.dpid, src.port_no, dst.dpid, dst.port_no) and self.cluster is not None:
+            self.cluster.publish(link_key(src.dpid, dst.dpid), {
+                "type": "link", "src": src.dpid, "src_port": src.port_no,
+                "dst": dst.dpid, "dst_port": dst.port_no})
+
+    def add_link(self, src: int, src_port: int, dst: int, dst_port: int) -> bool:
+        """Route over src-dst from now on, False if it was known already"""
+        self.unconfirmed.discard(link_key(src, dst))
+        if self.graph.has_link(src, dst):
+            return False
+        self.routing.add_link(src, dst, src_port, dst_port)
+        if config.FAST_FAILOVER:
+            self.failover.link_added(src, dst)
+            if self._settle is None:
+                self._settle = hub.spawn_after(config.FAILOVER_SETTLE, self.settle_failover)
+        else:
+            self.add_link_flows(src, src_port, dst)
+            self.add_link_flows(dst, dst_port, src)
+
+        self.actions.evict_paths()
+        return True
+
+    def settle_failover(self):
+        self._settle = None
+        self.failover.settle()
+
+    @set_ev_cls(topo_event.EventLinkDelete)
+    @timed("link_delete")
+    def link_delete(self, ev: topo_event.EventLinkDelete):
+        src, dst = ev.link.src.dpid, ev.link.dst.dpid
+        self.remove_link(src, dst)
+        if self.cluster is not None:
+            self.cluster.retract(link_key(src, dst), {"type": "unlink", "src": src, "dst": dst})
+
+    def apply_fact(self, fact: Dict) -> bool:
+        """Apply a link or host another cluster member learned, False if
+        the switches it names are not known yet"""
+        kind = fact["type"]
+        if kind == "link":
+            if fact["src"] not in self.graph or fact["dst"] not in self.graph:
+                return False
+            self.add_link(fact["src"], fact["src_port"], fact["dst"], fact["dst_port"])
+        elif kind == "unlink":
+            self.remove_link(fact["src"], fact["dst"])
+        elif kind == "host":
+            self.ip_to_dpid[fact["ip"]] = fact["dpid"]
+        elif kind == "unhost":
+            if self.ip_to_dpid.get(fact["ip"]) == fact["dpid"]:
+                del self.ip_to_dpid[fact["ip"]]
+        return True
+
+    def owns(self, dpid: int) -> bool:
+        return self.cluster is None or self.cluster.owns(dpid)
+
+    def request_role(self, dp: Datapath):
+        """Become master of the datapaths this member owns and slave of the
+        rest, slaves get no PacketIns"""
+        ofproto = dp.ofproto
+        role = ofproto.OFPCR_ROLE_MASTER if self.owns(dp.id) else ofproto.OFPCR_ROLE_SLAVE
+        dp.send_msg(dp.ofproto_parser.OFPRoleRequest(dp, role, self.cluster.generation))
+
+    @set_ev_cls(topo_event.EventSwitchLeave)
+    @timed("switch_leave")
+    def switch_leave(self, ev: topo_event.EventSwitchLeave):
+        dpid = ev.switch.dp.id
+        if dpid in self.graph:
+            self.remove_switch(dpid)
+
+    def remove_switch(self, dpid: int):
+        # Nothing is sent to it any more and its hosts are gone with it, the
+        # neighbours are updated link by link.
+        self.dps.pop(dpid, None)
+        self.buffers.pop(dpid, None)
+        self.meter_xids.pop(dpid, None)
+        for ip in [ip for ip, owner in self.ip_to_dpid.items() if owner == dpid]:
+            del self.ip_to_dpid[ip]
+            self.host_ports.pop(ip, None)
+            if self.cluster is not None and self.owns(dpid):
+                self.cluster.retract(("host", ip), {"type": "unhost", "ip": ip, "dpid": dpid})
+        for peer in self.graph.neighbours(dpid):
+            self.remove_link(dpid, peer)
+        self.routing.remove_switch(dpid)
+        self.failover.forget(dpid)
+        self.groups.pop(dpid, None)
+        self.actions.evict(dpid)
+        self.flow_queue.forget(dpid)
+        self.tables.forget(dpid)
+        if self.admission is not None:
+            self.admission.forget(dpid)
+        self.stats.forget(dpid)
+        self.discovery.remove_datapath(dpid)
+        self.counters["switches_removed"] += 1
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def port_status(self, ev: ofp_event.EventOFPPortStatus):
+        """An inter-switch port going down takes its link out right away,
+        LLDP would only notice after missing a few probes. Links that come
+        back are added again once LLDP sees them."""
+        msg = ev.msg
+        dp = msg.datapath
+        ofproto = dp.ofproto
+        port = msg.desc
+        if (msg.reason != ofproto.OFPPR_DELETE and not port.state & ofproto.OFPPS_LINK_DOWN
+                and not port.config & ofproto.OFPPC_PORT_DOWN):
+            return
+        peer = self.graph.peer(dp.id, port.port_no)
+        if peer is not None:
+            self.remove_link(dp.id, peer)
 
-        if not self.graph.has_edge(src.dpid, dst.dpid):
-            self.add_link_flows(src.dpid, dst)
-            self.add_link_flows(dst.dpid, src)
-
-            self.graph.add_edge(src.dpid, dst.dpid, weight=1)
-            self.dpid_ports[src.dpid][dst.dpid] = src.port_no
-            self.dpid_ports[dst.dpid][src.dpid] = dst.port_no
+    def remove_link(self, u: int, v: int):
+        """Take u-v out of routing and out of the flows and failover groups using it"""
+        if not self.graph.has_link(u, v):
+            return
+        ports = {u: self.graph.port(u, v), v: self.graph.port(v, u)}
+        self.routing.remove_link(u, v)
+        if config.FAST_FAILOVER:
+            self.failover.link_removed(u, v)
+        else:
+            for dpid, peer in ((u, v), (v, u)):
+                dp = self.dps.get(dpid)
+                if dp is not None:
+                    actions = [dp.ofproto_parser.OFPActionOutput(ports[dpid])]
+                    self.delete_queued(dp, self.link_flow(dp, peer, actions))
+        self.reroute_link(u, v)
+        self.counters["links_removed"] += 1
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply(self, ev: ofp_event.EventOFPBarrierReply):
+        msg = ev.msg
+        burst = self.flow_queue.barrier_reply(msg.datapath.id, msg.xid)
+        if burst is not None:
+            elapsed, size = burst
+            self.logger.info("switch %016x applied %d flows in %.1f ms",
+                             msg.datapath.id, size, elapsed * 1000)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply(self, ev: ofp_event.EventOFPPortStatsReply):
+        dpid = ev.msg.datapath.id
+        self.stats.port_stats_reply(dpid, ev.msg.body)
+        if config.ROUTING_METRIC == "utilization":
+            self.update_link_load(dpid)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply(self, ev: ofp_event.EventOFPFlowStatsReply):
+        msg = ev.msg
+        more = bool(msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE)
+        if self.tables.expects(msg.datapath.id, msg.xid):
+            self.table_reply(msg, more)
+        else:
+            self.stats.flow_stats_reply(msg.datapath.id, msg.body, more)
+
+    @set_ev_cls(ofp_event.EventOFPGroupDescStatsReply, MAIN_DISPATCHER)
+    def group_desc_stats_reply(self, ev: ofp_event.EventOFPGroupDescStatsReply):
+        msg = ev.msg
+        if self.tables.expects(msg.datapath.id, msg.xid):
+            self.table_reply(msg, bool(msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE))
+
+    def table_reply(self, msg, more: bool):
+        tables = self.tables.reply(msg.datapath.id, msg.xid, msg.body, more)
+        if tables is not None:
+            self.reconcile(msg.datapath, *tables)
+
+    def update_link_load(self, dpid: int):
+        """Feed the measured load of dpid's inter-switch links to routing,
+        the installed flows over a link whose weight moved are rerouted"""
+        changed = []
+        for peer, port_no in self.graph.ports(dpid).items():
+            capacity = self.routing.properties.get((dpid, peer), {}).get("bw", 1000) * 1e6
+            utilization = self.stats.link_utilization(dpid, port_no, capacity)
+            if self.routing.update_utilization(dpid, peer, utilization):
+                changed.append(peer)
+        if not changed:
+            return
+        # Push actions and select groups were built for the old weights.
+        self.actions.evict_paths()
+        for peer in changed:
+            self.reroute_link(dpid, peer)
+        self.counters["links_reweighted"] += len(changed)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed(self, ev: ofp_event.EventOFPFlowRemoved):
+        msg = ev.msg
+        if msg.reason == msg.datapath.ofproto.OFPRR_GROUP_DELETE:
+            # Went with a select group release_route_group deleted, its
+            # flows were forgotten then and may be installed again already.
+            return
+        match = msg.match
+        dst_ip = match.get("ipv4_dst", match.get("arp_tpa"))
+        if msg.priority == config.FLOW_PRIORITY and dst_ip is not None:
+            self.forget_flow((msg.datapath.id, match["eth_type"], dst_ip))
+            self.counters["flows_removed"] += 1
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @timed("packet_in")
     def packet_in(self, ev: ofp_event.EventOFPPacketIn):
+        self.counters["packet_in"] += 1
+        msg = ev.msg
+        if self.admission is not None and not self.admission.admit(msg.datapath.id, msg.data):
+            self.counters["packet_in_throttled"] += 1
+            return
+        self.handle_packet_in(ev)
+
+    @timed("handle_packet_in")
+    def handle_packet_in(self, ev: ofp_event.EventOFPPacketIn):
         msg = ev.msg
         src_dp: Datapath = msg.datapath
         ofproto = src_dp.ofproto
         parser = src_dp.ofproto_parser
 
-        pkt = packet.Packet(msg.data)
-        eth_pkt = pkt.get_protocol(ethernet.ethernet)
-
-        if eth_pkt.ethertype == ether.ETH_TYPE_LLDP:
+        if config.FAST_PATH_PARSER:
+            frame = fastpath.parse(msg.data)
+        else:
+            frame = fastpath.parse_full(msg.data)
+        if frame is None or frame.from_probe:
+            # LLDP, something we do not route, or one of our own probes
+            # that left through an inter-switch port.
+            self.release(msg)
             return
 
-        if eth_pkt.ethertype == ether.ETH_TYPE_ARP:
-            print("hello")
-            arp_pkt = pkt.get_protocol(arp.arp)
-            if eth_pkt.dst == 'fe:ee:ee:ee:ee:ef':
-                self.ip_to_dpid[arp_pkt.src_ip] = src_dp.id
-                for table_id in [0, 1]:
-                    match = parser.OFPMatch(ipv4_dst=arp_pkt.src_ip)
-                    actions = [parser.OFPActionOutput(msg.match["in_port"])]
-                    self.add_flow(src_dp, 1, match, actions, table_id=table_id)
-                    return
-
-            dst_ip: str = arp_pkt.dst_ip
+        src_ip: str = frame.src_ip
+        dst_ip: str = frame.dst_ip
+        in_port: int = msg.match["in_port"]
+        if src_ip not in self.ip_to_dpid and self.graph.peer(src_dp.id, in_port) is None:
+            self.learn_host(src_dp, src_ip, in_port)
+        if frame.to_probe:
+            # Reply to a discovery probe, nothing to forward.
+            self.release(msg)
+            return
 
         src_dpid: int = src_dp.id
-        dst_dpid: int = self.ip_to_dpid[dst_ip]
-
-        first, path = utils.get_shortest_path(self.graph, src_dpid, dst_dpid)
-        nodes = self.graph.nodes
-
-        actions = []
-
-        for point in path:
-            actions.extend(utils.construct_mpls(src_dp, nodes[point]["id"]))
-
-        out_port = self.dpid_ports[src_dpid][first]
-        actions.append(parser.OFPActionOutput(out_port))
+        dst_dpid = self.ip_to_dpid.get(dst_ip)
+        if dst_dpid is None:
+            self.counters["unknown_dst"] += 1
+            self.release(msg)
+            return
+        if dst_dpid == src_dpid:
+            # Arrived before the host flows did, the flow table delivers it now.
+            actions = [parser.OFPActionOutput(ofproto.OFPP_TABLE)]
+        else:
+            actions = self.route_actions(src_dp, dst_dpid, dst_ip, frame.ethertype)
+            if self.first_routed is None:
+                self.first_routed = time.monotonic() - self.started
+                self.logger.info("first packet routed %.3f s after start", self.first_routed)
+
+        # The switch buffered the frame and sent only its head, or sent all of it.
+        buffered = msg.buffer_id != ofproto.OFP_NO_BUFFER
+        if not buffered and len(msg.data) < msg.total_len:
+            # Cut short by a switch that could not buffer it, nothing to send on.
+            self.counters["packet_in_truncated"] += 1
+            return
 
         # construct packet_out message and send it.
         out = parser.OFPPacketOut(
             datapath=src_dp,
-            buffer_id=ofproto.OFP_NO_BUFFER,
+            buffer_id=msg.buffer_id,
             in_port=ofproto.OFPP_CONTROLLER, actions=actions,
-            data=msg.data
+            data=None if buffered else msg.data
         )
         src_dp.send_msg(out)
+        self.counters["packet_out"] += 1
+
+    def release(self, msg):
+        """Drop the frame a PacketIn left in the switch's buffer, instead of
+        letting the buffer time out"""
+        dp = msg.datapath
+        ofproto = dp.ofproto
+        if msg.buffer_id == ofproto.OFP_NO_BUFFER:
+            return
+        dp.send_msg(dp.ofproto_parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id,
+                                                   in_port=ofproto.OFPP_CONTROLLER, actions=[]))
+        self.counters["packet_in_released"] += 1
+
+    def route_actions(self, src_dp: Datapath, dst_dpid: int, dst_ip: str, eth_type: int) -> List:
+        """Label stack and output actions towards dst_dpid, installed as an
+        ingress flow too in proactive mode"""
+        src_dpid = src_dp.id
+        route = self.paths.get(src_dpid, dst_dpid)
+        first, path = route
+        graph = self.graph
+
+        labels = tuple(graph.label(point) for point in path)
+        out_port = graph.port(src_dpid, first)
+        # Through the failover group of the first hop, so a dead port is
+        # routed around by the switch.
+        group_id = self.failover.group_id(src_dpid, first)
+        actions = self.actions.path(src_dp, labels, out_port, group_id)
+
+        if config.PROACTIVE_FLOWS:
+            self.add_route_flow(src_dp, eth_type, dst_ip, route, labels, out_port,
+                                dst_dpid, group_id)
+        return actions
+
+
+def route_match(parser, eth_type: int, dst_ip: str):
+    if eth_type == ether.ETH_TYPE_ARP:
+        return parser.OFPMatch(eth_type=eth_type, arp_tpa=dst_ip)
+    return parser.OFPMatch(eth_type=eth_type, ipv4_dst=dst_ip)
+
+
+def route_links(src: int, route: Route) -> List[Tuple[int, int]]:
+    """Links a route from src crosses, as link_key pairs"""
+    first, labels = route
+    hops = [src, first, *reversed(labels)]
+    return [link_key(a, b) for a, b in zip(hops, hops[1:])]
+
+
+def routed_links(src: int, route: Route, alternatives: Tuple[Route, ...]) -> Set[Tuple[int, int]]:
+    """Links an ingress flow from src depends on"""
+    return {link for path in (route, *alternatives) for link in route_links(src, path)}
 
 
+def hit_rate(cache) -> float:
+    lookups = cache.hits + cache.misses
+    return cache.hits / lookups if lookups else 0.0
@@ -0,0 +1,131 @@
+import ipaddress
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set
+from ryu.lib import hub
+from ryu.controller.controller import Datapath
+
+import config
+import utils
+
+
+def hosts(subnet) -> int:
+    """Number of addresses subnet.hosts() gives"""
+    if subnet.num_addresses <= 2:
+        return subnet.num_addresses
+    return subnet.num_addresses - 2
+
+
+def is_host(address, subnet) -> bool:
+    """Whether subnet.hosts() gives address"""
+    return address in subnet and (subnet.num_addresses <= 2 or address not in
+                                  (subnet.network_address, subnet.broadcast_address))
+
+
+class HostDiscovery:
+    """Paced ARP sweep of the configured subnets.
+
+    Every datapath gets its own green thread that sends one PacketOut per
+    unknown address, flooded to all edge ports at once, at most ``rate``
+    probes per second. Addresses present in ``known`` (the controller's
+    ``ip_to_dpid``) are skipped, whether they were learned from a probe
+    reply or passively from host traffic. Targets are walked from the
+    subnets on every sweep, only the addresses learned are kept.
+    """
+
+    def __init__(self, known: Mapping[str, int], edge_ports: Callable[[Datapath], List[int]],
+                 subnets: Iterable[str] = config.DISCOVERY_SUBNETS,
+                 rate: float = config.DISCOVERY_RATE,
+                 rounds: int = config.DISCOVERY_ROUNDS,
+                 interval: float = config.DISCOVERY_INTERVAL):
+        self.known = known
+        self.edge_ports = edge_ports
+        self.subnets = [ipaddress.ip_network(subnet) for subnet in subnets]
+        probe = ipaddress.ip_address(utils.PROBE_IP)
+        self.count = sum(hosts(subnet) - is_host(probe, subnet) for subnet in self.subnets)
+        self.rate = rate
+        self.rounds = rounds
+        self.interval = interval
+        self.messages = 0
+        self.started: Optional[float] = None
+        # ip -> seconds from the first probe until the host was learned
+        self.learned: Dict[str, float] = {}
+        # Targets learned, the sweep is done once there are count of them
+        self._found: Set[str] = set()
+        self._threads: Dict[int, object] = {}
+
+    def add_datapath(self, dp: Datapath):
+        if self.started is None:
+            self.started = time.monotonic()
+        self._threads[dp.id] = hub.spawn(self._run, dp)
+
+    def remove_datapath(self, dpid: int):
+        thread = self._threads.pop(dpid, None)
+        if thread is not None:
+            hub.kill(thread)
+
+    def targets(self) -> Iterator[str]:
+        for subnet in self.subnets:
+            for ip in subnet.hosts():
+                ip = str(ip)
+                if ip != utils.PROBE_IP:
+                    yield ip
+
+    def is_target(self, ip: str) -> bool:
+        address = ipaddress.ip_address(ip)
+        return ip != utils.PROBE_IP and any(is_host(address, subnet) for subnet in self.subnets)
+
+    def host_learned(self, ip: str) -> bool:
+        """Record ip as found, return True if it was the last target missing"""
+        if ip not in self.learned and self.started is not None:
+            self.learned[ip] = time.monotonic() - self.started
+        if ip in self._found or not self.is_target(ip):
+            return False
+        self._found.add(ip)
+        return self.done()
+
+    def done(self) -> bool:
+        return len(self._found) >= self.count
+
+    def sweep(self, dp: Datapath, pace: bool = False) -> int:
+        """Probe every target not known yet once, return the number of probes sent"""
+        ports = self.edge_ports(dp)
+        if not ports:
+            return 0
+
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        actions = [parser.OFPActionOutput(port) for port in ports]
+        delay = 1 / self.rate
+        sent = 0
+        for ip in self.targets():
+            if ip in self.known:
+                continue
+            out = parser.OFPPacketOut(
+                datapath=dp,
+                buffer_id=ofproto.OFP_NO_BUFFER,
+                in_port=ofproto.OFPP_CONTROLLER,
+                actions=actions,
+                data=utils.build_arp_request(ip)
+            )
+            dp.send_msg(out)
+            sent += 1
+            if pace:
+                hub.sleep(delay)
+        self.messages += sent
+        return sent
+
+    def report(self) -> Dict:
+        times = sorted(self.learned.values())
+        return {
+            "targets": self.count,
+            "learned": len(self._found),
+            "messages": self.messages,
+            "last_learned_s": times[-1] if times else None,
+        }
+
+    def _run(self, dp: Datapath):
+        for _ in range(self.rounds):
+            if not self.sweep(dp, pace=True):
+                break
+            hub.sleep(self.interval)
+        self._threads.pop(dp.id, None)
@@ -0,0 +1,229 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+from ryu.controller.controller import Datapath
+
+import config
+import utils
+from action_cache import ActionCache
+from flow_queue import FlowQueue
+from topology_store import TopologyStore
+
+Link = Tuple[int, int]
+# (out_port, labels pushed before it) per bucket, the direct port has no labels
+Buckets = Tuple[Tuple[int, Tuple[int, ...]], ...]
+
+
+def link_key(u: int, v: int) -> Link:
+    return (u, v) if u < v else (v, u)
+
+
+class FailoverGroups:
+    """Fast-failover group per switch and neighbour.
+
+    The group towards a neighbour outputs on the direct port while it is
+    live and otherwise on the first live detour, so the switch reroutes a
+    dead port by itself. A detour leaves through another neighbour with the
+    labels pushed that lead it on to the peer, at most ``hops`` hops long.
+    The table 1 flow for the peer's label points at the group. A group is
+    kept while the peer can be reached directly or through a detour, so
+    packets already labelled for it still get there after the link is gone.
+
+    Groups of the two ends of a new link are updated at once, the others a
+    new link can give shorter detours to are collected and updated together
+    by ``settle``. A removed link only updates the groups using it.
+
+    Groups a switch kept through a controller restart are taken over by
+    ``adopt`` and only modified where their buckets changed.
+    """
+
+    def __init__(self, dps: Dict[int, Datapath], graph: TopologyStore, actions: ActionCache,
+                 flow_queue: FlowQueue, link_flow: Callable[[Datapath, int, List], object],
+                 backups: int = config.FAILOVER_BACKUPS, hops: int = config.FAILOVER_DETOUR_HOPS,
+                 base: int = config.FAILOVER_GROUP_BASE):
+        self.dps = dps
+        self.graph = graph
+        self.actions = actions
+        self.flow_queue = flow_queue
+        self.link_flow = link_flow
+        self.backups = backups
+        self.hops = hops
+        self.base = base
+        self.updates = 0
+        # dpid -> {peer: (group id, buckets)}
+        self.groups: Dict[int, Dict[int, Tuple[int, Buckets]]] = defaultdict(dict)
+        # link -> groups with a bucket crossing it, and the reverse
+        self._users: Dict[Link, Set[Tuple[int, int]]] = {}
+        self._links: Dict[Tuple[int, int], Tuple[Link, ...]] = {}
+        self._dirty: Set[int] = set()
+
+    def __len__(self):
+        return sum(len(groups) for groups in self.groups.values())
+
+    def group_id(self, dpid: int, peer: int) -> Optional[int]:
+        group = self.groups.get(dpid, {}).get(peer)
+        return group[0] if group is not None else None
+
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def link_added(self, u: int, v: int):
+        self._update([(u, v), (v, u)])
+        self._dirty |= self.neighbourhood(u, v)
+
+    def link_removed(self, u: int, v: int):
+        """Call after u-v left the graph"""
+        self._update({(u, v), (v, u)} | self._users.get(link_key(u, v), set()))
+
+    def settle(self):
+        """Update every group of the switches new links may have changed"""
+        dirty, self._dirty = self._dirty, set()
+        graph = self.graph
+        pairs = []
+        for dpid in dirty:
+            peers = set(self.groups.get(dpid, ()))
+            if dpid in graph:
+                peers.update(graph.neighbours(dpid))
+            pairs.extend((dpid, peer) for peer in peers)
+        self._update(pairs)
+
+    def adopt(self, dp: Datapath, groups: List, nodes: Dict[int, int]) -> List[int]:
+        """Take over the failover groups of a group desc reply, nodes maps
+        labels to dpids. Returns the ids of the groups that are not ours."""
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        adopted = self.groups[dp.id]
+        others = []
+        for group in groups:
+            peer = nodes.get(group.group_id - self.base)
+            if group.type != ofproto.OFPGT_FF or peer is None:
+                others.append(group.group_id)
+                continue
+            buckets = []
+            for bucket in group.buckets:
+                labels, port_no, _ = utils.read_path(ofproto, bucket.actions)
+                buckets.append((port_no, labels))
+            adopted[peer] = (group.group_id, tuple(buckets))
+            # The table 1 flow goes out only if the switch lost it.
+            self.flow_queue.put(dp, self.link_flow(dp, peer, [parser.OFPActionGroup(group.group_id)]))
+        peers = set(adopted)
+        if dp.id in self.graph:
+            peers.update(self.graph.neighbours(dp.id))
+        self._update((dp.id, peer) for peer in peers)
+        return others
+
+    def forget(self, dpid: int):
+        """Drop the groups of a datapath that went away"""
+        for peer in self.groups.pop(dpid, {}):
+            self._index((dpid, peer), ())
+        self._dirty.discard(dpid)
+
+    def neighbourhood(self, u: int, v: int) -> Set[int]:
+        """Switches a detour through u-v can start from"""
+        graph = self.graph
+        found = {u, v}
+        frontier = found
+        for _ in range(self.hops - 1):
+            frontier = {neighbour for node in frontier for neighbour in graph.neighbours(node)} - found
+            found |= frontier
+        return found
+
+    def buckets(self, dpid: int, peer: int) -> Tuple[Buckets, Tuple[Link, ...]]:
+        """Buckets of the group from dpid towards peer and the links they cross"""
+        graph = self.graph
+        if dpid not in graph or peer not in graph:
+            return (), ()
+        ports = graph.ports(dpid)
+        buckets, links = [], []
+        if peer in ports:
+            buckets.append((ports[peer], ()))
+            links.append(link_key(dpid, peer))
+        # Breadth first from peer around dpid, next_hop[node] leads towards peer.
+        next_hop = {peer: None}
+        frontier = [peer]
+        for _ in range(self.hops - 1):
+            reached = []
+            for node in frontier:
+                for neighbour in graph.neighbours(node):
+                    if neighbour not in next_hop and neighbour != dpid:
+                        next_hop[neighbour] = node
+                        reached.append(neighbour)
+            frontier = reached
+        detours = []
+        for via in ports:
+            if via != peer and via in next_hop:
+                path = [via]
+                while path[-1] != peer:
+                    path.append(next_hop[path[-1]])
+                detours.append((len(path), via, path))
+        detours.sort()
+        for _, via, path in detours[:self.backups]:
+            # Innermost label first, as in PathCache routes.
+            buckets.append((ports[via], tuple(graph.label(node) for node in reversed(path[1:]))))
+            links.append(link_key(dpid, via))
+            links.extend(link_key(a, b) for a, b in zip(path, path[1:]))
+        return tuple(buckets), tuple(links)
+
+    def _update(self, pairs: Iterable[Tuple[int, int]]):
+        touched = set()
+        for dpid, peer in pairs:
+            dp = self.dps.get(dpid)
+            if dp is not None and self._update_group(dp, peer):
+                touched.add(dp)
+        for dp in touched:
+            self.flow_queue.flush(dp)
+
+    def _update_group(self, dp: Datapath, peer: int) -> bool:
+        """Send what it takes to make the group towards peer current, True if anything was"""
+        groups = self.groups[dp.id]
+        group = groups.get(peer)
+        buckets, links = self.buckets(dp.id, peer)
+        if group is None and not buckets:
+            return False
+        if group is not None and group[1] == buckets:
+            if (dp.id, peer) not in self._links:
+                # Adopted as it was, index the links it crosses.
+                self._index((dp.id, peer), links)
+            return False
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        self.updates += 1
+        if not buckets:
+            # Deleting the group deletes the table 1 flow pointing at it as well.
+            group_id = group[0]
+            dp.send_msg(parser.OFPGroupMod(dp, command=ofproto.OFPGC_DELETE, group_id=group_id))
+            self.flow_queue.discard(dp, self.link_flow(dp, peer, [parser.OFPActionGroup(group_id)]))
+            del groups[peer]
+            self._index((dp.id, peer), ())
+            return True
+        if group is None:
+            group_id, command = self.base + self.graph.label(peer), ofproto.OFPGC_ADD
+        else:
+            group_id, command = group[0], ofproto.OFPGC_MODIFY
+        dp.send_msg(parser.OFPGroupMod(
+            dp, command=command, type_=ofproto.OFPGT_FF, group_id=group_id,
+            buckets=[self._bucket(dp, port_no, labels) for port_no, labels in buckets]))
+        groups[peer] = (group_id, buckets)
+        self._index((dp.id, peer), links)
+        if group is None:
+            self.flow_queue.put(dp, self.link_flow(dp, peer, [parser.OFPActionGroup(group_id)]))
+        return True
+
+    def _bucket(self, dp: Datapath, port_no: int, labels: Tuple[int, ...]):
+        parser = dp.ofproto_parser
+        if labels:
+            actions = self.actions.path(dp, labels, port_no)
+        else:
+            actions = [parser.OFPActionOutput(port_no)]
+        return parser.OFPBucket(watch_port=port_no, actions=actions)
+
+    def _index(self, pair: Tuple[int, int], links: Tuple[Link, ...]):
+        for link in self._links.pop(pair, ()):
+            users = self._users.get(link)
+            if users is not None:
+                users.discard(pair)
+                if not users:
+                    del self._users[link]
+        if links:
+            self._links[pair] = links
+            for link in links:
+                self._users.setdefault(link, set()).add(pair)
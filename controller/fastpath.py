@@ -0,0 +1,67 @@
+from socket import inet_ntoa
+from typing import NamedTuple, Optional
+from ryu.lib.packet import packet, ethernet, arp, ipv4
+from ryu.ofproto import ether
+
+import utils
+
+_PROBE_MAC = bytes.fromhex(utils.PROBE_MAC.replace(':', ''))
+
+
+class Frame(NamedTuple):
+    """The few PacketIn fields the controller routes on"""
+    ethertype: int
+    src_ip: str
+    dst_ip: str
+    from_probe: bool
+    to_probe: bool
+
+
+def parse(data) -> Optional[Frame]:
+    """Read ethertype and addresses straight from the frame bytes.
+
+    Returns None for frames the controller does not route, LLDP included,
+    which is rejected before anything is allocated. VLAN tagged and otherwise
+    unusual frames go through the full Ryu parser.
+    """
+    size = len(data)
+    if size < 14:
+        return None
+    hi = data[12]
+    lo = data[13]
+    if hi == 0x88 and lo == 0xcc:
+        return None
+    if hi == 0x08 and lo == 0x06:
+        # Ethernet/IPv4 ARP: hlen 6, plen 4, spa at 28, tpa at 38
+        if size < 42 or data[18] != 6 or data[19] != 4:
+            return parse_full(data)
+        view = memoryview(data)
+        return Frame(ether.ETH_TYPE_ARP, inet_ntoa(view[28:32]), inet_ntoa(view[38:42]),
+                     view[6:12] == _PROBE_MAC, view[0:6] == _PROBE_MAC)
+    if hi == 0x08 and lo == 0x00:
+        if size < 34:
+            return None
+        view = memoryview(data)
+        return Frame(ether.ETH_TYPE_IP, inet_ntoa(view[26:30]), inet_ntoa(view[30:34]),
+                     view[6:12] == _PROBE_MAC, view[0:6] == _PROBE_MAC)
+    if hi == 0x81 and lo == 0x00:
+        return parse_full(data)
+    return None
+
+
+def parse_full(data) -> Optional[Frame]:
+    """Same as parse, with a complete ryu.lib.packet decode"""
+    pkt = packet.Packet(data)
+    eth_pkt = pkt.get_protocol(ethernet.ethernet)
+    if eth_pkt is None or eth_pkt.ethertype == ether.ETH_TYPE_LLDP:
+        return None
+
+    from_probe = eth_pkt.src == utils.PROBE_MAC
+    to_probe = eth_pkt.dst == utils.PROBE_MAC
+    arp_pkt = pkt.get_protocol(arp.arp)
+    if arp_pkt is not None:
+        return Frame(ether.ETH_TYPE_ARP, arp_pkt.src_ip, arp_pkt.dst_ip, from_probe, to_probe)
+    ip_pkt = pkt.get_protocol(ipv4.ipv4)
+    if ip_pkt is not None:
+        return Frame(ether.ETH_TYPE_IP, ip_pkt.src, ip_pkt.dst, from_probe, to_probe)
+    return None
@@ -0,0 +1,118 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from collections import defaultdict
+from ryu.controller.controller import Datapath
+
+
+def signature(table_id: int, priority: int, match, instructions) -> Tuple:
+    """Identity of a flow that holds both for a FlowMod built here and for
+    the flow stats a switch reports it back as"""
+    return (table_id, priority, _canonical(match.to_jsondict()),
+            _canonical([instruction.to_jsondict() for instruction in instructions]))
+
+
+def _canonical(value):
+    # Lengths are only filled in by serializing, match fields come back in
+    # OXM order.
+    if isinstance(value, dict):
+        return tuple(sorted((name, tuple(sorted(map(_canonical, item))) if name == "oxm_fields"
+                             else _canonical(item))
+                            for name, item in value.items() if name not in ("len", "length")))
+    if isinstance(value, list):
+        return tuple(map(_canonical, value))
+    return value
+
+
+class FlowQueue:
+    """Per-datapath outbound queue for the static FlowMods sent at bring-up.
+
+    FlowMods already sent to a datapath are dropped, the rest go out in one
+    burst terminated by an OFPBarrierRequest. The barrier reply marks the
+    moment the switch has applied everything queued since the previous burst.
+
+    Flows a switch already had when the controller took it over are handed
+    to ``adopt``, putting one of them afterwards only marks it as sent.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.deduplicated = 0
+        self.adopted = 0
+        # dpid -> seconds the last burst took from first queued FlowMod to barrier reply
+        self.bringup: Dict[int, float] = {}
+        self._pending: Dict[int, List] = defaultdict(list)
+        self._installed: Dict[int, Set[Tuple]] = defaultdict(set)
+        self._started: Dict[int, float] = {}
+        self._barriers: Dict[int, Dict[int, Tuple[float, int]]] = defaultdict(dict)
+        # dpid -> signature -> flow stats of a flow on the switch not put yet
+        self._present: Dict[int, Dict[Tuple, object]] = {}
+
+    @staticmethod
+    def key(mod) -> Tuple:
+        return (mod.table_id, mod.priority, mod.command,
+                str(mod.match), str(mod.instructions))
+
+    def put(self, dp: Datapath, mod) -> bool:
+        key = self.key(mod)
+        installed = self._installed[dp.id]
+        if key in installed:
+            self.deduplicated += 1
+            return False
+        installed.add(key)
+        present = self._present.get(dp.id)
+        if present and present.pop(signature(mod.table_id, mod.priority, mod.match,
+                                             mod.instructions), None) is not None:
+            self.adopted += 1
+            return False
+        self._started.setdefault(dp.id, time.monotonic())
+        self._pending[dp.id].append(mod)
+        return True
+
+    def adopt(self, dpid: int, flows: List):
+        """Count the flow stats of flows a switch already has as sent"""
+        self._present[dpid] = {signature(flow.table_id, flow.priority, flow.match,
+                                         flow.instructions): flow for flow in flows}
+
+    def unclaimed(self, dpid: int) -> List:
+        """Stop adopting, return the flow stats of the flows nothing was put for"""
+        return list(self._present.pop(dpid, {}).values())
+
+    def discard(self, dp: Datapath, mod):
+        """Forget that mod was sent, so it goes out again when it is put back
+        after the flow was deleted"""
+        self._installed[dp.id].discard(self.key(mod))
+
+    def flush(self, dp: Datapath):
+        pending = self._pending.pop(dp.id, None)
+        if not pending:
+            return
+        for mod in pending:
+            dp.send_msg(mod)
+        barrier = dp.ofproto_parser.OFPBarrierRequest(dp)
+        dp.set_xid(barrier)
+        dp.send_msg(barrier)
+        self._barriers[dp.id][barrier.xid] = (self._started.pop(dp.id), len(pending))
+        self.sent += len(pending)
+
+    def barrier_reply(self, dpid: int, xid: int) -> Optional[Tuple[float, int]]:
+        """Return how long the burst took and how many FlowMods it had,
+        or None if the barrier was not ours"""
+        burst = self._barriers[dpid].pop(xid, None)
+        if burst is None:
+            return None
+        started, size = burst
+        elapsed = time.monotonic() - started
+        self.bringup[dpid] = elapsed
+        return elapsed, size
+
+    def pending(self, dpid: int) -> int:
+        return len(self._pending.get(dpid, ())) + len(self._barriers.get(dpid, ()))
+
+    def forget(self, dpid: int):
+        """Drop everything known about a datapath, e.g. when it reconnects"""
+        self._pending.pop(dpid, None)
+        self._installed.pop(dpid, None)
+        self._present.pop(dpid, None)
+        self._started.pop(dpid, None)
+        self._barriers.pop(dpid, None)
+        self.bringup.pop(dpid, None)
@@ -0,0 +1,202 @@
+import functools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+from ryu.lib import hub
+from ryu.controller.controller import Datapath
+try:
+    # The profiler has to run on a real OS thread even when eventlet has
+    # patched threading, otherwise it only ever sees greenlets at yield points.
+    from eventlet.patcher import original
+    _threading = original("threading")
+except ImportError:
+    import threading as _threading
+
+import config
+
+
+class Histogram:
+    """Latency histogram with power of two microsecond buckets"""
+    BUCKETS = 40
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in microseconds"""
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return float(1 << bucket)
+        return 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count * 1e6 if self.count else 0.0,
+            "p50_us": self.percentile(50),
+            "p99_us": self.percentile(99),
+            "max_us": self.max * 1e6,
+        }
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread every ``interval`` seconds.
+
+    The main thread is sampled by default, Ryu's event loop and all of its
+    green threads run there. Stacks are kept collapsed (``outer;inner;leaf``)
+    with their sample counts, the format flame graph tools read.
+    """
+
+    def __init__(self, interval: float = config.PROFILER_INTERVAL, depth: int = 30):
+        self.interval = interval
+        self.depth = depth
+        self.samples = Counter()
+        self._target = None
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, thread_id: int = None):
+        if self._running:
+            return
+        self._target = thread_id if thread_id is not None else _threading.main_thread().ident
+        self._running = True
+        self._thread = _threading.Thread(target=self._run, name="why-so-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def top(self, n: int = 20) -> List[Tuple[str, int]]:
+        """Functions that were on top of the stack most often"""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        while self._running:
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+class Instrumentation:
+    """Handler latencies, counters, per-datapath message counts and gauges.
+
+    When disabled, ``timed`` hands back the undecorated function and nothing
+    else is hooked up, so it costs nothing on the hot path.
+    """
+
+    def __init__(self, enabled: bool = config.INSTRUMENTATION):
+        self.enabled = enabled
+        self.started = time.time()
+        self.counters = Counter()
+        self.sent = Counter()
+        self.histograms: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.profiler = SamplingProfiler()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def timed(self, name: str):
+        def decorate(func):
+            if not self.enabled:
+                return func
+            histogram = self.histogram(name)
+            clock = time.perf_counter
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.record(clock() - start)
+            return wrapper
+        return decorate
+
+    def gauge(self, name: str, func: Callable[[], float]):
+        self.gauges[name] = func
+
+    def count_sends(self, dp: Datapath):
+        """Count every message sent to dp"""
+        if not self.enabled:
+            return
+        send_msg = dp.send_msg
+        sent = self.sent
+        dpid = dp.id
+
+        def counting_send_msg(msg, *args, **kwargs):
+            sent[dpid] += 1
+            return send_msg(msg, *args, **kwargs)
+        dp.send_msg = counting_send_msg
+
+    def snapshot(self) -> Dict:
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = repr(e)
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self.started,
+            "handlers": {name: h.snapshot() for name, h in self.histograms.items()},
+            "counters": dict(self.counters),
+            "sent_per_datapath": {f"{dpid:016x}": count for dpid, count in self.sent.items()},
+            "gauges": gauges,
+            "profiler": {"running": self.profiler.running, "top": self.profiler.top(10)},
+        }
+
+    def dump(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=1, default=str)
+        os.replace(tmp, path)
+
+    def start_dumps(self, path: str, interval: float):
+        def run():
+            while True:
+                hub.sleep(interval)
+                self.dump(path)
+        return hub.spawn(run)
+
+
+registry = Instrumentation()
+timed = registry.timed
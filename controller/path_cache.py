@@ -0,0 +1,151 @@
+from typing import Dict, Tuple
+import networkx as nx
+import numpy as np
+
+from topology_store import NO_ROW, TopologyStore
+
+Route = Tuple[int, Tuple[int, ...]]
+
+# Sources build() runs through scipy at once, bounds the distance matrix.
+BUILD_CHUNK = 256
+
+
+class PathCache:
+    """Routing table over ``graph`` with O(1) lookups.
+
+    Shortest path trees are computed one source at a time with a single
+    Dijkstra run, or for every source in bulk by ``build``, and kept as
+    distance and predecessor arrays indexed by the store's rows. Routes
+    are read off the tree on first use, and both are kept until a topology
+    change can affect them. Every change to the graph must go through the
+    ``add_edge``/``remove_edge``/``remove_node``/``set_weight`` methods so
+    only the affected sources get invalidated.
+    """
+
+    def __init__(self, graph: TopologyStore):
+        self.graph = graph
+        self.hits = 0
+        self.misses = 0
+        self._routes: Dict[int, Dict[int, Route]] = {}
+        self._dist: Dict[int, np.ndarray] = {}
+        self._parent: Dict[int, np.ndarray] = {}
+
+    def get(self, src: int, dst: int) -> Route:
+        """Return ``(first_hop, labels)`` the same way as
+        ``utils.get_shortest_path`` does."""
+        try:
+            route = self._routes[src][dst]
+        except KeyError:
+            self.misses += 1
+            return self._route(src, dst)
+        self.hits += 1
+        return route
+
+    def build(self, chunk: int = BUILD_CHUNK):
+        """Compute the shortest path trees of every source up front, in bulk."""
+        sources = [src for src in self.graph if src not in self._parent]
+        for i in range(0, len(sources), chunk):
+            batch = sources[i:i + chunk]
+            dist, pred = self.graph.shortest_paths(batch)
+            for src, row_dist, row_pred in zip(batch, dist, pred):
+                self._dist[src] = row_dist
+                self._parent[src] = row_pred
+                self._routes[src] = {}
+
+    def clear(self):
+        self._routes.clear()
+        self._dist.clear()
+        self._parent.clear()
+
+    def add_edge(self, u: int, v: int, port_u: int, port_v: int, weight: float = 1.0):
+        self.graph.add_link(u, v, port_u, port_v, weight)
+        for src in list(self._dist):
+            if self._improves(src, u, v, weight):
+                self._drop(src)
+
+    def remove_edge(self, u: int, v: int):
+        for src in list(self._parent):
+            if self._uses_edge(src, u, v):
+                self._drop(src)
+        self.graph.remove_link(u, v)
+
+    def remove_node(self, node: int):
+        row = self.graph.index.get(node)
+        self._drop(node)
+        if row is not None:
+            for src in list(self._parent):
+                parent = self._parent[src]
+                if row >= len(parent) or parent[row] == NO_ROW:
+                    continue
+                if (parent == row).any():
+                    self._drop(src)
+                else:
+                    # The row is reused by the next switch, leave it unreachable.
+                    parent[row] = NO_ROW
+                    self._dist[src][row] = np.inf
+                    self._routes[src].pop(node, None)
+        self.graph.remove_switch(node)
+
+    def set_weight(self, u: int, v: int, w: float):
+        old = self.graph.weight(u, v)
+        if w == old:
+            return
+        self.graph.set_weight(u, v, w)
+        for src in list(self._dist):
+            if w > old and self._uses_edge(src, u, v):
+                self._drop(src)
+            elif w < old and self._improves(src, u, v, w):
+                self._drop(src)
+
+    def __len__(self):
+        return sum(len(routes) for routes in self._routes.values())
+
+    def _fill(self, src: int):
+        dist, pred = self.graph.shortest_paths([src])
+        self._dist[src] = dist[0]
+        self._parent[src] = pred[0]
+        self._routes[src] = {}
+
+    def _route(self, src: int, dst: int) -> Route:
+        if src not in self._parent:
+            self._fill(src)
+        parent = self._parent[src]
+        row = self.graph.index.get(dst)
+        if row is None or row >= len(parent) or parent[row] == NO_ROW:
+            raise nx.NetworkXNoPath(f"No path between {src} and {dst}.")
+        # Same shape as utils.get_shortest_path: next hop plus the labels
+        # to push, innermost (destination) first.
+        source = self.graph.index[src]
+        rows = []
+        while parent[row] != source:
+            rows.append(row)
+            row = parent[row]
+        dpids = self.graph.dpids
+        route = self._routes[src][dst] = (int(dpids[row]), tuple(dpids[rows].tolist()))
+        return route
+
+    def _drop(self, src: int):
+        self._routes.pop(src, None)
+        self._dist.pop(src, None)
+        self._parent.pop(src, None)
+
+    def _distance(self, src: int, node: int) -> float:
+        dist = self._dist[src]
+        row = self.graph.index.get(node)
+        return dist[row] if row is not None and row < len(dist) else np.inf
+
+    def _improves(self, src: int, u: int, v: int, w: float) -> bool:
+        du = self._distance(src, u)
+        dv = self._distance(src, v)
+        # An edge joining a new component to the tree counts too, inf - w
+        # stays inf.
+        return du + w < dv or dv + w < du
+
+    def _uses_edge(self, src: int, u: int, v: int) -> bool:
+        parent = self._parent[src]
+        index = self.graph.index
+        row_u, row_v = index.get(u), index.get(v)
+        if row_u is None or row_v is None:
+            return False
+        return ((row_v < len(parent) and parent[row_v] == row_u)
+                or (row_u < len(parent) and parent[row_u] == row_v))
@@ -0,0 +1,158 @@
+import json
+import os
+from itertools import islice
+from typing import Callable, Dict, List, Tuple
+import networkx as nx
+
+import config
+from path_cache import PathCache, Route
+from topology_store import TopologyStore
+
+Link = Tuple[int, int]
+
+# Reference bandwidth in Mbit/s, a link this fast costs 1.
+REFERENCE_BW = 1000
+
+
+def hop(props: Dict, utilization: float) -> float:
+    return 1
+
+
+def delay(props: Dict, utilization: float) -> float:
+    return max(props.get("delay", 1.0), 0.001)
+
+
+def inverse_bandwidth(props: Dict, utilization: float) -> float:
+    return REFERENCE_BW / props.get("bw", REFERENCE_BW)
+
+
+def etx(props: Dict, utilization: float) -> float:
+    """Expected transmissions with the same loss in both directions"""
+    delivery = 1 - min(props.get("loss", 0) / 100, 0.99)
+    return 1 / (delivery * delivery)
+
+
+def load(props: Dict, utilization: float) -> float:
+    """Inverse bandwidth scaled by the M/M/1 queueing factor of the measured load"""
+    return inverse_bandwidth(props, utilization) / (1 - min(utilization, 0.95))
+
+
+METRICS: Dict[str, Callable[[Dict, float], float]] = {
+    "hop": hop,
+    "delay": delay,
+    "bandwidth": inverse_bandwidth,
+    "etx": etx,
+    "utilization": load,
+}
+
+
+def parse_delay(value) -> float:
+    """Mininet style delay ('5ms', '1s', '250us') in milliseconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    for suffix, scale in (("us", 0.001), ("ms", 1), ("s", 1000)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+
+def load_link_properties(path: str) -> Dict[Link, Dict]:
+    """Read the links file written by min_env.env.export_link_properties"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        links = json.load(f)
+    properties = {}
+    for link in links:
+        props = {"bw": float(link.get("bw", REFERENCE_BW)),
+                 "delay": parse_delay(link.get("delay", 1)),
+                 "loss": float(link.get("loss", 0))}
+        properties[(link["src"], link["dst"])] = props
+        properties[(link["dst"], link["src"])] = props
+    return properties
+
+
+class RoutingEngine:
+    """Turns link properties and measured load into PathCache weights.
+
+    Measured utilization only moves a weight once it changed by more than
+    ``threshold`` (relative), so noisy counters do not keep flushing routes.
+    """
+
+    def __init__(self, paths: PathCache, metric: str = config.ROUTING_METRIC,
+                 properties: Dict[Link, Dict] = None,
+                 threshold: float = config.ROUTING_REWEIGHT_THRESHOLD):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown routing metric {metric}, expected one of {list(METRICS)}")
+        self.paths = paths
+        self.metric = METRICS[metric]
+        self.properties = properties if properties is not None else {}
+        self.threshold = threshold
+        # (u, v) -> measured load of the u -> v direction, 0..1
+        self.utilization: Dict[Link, float] = {}
+        self._alternatives: Dict[Tuple[int, int, int], List[Route]] = {}
+        # networkx export k-shortest alternatives are searched on, per store version
+        self._exported: Tuple[int, nx.Graph] = (-1, None)
+
+    def weight(self, u: int, v: int) -> float:
+        utilization = max(self.utilization.get((u, v), 0.0), self.utilization.get((v, u), 0.0))
+        return self.metric(self.properties.get((u, v), {}), utilization)
+
+    def add_link(self, u: int, v: int, port_u: int, port_v: int):
+        self.paths.add_edge(u, v, port_u, port_v, self.weight(u, v))
+        self._alternatives.clear()
+
+    def remove_link(self, u: int, v: int):
+        self.paths.remove_edge(u, v)
+        self._alternatives.clear()
+
+    def remove_switch(self, node: int):
+        self.paths.remove_node(node)
+        self._alternatives.clear()
+
+    def update_utilization(self, u: int, v: int, utilization: float) -> bool:
+        """Record the measured load of the u -> v direction, return True if routes changed"""
+        self.utilization[(u, v)] = utilization
+        if not self.paths.graph.has_link(u, v):
+            return False
+        old = self.paths.graph.weight(u, v)
+        new = self.weight(u, v)
+        if abs(new - old) <= self.threshold * old:
+            return False
+        self.paths.set_weight(u, v, new)
+        self._alternatives.clear()
+        return True
+
+    def alternatives(self, src: int, dst: int, k: int) -> List[Route]:
+        """Up to k loop-free routes, cheapest first, in the PathCache route format"""
+        key = (src, dst, k)
+        routes = self._alternatives.get(key)
+        if routes is None:
+            simple = nx.shortest_simple_paths(self.exported(), src, dst, weight="weight")
+            routes = [(path[1], tuple(reversed(path[2:]))) for path in islice(simple, k)]
+            self._alternatives[key] = routes
+        return routes
+
+    def exported(self) -> nx.Graph:
+        """The topology as an nx.Graph, exported again only after it changed"""
+        store = self.paths.graph
+        version, graph = self._exported
+        if version != store.version:
+            graph = store.to_networkx()
+            self._exported = (store.version, graph)
+        return graph
+
+    def equal_cost(self, src: int, dst: int, k: int) -> List[Route]:
+        """The alternatives that cost the same as the best one"""
+        routes = self.alternatives(src, dst, k)
+        if len(routes) < 2:
+            return routes
+        graph = self.paths.graph
+        costs = [self._cost(graph, src, route) for route in routes]
+        return [route for route, cost in zip(routes, costs) if cost <= costs[0] * (1 + 1e-9)]
+
+    @staticmethod
+    def _cost(graph: TopologyStore, src: int, route: Route) -> float:
+        first, labels = route
+        hops = [src, first] + list(reversed(labels))
+        return sum(graph.weight(a, b) for a, b in zip(hops, hops[1:]))
@@ -0,0 +1,193 @@
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from collections import defaultdict
+from ryu.lib import hub
+from ryu.controller.controller import Datapath
+import numpy as np
+
+import config
+
+PORT_FIELDS = ("rx_packets", "tx_packets", "rx_bytes", "tx_bytes",
+               "rx_dropped", "tx_dropped", "rx_errors", "tx_errors")
+FLOW_FIELDS = ("packet_count", "byte_count")
+
+
+class RingSeries:
+    """The last ``history`` samples of a few counters for up to ``rows`` keys.
+
+    All samples live in preallocated arrays, so memory does not grow with
+    the number of polls. A key that does not fit is counted in ``dropped``.
+    """
+
+    def __init__(self, rows: int, history: int, fields: Tuple[str, ...]):
+        self.fields = fields
+        self.field_index = {field: i for i, field in enumerate(fields)}
+        self.history = history
+        self.times = np.zeros((rows, history), dtype=np.float64)
+        self.values = np.zeros((rows, history, len(fields)), dtype=np.uint64)
+        self.head = np.zeros(rows, dtype=np.int64)
+        self.count = np.zeros(rows, dtype=np.int64)
+        self.keys: Dict[Hashable, int] = {}
+        self.dropped = 0
+        self._free = list(range(rows - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def append(self, key: Hashable, time: float, values) -> Optional[int]:
+        row = self.keys.get(key)
+        if row is None:
+            if not self._free:
+                self.dropped += 1
+                return None
+            row = self.keys[key] = self._free.pop()
+        head = self.head[row]
+        if self.count[row] and time <= self.times[row, (head - 1) % self.history]:
+            # Counters were reset (port flap, flow re-added), start over.
+            self.count[row] = 0
+        self.times[row, head] = time
+        self.values[row, head] = values
+        self.head[row] = (head + 1) % self.history
+        self.count[row] = min(self.count[row] + 1, self.history)
+        return row
+
+    def release(self, key: Hashable):
+        row = self.keys.pop(key, None)
+        if row is not None:
+            self.count[row] = 0
+            self.head[row] = 0
+            self._free.append(row)
+
+    def rate(self, key: Hashable, field: str) -> float:
+        """Per second change of field between the last two samples"""
+        row = self.keys.get(key)
+        if row is None or self.count[row] < 2:
+            return 0.0
+        last = (self.head[row] - 1) % self.history
+        prev = (last - 1) % self.history
+        column = self.field_index[field]
+        delta = float(self.values[row, last, column]) - float(self.values[row, prev, column])
+        return delta / (self.times[row, last] - self.times[row, prev])
+
+    def rates(self, field: str) -> Tuple[List[Hashable], np.ndarray]:
+        """rate() of every key at once"""
+        keys = list(self.keys)
+        if not keys:
+            return keys, np.zeros(0)
+        rows = np.fromiter((self.keys[key] for key in keys), dtype=np.int64, count=len(keys))
+        last = (self.head[rows] - 1) % self.history
+        prev = (last - 1) % self.history
+        column = self.field_index[field]
+        values = self.values[rows, :, column].astype(np.float64)
+        times = self.times[rows]
+        index = np.arange(len(rows))
+        elapsed = times[index, last] - times[index, prev]
+        delta = values[index, last] - values[index, prev]
+        valid = (self.count[rows] >= 2) & (elapsed > 0)
+        result = np.zeros(len(rows))
+        result[valid] = delta[valid] / elapsed[valid]
+        return keys, result
+
+    def series(self, key: Hashable, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample times and values of field, oldest first"""
+        row = self.keys.get(key)
+        if row is None:
+            return np.zeros(0), np.zeros(0, dtype=np.uint64)
+        count = self.count[row]
+        order = (self.head[row] - count + np.arange(count)) % self.history
+        return self.times[row, order], self.values[row, order, self.field_index[field]]
+
+
+class StatsCollector:
+    """Polls port and flow counters of every datapath into ring buffers.
+
+    Requests are spread evenly over ``interval`` instead of going to all
+    switches at once. Rates, top talkers and link utilization are answered
+    from the buffers without asking the switches again.
+    """
+
+    def __init__(self, dps: Dict[int, Datapath], interval: float = config.STATS_INTERVAL,
+                 history: int = config.STATS_HISTORY, max_ports: int = config.STATS_MAX_PORTS,
+                 max_flows: int = config.STATS_MAX_FLOWS):
+        self.dps = dps
+        self.interval = interval
+        self.ports = RingSeries(max_ports, history, PORT_FIELDS)
+        self.flows = RingSeries(max_flows, history, FLOW_FIELDS)
+        self.requests = 0
+        self._flow_keys: Dict[int, Set[Tuple]] = defaultdict(set)
+        self._flow_seen: Dict[int, Set[Tuple]] = defaultdict(set)
+
+    def start(self):
+        return hub.spawn(self._run)
+
+    def request(self, dp: Datapath):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        dp.send_msg(parser.OFPPortStatsRequest(dp, 0, ofproto.OFPP_ANY))
+        dp.send_msg(parser.OFPFlowStatsRequest(dp, 0, ofproto.OFPTT_ALL))
+        self.requests += 2
+
+    def port_stats_reply(self, dpid: int, body) -> List[int]:
+        """Store a port stats reply, return the port numbers it covered"""
+        ports = []
+        for stat in body:
+            values = [getattr(stat, field) for field in PORT_FIELDS]
+            self.ports.append((dpid, stat.port_no),
+                              stat.duration_sec + stat.duration_nsec / 1e9, values)
+            ports.append(stat.port_no)
+        return ports
+
+    def flow_stats_reply(self, dpid: int, body, more: bool = False):
+        """Store one part of a flow stats reply, rows of flows missing from the
+        complete reply are released"""
+        seen = self._flow_seen[dpid]
+        for stat in body:
+            key = (dpid, stat.table_id, stat.priority, tuple(stat.match.items()))
+            self.flows.append(key, stat.duration_sec + stat.duration_nsec / 1e9,
+                              (stat.packet_count, stat.byte_count))
+            seen.add(key)
+        if more:
+            return
+        for key in self._flow_keys[dpid] - seen:
+            self.flows.release(key)
+        self._flow_keys[dpid] = seen
+        self._flow_seen[dpid] = set()
+
+    def forget(self, dpid: int):
+        for key in [key for key in self.ports.keys if key[0] == dpid]:
+            self.ports.release(key)
+        for key in self._flow_keys.pop(dpid, ()):
+            self.flows.release(key)
+        self._flow_seen.pop(dpid, None)
+
+    def port_rate(self, dpid: int, port_no: int, field: str = "tx_bytes") -> float:
+        return self.ports.rate((dpid, port_no), field)
+
+    def link_utilization(self, dpid: int, port_no: int, capacity_bps: float) -> float:
+        """Transmit load of a port as a fraction of capacity_bps"""
+        return self.port_rate(dpid, port_no, "tx_bytes") * 8 / capacity_bps
+
+    def top_ports(self, n: int = 10, field: str = "tx_bytes") -> List[Tuple[Tuple[int, int], float]]:
+        return self._top(self.ports, n, field)
+
+    def top_talkers(self, n: int = 10, field: str = "byte_count") -> List[Tuple[Tuple, float]]:
+        """Flows with the highest rate of field, as ((dpid, table, priority, match), rate)"""
+        return self._top(self.flows, n, field)
+
+    @staticmethod
+    def _top(series: RingSeries, n: int, field: str):
+        keys, rates = series.rates(field)
+        if not keys:
+            return []
+        order = np.argsort(rates)[::-1][:n]
+        return [(keys[i], float(rates[i])) for i in order]
+
+    def _run(self):
+        while True:
+            dps = list(self.dps.values())
+            if not dps:
+                hub.sleep(self.interval)
+                continue
+            gap = self.interval / len(dps)
+            for dp in dps:
+                self.request(dp)
+                hub.sleep(gap)
@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+import networkx as nx
+import pytest
+from ryu.controller import ofp_event
+
+import config
+from admission import Admission, TokenBucket
+from harness import Harness
+
+
+def frame(mac: int) -> bytes:
+    return bytes(6) + mac.to_bytes(6, "big") + b"\x08\x00"
+
+
+def test_burst_then_empty():
+    bucket = TokenBucket(rate=10, burst=5, now=0.0)
+    assert [bucket.take(0.0) for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_refill_at_rate():
+    bucket = TokenBucket(rate=10, burst=5, now=0.0)
+    for _ in range(5):
+        bucket.take(0.0)
+    assert not bucket.take(0.05)
+    # 0.1 s at 10 per second is one token, half of it came in the last take.
+    assert bucket.take(0.1)
+    assert not bucket.take(0.1)
+    assert bucket.take(0.2)
+    assert bucket.tokens == pytest.approx(0)
+
+
+def test_refill_capped_at_burst():
+    bucket = TokenBucket(rate=10, burst=5, now=0.0)
+    bucket.take(0.0)
+    assert [bucket.take(100.0) for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_steady_rate():
+    bucket = TokenBucket(rate=100, burst=5, now=0.0)
+    # Offered at 1000 per second for 10 s, the burst plus rate * time get through.
+    admitted = sum(bucket.take(i / 1000) for i in range(10000))
+    assert admitted == pytest.approx(5 + 1000, abs=1)
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_flooding_source_is_throttled_alone():
+    clock = Clock()
+    admission = Admission(datapath_rate=100, datapath_burst=100, source_rate=10,
+                          source_burst=10, clock=clock)
+    flood = [admission.admit(1, frame(1)) for _ in range(50)]
+    assert sum(flood) == 10
+    assert admission.admit(1, frame(2))
+    assert admission.admit(2, frame(1))
+    assert admission.throttled_source == 40
+    assert admission.throttled == {1: 40}
+    clock.now = 1.0
+    assert admission.admit(1, frame(1))
+
+
+def test_datapath_limit():
+    admission = Admission(datapath_rate=100, datapath_burst=20, source_rate=0, clock=Clock())
+    assert sum(admission.admit(1, frame(mac)) for mac in range(50)) == 20
+    assert admission.throttled_datapath == 30
+    assert admission.admit(2, frame(0))
+
+
+def test_sources_bounded_and_forgotten():
+    admission = Admission(source_rate=10, source_burst=1, max_sources=4, clock=Clock())
+    for mac in range(10):
+        admission.admit(1, frame(mac))
+    assert len(admission._sources) == 4
+    # The oldest source was dropped, it starts with a full bucket again.
+    assert admission.admit(1, frame(0))
+    admission.admit(2, frame(0))
+    admission.forget(1)
+    assert set(admission._sources) == {(2, frame(0)[6:12])}
+    assert 1 not in admission._datapaths and 1 not in admission.throttled
+
+
+def features(harness: Harness, dpid: int):
+    dp = harness.dps[dpid]
+    sent = len(dp.sent)
+    harness.app.switch_features_handler(SimpleNamespace(msg=SimpleNamespace(datapath=dp,
+                                                                            n_buffers=0)))
+    return dp, dp.sent[sent:]
+
+
+def table_miss(msgs):
+    return [msg for msg in msgs if type(msg).__name__ == "OFPFlowMod" and msg.priority == 0]
+
+
+def test_table_miss_unmetered_by_default():
+    harness = Harness(nx.path_graph([1, 2]))
+    dp, sent = features(harness, 1)
+    assert not [msg for msg in sent if type(msg).__name__ == "OFPMeterMod"]
+    (flow,) = table_miss(sent)
+    assert [type(inst).__name__ for inst in flow.instructions] == ["OFPInstructionActions"]
+
+
+def test_rejected_meter_falls_back(monkeypatch):
+    monkeypatch.setattr(config, "TABLE_MISS_METER_RATE", 1000)
+    harness = Harness(nx.path_graph([1, 2]))
+    app = harness.app
+    dp, sent = features(harness, 1)
+    (flow,) = table_miss(sent)
+    assert type(flow.instructions[0]).__name__ == "OFPInstructionMeter"
+    meter_add = [msg for msg in sent if type(msg).__name__ == "OFPMeterMod"
+                 and msg.command == dp.ofproto.OFPMC_ADD]
+    assert len(meter_add) == 1
+
+    ofproto = dp.ofproto
+    before = len(dp.sent)
+    for rejected, error_type in ((meter_add[0], ofproto.OFPET_METER_MOD_FAILED),
+                                 (flow, ofproto.OFPET_BAD_INSTRUCTION)):
+        error = dp.ofproto_parser.OFPErrorMsg(dp, type_=error_type, code=0, data=b"")
+        error.xid = rejected.xid
+        app.error_msg(ofp_event.EventOFPErrorMsg(error))
+    # One unmetered table-miss flow for both errors.
+    (fallback,) = table_miss(dp.sent[before:])
+    assert [type(inst).__name__ for inst in fallback.instructions] == ["OFPInstructionActions"]
+    assert app.unmetered == {1} and app.counters["meter_rejected"] == 1
+    # Reconnecting does not try the meter again.
+    _, sent = features(harness, 1)
+    assert not [msg for msg in sent if type(msg).__name__ == "OFPMeterMod"]
+
+
+def test_other_errors_ignored(monkeypatch):
+    monkeypatch.setattr(config, "TABLE_MISS_METER_RATE", 1000)
+    harness = Harness(nx.path_graph([1, 2]))
+    dp, _ = features(harness, 1)
+    before = len(dp.sent)
+    error = dp.ofproto_parser.OFPErrorMsg(dp, type_=dp.ofproto.OFPET_BAD_REQUEST, code=0, data=b"")
+    error.xid = 12345
+    harness.app.error_msg(ofp_event.EventOFPErrorMsg(error))
+    assert len(dp.sent) == before and not harness.app.unmetered
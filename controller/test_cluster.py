@@ -0,0 +1,99 @@
+import networkx as nx
+import pytest
+
+import config
+from cluster import ClusterBus
+from fakes import arp_frame, packet_in
+from harness import Harness, GATEWAY
+
+
+def link(src: int, dst: int, src_port: int = 1) -> dict:
+    return {"type": "link", "src": src, "src_port": src_port, "dst": dst, "dst_port": 1}
+
+
+class Switches:
+    """apply for a bus, links only apply between known switches"""
+
+    def __init__(self):
+        self.known = set()
+        self.applied = []
+
+    def __call__(self, fact) -> bool:
+        if fact["src"] not in self.known or fact["dst"] not in self.known:
+            return False
+        self.applied.append(fact)
+        return True
+
+
+def test_waiting_keeps_latest_per_link(tmp_path):
+    switches = Switches()
+    bus = ClusterBus(0, 2, switches, str(tmp_path))
+    bus.wait(link(1, 2, src_port=1))
+    bus.wait(link(3, 4))
+    bus.wait(link(2, 1, src_port=7))
+    assert len(bus.waiting) == 2
+    switches.known.update({1, 2})
+    bus.retry()
+    assert switches.applied == [link(2, 1, src_port=7)]
+    assert list(bus.waiting) == [("link", 3, 4)]
+
+
+def test_waiting_capped(tmp_path):
+    bus = ClusterBus(0, 2, Switches(), str(tmp_path), max_waiting=3)
+    for dst in range(2, 7):
+        bus.wait(link(1, dst))
+    # The oldest went first.
+    assert list(bus.waiting) == [("link", 1, 4), ("link", 1, 5), ("link", 1, 6)]
+    assert bus.expired == 2
+
+
+def test_waiting_expires(tmp_path):
+    bus = ClusterBus(0, 2, Switches(), str(tmp_path), timeout=-1)
+    bus.wait(link(1, 2))
+    bus.retry()
+    assert not bus.waiting and bus.expired == 1
+    bus.wait(link(1, 3))
+    bus.wait(link(1, 4))
+    assert list(bus.waiting) == [("link", 1, 4)] and bus.expired == 2
+
+
+@pytest.fixture
+def member(monkeypatch, tmp_path):
+    """Member 0 of 2 on the path 1-2-3-4, it owns switches 2 and 4"""
+    monkeypatch.setattr(config, "CLUSTER_MEMBERS", 2)
+    monkeypatch.setattr(config, "CLUSTER_INDEX", 0)
+    monkeypatch.setattr(config, "CLUSTER_DIR", str(tmp_path))
+    # No sockets, the receiving thread would block unpatched.
+    monkeypatch.setattr(ClusterBus, "start", lambda self: [])
+    harness = Harness(nx.path_graph([1, 2, 3, 4]))
+    harness.bring_up()
+    app = harness.app
+    for ip, (dp, port_no) in harness.hosts.items():
+        if app.owns(dp.id):
+            harness.fire("arp", app.packet_in, packet_in(dp, port_no, arp_frame(ip, GATEWAY)))
+    harness.acknowledge()
+    return harness
+
+
+def test_removed_switch_retracts_its_hosts(member):
+    app = member.app
+    assert ("host", "10.0.0.2") in app.cluster.facts
+    retracted = []
+    app.cluster.retract = lambda key, fact: retracted.append((key, fact))
+    app.apply_fact({"type": "host", "ip": "10.0.0.3", "dpid": 3})
+    member.remove_switch(2)
+    member.remove_switch(3)
+    # Switch 3 is the other member's, it retracts its hosts.
+    assert retracted == [(("host", "10.0.0.2"), {"type": "unhost", "ip": "10.0.0.2", "dpid": 2})]
+    assert "10.0.0.2" not in app.ip_to_dpid and "10.0.0.3" not in app.ip_to_dpid
+
+
+def test_unhost_only_removes_the_host_where_it_was(member):
+    app = member.app
+    app.apply_fact({"type": "host", "ip": "10.0.0.1", "dpid": 1})
+    # Moved to switch 3 before the retraction from switch 1 arrived.
+    app.apply_fact({"type": "host", "ip": "10.0.0.1", "dpid": 3})
+    assert app.apply_fact({"type": "unhost", "ip": "10.0.0.1", "dpid": 1})
+    assert app.ip_to_dpid["10.0.0.1"] == 3
+    app.apply_fact({"type": "unhost", "ip": "10.0.0.1", "dpid": 3})
+    assert "10.0.0.1" not in app.ip_to_dpid
@@ -0,0 +1,41 @@
+from ryu.lib.packet import packet, arp
+
+import utils
+from discovery import HostDiscovery
+
+
+def discovery(*subnets: str) -> HostDiscovery:
+    return HostDiscovery({}, lambda dp: [], subnets=subnets, rounds=0)
+
+
+def test_targets_skip_probe_address():
+    found = discovery("10.0.0.96/29")
+    targets = list(found.targets())
+    assert targets == ["10.0.0.97", "10.0.0.98", "10.0.0.99", "10.0.0.101", "10.0.0.102"]
+    assert found.count == len(targets)
+
+
+def test_large_subnet_is_not_expanded():
+    found = discovery("10.0.0.0/8", "192.168.0.0/31")
+    assert found.count == 2 ** 24 - 3 + 2
+    assert found.is_target("10.200.0.1") and found.is_target("192.168.0.0")
+    assert not found.is_target("10.0.0.0") and not found.is_target(utils.PROBE_IP)
+
+
+def test_done_once_every_target_learned():
+    found = discovery("10.0.1.0/30")
+    assert not found.host_learned("10.0.1.1")
+    # Outside the subnets, or learned twice, does not count.
+    assert not found.host_learned("10.0.2.1")
+    assert not found.host_learned("10.0.1.1")
+    assert not found.done()
+    assert found.host_learned("10.0.1.2")
+    assert found.done()
+    assert found.report()["learned"] == found.report()["targets"] == 2
+
+
+def test_probe_frames():
+    for ip in ("10.0.0.1", "172.16.5.200"):
+        request = packet.Packet(utils.build_arp_request(ip)).get_protocol(arp.arp)
+        assert request.opcode == arp.ARP_REQUEST and request.dst_ip == ip
+        assert request.src_ip == utils.PROBE_IP and request.src_mac == utils.PROBE_MAC
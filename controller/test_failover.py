@@ -0,0 +1,151 @@
+import networkx as nx
+
+from fakes import tables
+from harness import Harness
+
+SRC = "10.0.0.1"
+DST = "10.0.0.3"
+
+
+def ring(size: int = 4) -> Harness:
+    """Switches 1..size in a ring, one host each"""
+    harness = Harness(nx.relabel_nodes(nx.cycle_graph(size), lambda n: n + 1))
+    harness.bring_up()
+    harness.learn_hosts()
+    return harness
+
+
+def link_ends(harness: Harness, u: int, v: int):
+    for src, dst in harness.links:
+        if {src.dpid, dst.dpid} == {u, v}:
+            return src, dst
+    raise KeyError((u, v))
+
+
+def group_mods(harness: Harness, sent: dict):
+    """(dpid, group id, command) of the GroupMods sent after the counts in sent"""
+    return [(dpid, msg.group_id, msg.command) for dpid, dp in harness.dps.items()
+            for msg in dp.sent[sent[dpid]:] if type(msg).__name__ == "OFPGroupMod"]
+
+
+def sent_counts(harness: Harness) -> dict:
+    return {dpid: len(dp.sent) for dpid, dp in harness.dps.items()}
+
+
+def test_detour_buckets():
+    graph = nx.Graph([(1, 2), (1, 3), (3, 2), (1, 6), (6, 2), (1, 4), (4, 5), (5, 2),
+                      (1, 7), (7, 8), (8, 9), (9, 2)])
+    harness = Harness(graph)
+    harness.bring_up()
+    app = harness.app
+    port, label = app.graph.port, app.graph.label
+    buckets, links = app.failover.buckets(1, 2)
+    # Direct first, then the two shortest detours, innermost label first.
+    # 1-4-5-2 is one detour too many, 1-7-8-9-2 is longer than 3 hops.
+    assert buckets == ((port(1, 2), ()),
+                       (port(1, 3), (label(2),)),
+                       (port(1, 6), (label(2),)))
+    assert set(links) == {(1, 2), (1, 3), (2, 3), (1, 6), (2, 6)}
+
+    # Around the ring the detour crosses both other switches.
+    harness = ring()
+    app = harness.app
+    port, label = app.graph.port, app.graph.label
+    buckets, links = app.failover.buckets(1, 2)
+    assert buckets == ((port(1, 2), ()), (port(1, 4), (label(2), label(3))))
+    assert links == ((1, 2), (1, 4), (3, 4), (2, 3))
+
+
+def test_users_index_matches_links():
+    harness = ring()
+    failover = harness.app.failover
+    assert set(failover._links) == {(dpid, peer) for dpid, groups in failover.groups.items()
+                                    for peer in groups}
+    for pair, links in failover._links.items():
+        assert links == failover.buckets(*pair)[1]
+        assert all(pair in failover._users[link] for link in links)
+    for link, users in failover._users.items():
+        assert all(link in failover._links[pair] for pair in users)
+
+    failover.forget(1)
+    assert not [pair for pair in failover._links if pair[0] == 1]
+    assert not [pair for users in failover._users.values() for pair in users if pair[0] == 1]
+
+
+def test_failed_link_still_delivers_and_updates_only_its_users():
+    harness = Harness(nx.convert_node_labels_to_integers(nx.grid_2d_graph(3, 4), first_label=1))
+    harness.bring_up()
+    harness.learn_hosts()
+    app = harness.app
+    dst = "10.0.0.12"
+    harness.send([(SRC, dst)])
+    hops = harness.trace(SRC, dst)
+    assert hops[0] == 1 and hops[-1] == 12
+    u, v = hops[1], hops[2]
+    dead = {frozenset((u, v))}
+    # The switch reroutes on its own before the controller hears of it.
+    assert harness.trace(SRC, dst, dead=dead)
+
+    users = app.failover._users[(min(u, v), max(u, v))] | {(u, v), (v, u)}
+    expected = {(dpid, app.failover.group_id(dpid, peer)) for dpid, peer in users}
+    # Most groups do not cross the link.
+    assert len(app.failover) > 2 * len(expected)
+    update_group = app.failover._update_group
+    checked = set()
+
+    def spy(dp, peer):
+        checked.add((dp.id, peer))
+        return update_group(dp, peer)
+
+    app.failover._update_group = spy
+    sent = sent_counts(harness)
+    harness.fail_link(*link_ends(harness, u, v))
+    # Only the groups indexed under the link are even looked at.
+    assert checked <= users
+    modified = group_mods(harness, sent)
+    assert modified
+    assert {(dpid, group_id) for dpid, group_id, _ in modified} <= expected
+    assert harness.trace(SRC, dst, dead=dead)
+
+
+def test_adopted_group_with_same_buckets_is_not_resent():
+    harness = ring()
+    app = harness.app
+    dp = harness.dps[1]
+    _, descs = tables(dp)
+    ours = dict(app.failover.groups[1])
+    links = {pair: app.failover._links[pair] for pair in app.failover._links if pair[0] == 1}
+
+    # As a restarted controller that knows nothing of the groups yet.
+    app.failover.forget(1)
+    sent = sent_counts(harness)
+    others = app.failover.adopt(dp, descs, app.mpls_dpids)
+    assert others == []
+    assert group_mods(harness, sent) == []
+    assert app.failover.groups[1] == ours
+    assert {pair: app.failover._links[pair] for pair in links} == links
+
+    # A group that lost its detour while the controller was away is modified.
+    peer, (group_id, buckets) = next(iter(sorted(ours.items())))
+    stale = [desc for desc in descs if desc.group_id == group_id][0]
+    stale.buckets = stale.buckets[:1]
+    app.failover.forget(1)
+    sent = sent_counts(harness)
+    app.failover.adopt(dp, descs, app.mpls_dpids)
+    assert group_mods(harness, sent) == [(1, group_id, dp.ofproto.OFPGC_MODIFY)]
+    assert app.failover.groups[1][peer] == (group_id, buckets)
+
+
+def test_group_deleted_once_peer_is_unreachable():
+    harness = Harness(nx.path_graph([1, 2, 3]))
+    harness.bring_up()
+    app = harness.app
+    ends = {1: app.failover.group_id(1, 2), 2: app.failover.group_id(2, 1)}
+    assert None not in ends.values()
+    sent = sent_counts(harness)
+    harness.fail_link(*link_ends(harness, 1, 2))
+    # No detour around a path, both ends delete their group.
+    delete = harness.dps[1].ofproto.OFPGC_DELETE
+    assert sorted(group_mods(harness, sent)) == [(1, ends[1], delete), (2, ends[2], delete)]
+    assert 2 not in app.failover.groups[1] and 1 not in app.failover.groups[2]
+    assert (1, 2) not in app.failover._links and (1, 2) not in app.failover._users
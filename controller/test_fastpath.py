@@ -0,0 +1,117 @@
+import random
+
+import pytest
+from ryu.lib.packet import packet, ethernet, arp, ipv4, ipv6, lldp, udp, vlan
+from ryu.ofproto import ether, inet
+
+import fastpath
+import utils
+
+HOST_MAC = "00:00:00:00:00:01"
+OTHER_MAC = "00:00:00:00:00:02"
+
+
+def serialize(*protocols) -> bytes:
+    p = packet.Packet()
+    for protocol in protocols:
+        p.add_protocol(protocol)
+    p.serialize()
+    return bytes(p.data)
+
+
+def arp_frame(src_ip: str, dst_ip: str, src_mac: str = HOST_MAC, dst_mac: str = OTHER_MAC,
+              opcode: int = arp.ARP_REQUEST) -> bytes:
+    return serialize(ethernet.ethernet(dst_mac, src_mac, ether.ETH_TYPE_ARP),
+                     arp.arp(opcode=opcode, src_mac=src_mac, src_ip=src_ip,
+                             dst_mac=dst_mac, dst_ip=dst_ip))
+
+
+def ipv4_frame(src_ip: str, dst_ip: str, src_mac: str = HOST_MAC, dst_mac: str = OTHER_MAC,
+               payload: bytes = bytes(18)) -> bytes:
+    return serialize(ethernet.ethernet(dst_mac, src_mac, ether.ETH_TYPE_IP),
+                     ipv4.ipv4(src=src_ip, dst=dst_ip, proto=inet.IPPROTO_UDP),
+                     udp.udp(1000, 2000), payload)
+
+
+def vlan_frame(inner: bytes) -> bytes:
+    """inner with an 802.1Q tag inserted after the addresses"""
+    ethertype = int.from_bytes(inner[12:14], "big")
+    return serialize(ethernet.ethernet(OTHER_MAC, HOST_MAC, ether.ETH_TYPE_8021Q),
+                     vlan.vlan(vid=10, ethertype=ethertype), inner[14:])
+
+
+def random_ip(rnd: random.Random) -> str:
+    return ".".join(str(rnd.randrange(256)) for _ in range(4))
+
+
+FRAMES = [
+    arp_frame("10.0.0.1", "10.0.0.2"),
+    arp_frame("10.0.0.2", "10.0.0.1", opcode=arp.ARP_REPLY),
+    arp_frame(utils.PROBE_IP, "10.0.0.3", src_mac=utils.PROBE_MAC, dst_mac="ff:ff:ff:ff:ff:ff"),
+    arp_frame("10.0.0.3", utils.PROBE_IP, dst_mac=utils.PROBE_MAC, opcode=arp.ARP_REPLY),
+    ipv4_frame("10.0.0.1", "10.0.0.2"),
+    ipv4_frame("192.168.1.1", "255.255.255.255", payload=b""),
+    ipv4_frame("10.0.0.1", "10.0.0.2", dst_mac=utils.PROBE_MAC),
+    utils.build_arp_request("10.0.0.9"),
+]
+
+
+@pytest.mark.parametrize("data", FRAMES)
+def test_matches_ryu(data):
+    frame = fastpath.parse(data)
+    assert frame is not None
+    assert frame == fastpath.parse_full(data)
+
+
+@pytest.mark.parametrize("data", FRAMES)
+def test_vlan_tagged_frames_match_untagged(data):
+    tagged = vlan_frame(data)
+    assert fastpath.parse(tagged) == fastpath.parse_full(tagged)
+    assert fastpath.parse(tagged)[:3] == fastpath.parse(data)[:3]
+
+
+def test_fields():
+    assert fastpath.parse(arp_frame("10.0.0.1", "10.0.0.2")) == fastpath.Frame(
+        ether.ETH_TYPE_ARP, "10.0.0.1", "10.0.0.2", False, False)
+    probe = fastpath.parse(utils.build_arp_request("10.0.0.9"))
+    assert probe == fastpath.Frame(ether.ETH_TYPE_ARP, utils.PROBE_IP, "10.0.0.9", True, False)
+    to_probe = fastpath.parse(ipv4_frame("10.0.0.1", "10.0.0.2", dst_mac=utils.PROBE_MAC))
+    assert to_probe.ethertype == ether.ETH_TYPE_IP
+    assert not to_probe.from_probe and to_probe.to_probe
+
+
+def test_random_addresses_match_ryu():
+    rnd = random.Random(1)
+    for _ in range(500):
+        src, dst = random_ip(rnd), random_ip(rnd)
+        macs = rnd.choice([(HOST_MAC, OTHER_MAC), (utils.PROBE_MAC, OTHER_MAC),
+                           (HOST_MAC, utils.PROBE_MAC)])
+        for data in (arp_frame(src, dst, *macs), ipv4_frame(src, dst, *macs)):
+            # memoryview, as a buffer from the socket may come
+            assert fastpath.parse(memoryview(data)) == fastpath.parse_full(data)
+
+
+def test_ignored_frames():
+    lldp_frame = serialize(
+        ethernet.ethernet(lldp.LLDP_MAC_NEAREST_BRIDGE, HOST_MAC, ether.ETH_TYPE_LLDP),
+        lldp.lldp([lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED, chassis_id=b"1"),
+                   lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT, port_id=b"1"),
+                   lldp.TTL(ttl=120), lldp.End()]))
+    ipv6_frame = serialize(ethernet.ethernet(OTHER_MAC, HOST_MAC, ether.ETH_TYPE_IPV6),
+                           ipv6.ipv6(src="fe80::1", dst="fe80::2", nxt=inet.IPPROTO_UDP),
+                           udp.udp(1000, 2000))
+    for data in (lldp_frame, ipv6_frame):
+        assert fastpath.parse(data) is None
+        assert fastpath.parse_full(data) is None
+
+
+@pytest.mark.parametrize("size", [0, 6, 13, 14, 20, 33])
+def test_truncated_ipv4(size):
+    assert fastpath.parse(ipv4_frame("10.0.0.1", "10.0.0.2")[:size]) is None
+
+
+def test_truncated_arp():
+    data = arp_frame("10.0.0.1", "10.0.0.2")
+    for size in range(14, 42):
+        # Left to the full parser, which gives up without raising.
+        assert fastpath.parse(data[:size]) is None
@@ -0,0 +1,147 @@
+import random
+
+import networkx as nx
+import pytest
+
+from path_cache import PathCache
+from topology_store import TopologyStore
+
+
+def cost(graph: nx.Graph, src: int, dst: int, route) -> float:
+    """Weight of the path a route stands for, checking it is one"""
+    first, labels = route
+    hops = [src, first, *reversed(labels)]
+    assert hops[-1] == dst
+    return sum(graph[u][v]["weight"] for u, v in zip(hops, hops[1:]))
+
+
+def check(cache: PathCache, graph: nx.Graph, pairs):
+    for src, dst in pairs:
+        if src not in graph or dst not in graph:
+            continue
+        try:
+            expected = nx.shortest_path_length(graph, src, dst, weight="weight")
+        except nx.NetworkXNoPath:
+            with pytest.raises(nx.NetworkXNoPath):
+                cache.get(src, dst)
+            continue
+        assert cost(graph, src, dst, cache.get(src, dst)) == pytest.approx(expected)
+
+
+def weighted(graph: nx.Graph, rnd: random.Random) -> nx.Graph:
+    for u, v in graph.edges:
+        graph[u][v]["weight"] = rnd.randint(1, 5)
+    return graph
+
+
+def test_same_shape_as_get_shortest_path():
+    graph = nx.path_graph(4)
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    assert cache.get(0, 3) == (1, (3, 2))
+    assert cache.get(0, 1) == (1, ())
+
+
+def test_lookups_are_cached():
+    graph = weighted(nx.connected_watts_strogatz_graph(30, 4, 0.2, seed=1), random.Random(1))
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    pairs = [(u, v) for u in graph for v in graph if u != v]
+    check(cache, graph, pairs)
+    assert cache.misses == len(pairs) and cache.hits == 0
+    check(cache, graph, pairs)
+    assert cache.hits == len(pairs)
+
+
+def test_build_matches_lazy_routes():
+    graph = weighted(nx.connected_watts_strogatz_graph(40, 4, 0.2, seed=2), random.Random(2))
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    cache.build(chunk=7)
+    check(cache, graph, [(u, v) for u in graph for v in graph if u != v])
+
+
+def test_shortcut_invalidates_routes():
+    graph = nx.path_graph(6)
+    nx.set_edge_attributes(graph, 1, "weight")
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    assert cache.get(0, 5) == (1, (5, 4, 3, 2))
+    cache.add_edge(0, 5, 10, 10, 1)
+    graph.add_edge(0, 5, weight=1)
+    assert cache.get(0, 5) == (5, ())
+    check(cache, graph, [(0, 4), (1, 5), (5, 0)])
+
+
+def test_removed_link_is_not_used():
+    graph = nx.cycle_graph(6)
+    nx.set_edge_attributes(graph, 1, "weight")
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    assert cache.get(0, 1) == (1, ())
+    cache.remove_edge(0, 1)
+    graph.remove_edge(0, 1)
+    assert cache.get(0, 1) == (5, (1, 2, 3, 4))
+    cache.remove_edge(3, 4)
+    graph.remove_edge(3, 4)
+    with pytest.raises(nx.NetworkXNoPath):
+        cache.get(0, 1)
+
+
+def test_heavier_link_is_avoided():
+    graph = nx.cycle_graph(4)
+    nx.set_edge_attributes(graph, 1, "weight")
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    assert cache.get(0, 1) == (1, ())
+    cache.set_weight(0, 1, 5)
+    assert cache.get(0, 1) == (3, (1, 2))
+    cache.set_weight(0, 1, 1)
+    assert cache.get(0, 1) == (1, ())
+
+
+def test_removed_switch_is_unreachable():
+    graph = nx.star_graph(3)
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    assert cache.get(1, 2) == (0, (2,))
+    cache.remove_node(0)
+    with pytest.raises(nx.NetworkXNoPath):
+        cache.get(1, 2)
+    # The freed row goes to the next switch, routes to it start fresh.
+    cache.graph.add_switch(9, 9)
+    cache.add_edge(1, 9, 5, 1)
+    assert cache.get(1, 9) == (9, ())
+
+
+def test_random_changes_keep_routes_shortest():
+    rnd = random.Random(3)
+    graph = weighted(nx.connected_watts_strogatz_graph(40, 4, 0.3, seed=3), rnd)
+    cache = PathCache(TopologyStore.from_networkx(graph))
+    next_dpid = len(graph)
+    for _ in range(300):
+        nodes = list(graph)
+        pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(20)]
+        # Warm the cache so the change has routes to invalidate.
+        check(cache, graph, pairs)
+        op = rnd.random()
+        edges = list(graph.edges)
+        if op < 0.3 and edges:
+            u, v = rnd.choice(edges)
+            cache.remove_edge(u, v)
+            graph.remove_edge(u, v)
+        elif op < 0.6:
+            u, v = rnd.sample(nodes, 2)
+            w = rnd.randint(1, 5)
+            cache.add_edge(u, v, 100 + v, 100 + u, w)
+            graph.add_edge(u, v, weight=w)
+        elif op < 0.85 and edges:
+            u, v = rnd.choice(edges)
+            w = rnd.randint(1, 5)
+            cache.set_weight(u, v, w)
+            graph[u][v]["weight"] = w
+        elif op < 0.95 and len(nodes) > 10:
+            node = rnd.choice(nodes)
+            cache.remove_node(node)
+            graph.remove_node(node)
+        else:
+            node, next_dpid = next_dpid, next_dpid + 1
+            cache.graph.add_switch(node, node)
+            graph.add_node(node)
+            peer = rnd.choice(nodes)
+            cache.add_edge(node, peer, 1, 200 + node, 1)
+            graph.add_edge(node, peer, weight=1)
+        check(cache, graph, pairs)
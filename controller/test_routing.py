@@ -0,0 +1,118 @@
+import networkx as nx
+import pytest
+from ryu.controller import ofp_event
+from ryu.ofproto import ether
+
+import config
+import routing
+from harness import Harness
+
+SRC = "10.0.0.1"
+DST = "10.0.0.3"
+
+
+def ring(size: int = 4) -> Harness:
+    """Switches 1..size in a ring, one host each, h1 sends to h3"""
+    harness = Harness(nx.relabel_nodes(nx.cycle_graph(size), lambda n: n + 1))
+    harness.bring_up()
+    harness.learn_hosts()
+    app = harness.app
+    app.routing.metric = routing.load
+    return harness
+
+
+def load_on(harness: Harness, loaded):
+    """Report utilization 0.9 on the links in loaded, nothing elsewhere"""
+    graph = harness.app.graph
+
+    def utilization(dpid, port_no, capacity):
+        return 0.9 if frozenset((dpid, graph.peer(dpid, port_no))) in loaded else 0.0
+
+    harness.app.stats.link_utilization = utilization
+
+
+def reweight(harness: Harness, dpid: int):
+    harness.fire("reweight", lambda ev: harness.app.update_link_load(dpid), None)
+    harness.acknowledge()
+    return harness.get_phase("reweight").messages
+
+
+def test_loaded_link_moves_installed_flow():
+    harness = ring()
+    harness.send([(SRC, DST)])
+    key = (1, ether.ETH_TYPE_IP, DST)
+    first = harness.app.flows[key][0]
+    assert harness.trace(SRC, DST) == [1, first, 3]
+
+    load_on(harness, {frozenset((1, first))})
+    sent = reweight(harness, 1)
+    other = 6 - first
+    assert harness.app.flows[key][0] == other
+    assert harness.trace(SRC, DST) == [1, other, 3]
+    assert sent["OFPFlowMod"] >= 1
+    assert harness.app.counters["links_reweighted"] == 1
+    assert key in harness.app.flow_links[tuple(sorted((1, other)))]
+    assert key not in harness.app.flow_links.get(tuple(sorted((1, first))), ())
+
+
+def test_small_change_keeps_flows():
+    harness = ring()
+    harness.send([(SRC, DST)])
+    harness.app.routing.threshold = 100
+    load_on(harness, {frozenset((1, 2)), frozenset((1, 4))})
+    assert not reweight(harness, 1)
+    assert harness.app.counters["links_reweighted"] == 0
+
+
+def test_flow_on_its_only_route_is_not_sent_again():
+    harness = Harness(nx.path_graph([1, 2, 3]))
+    harness.bring_up()
+    harness.learn_hosts()
+    harness.app.routing.metric = routing.load
+    harness.send([(SRC, DST)])
+    load_on(harness, {frozenset((1, 2))})
+    sent = reweight(harness, 1)
+    assert harness.app.counters["links_reweighted"] == 1
+    assert sent["OFPFlowMod"] == 0
+    assert harness.trace(SRC, DST) == [1, 2, 3]
+
+
+def test_multipath_group_released(monkeypatch):
+    monkeypatch.setattr(config, "ROUTING_PATHS", 2)
+    monkeypatch.setattr(config, "ROUTING_EQUAL_COST", True)
+    harness = ring()
+    app = harness.app
+    harness.send([(SRC, DST)])
+    key = (1, ether.ETH_TYPE_IP, DST)
+    group_id, routes = app.multipath[key]
+    assert len(routes) == 2 and app.group_users[1, group_id] == 1
+    # Both links of the ring are used through the group.
+    assert key in app.flow_links[(1, 2)] and key in app.flow_links[(1, 4)]
+
+    load_on(harness, {frozenset((1, 2))})
+    sent = reweight(harness, 1)
+    # Only one equal cost route is left, the group goes.
+    assert key not in app.multipath
+    assert not app.groups[1] and not app.group_users
+    assert sent["OFPGroupMod"] == 1
+    assert app.flows[key][0] == 4
+    assert key not in app.flow_links.get((1, 2), ())
+
+
+def test_group_delete_removal_keeps_new_flow():
+    harness = ring()
+    app = harness.app
+    harness.send([(SRC, DST)])
+    dp = harness.dps[1]
+    parser = dp.ofproto_parser
+    msg = parser.OFPFlowRemoved(dp, priority=config.FLOW_PRIORITY,
+                                reason=dp.ofproto.OFPRR_GROUP_DELETE,
+                                match=parser.OFPMatch(eth_type=ether.ETH_TYPE_IP, ipv4_dst=DST))
+    app.flow_removed(ofp_event.EventOFPFlowRemoved(msg))
+    assert (1, ether.ETH_TYPE_IP, DST) in app.flows
+
+
+@pytest.mark.parametrize("metric", sorted(routing.METRICS))
+def test_metrics_positive(metric):
+    props = {"bw": 10, "delay": 5, "loss": 10}
+    assert routing.METRICS[metric](props, 0.5) > 0
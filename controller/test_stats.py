@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from ryu.ofproto import ofproto_v1_4_parser as parser
+
+from stats import PORT_FIELDS, RingSeries, StatsCollector
+
+
+def fill(series: RingSeries, key, times, step=(10, 100)):
+    for t in times:
+        series.append(key, t, [int(t * s) for s in step])
+
+
+def test_wraparound_keeps_last_samples():
+    series = RingSeries(rows=2, history=4, fields=("a", "b"))
+    fill(series, "k", range(1, 11))
+    times, values = series.series("k", "a")
+    assert list(times) == [7, 8, 9, 10]
+    assert list(values) == [70, 80, 90, 100]
+    assert series.head[series.keys["k"]] == 10 % 4
+    assert series.rate("k", "a") == 10
+    assert series.rate("k", "b") == 100
+
+
+def test_rate_after_counter_reset():
+    series = RingSeries(rows=1, history=4, fields=("a", "b"))
+    fill(series, "k", range(1, 7))
+    # The port flapped, its duration and counters start again.
+    series.append("k", 0.5, [3, 0])
+    assert series.rate("k", "a") == 0.0
+    assert list(series.series("k", "a")[1]) == [3]
+    series.append("k", 2.5, [43, 0])
+    assert series.rate("k", "a") == pytest.approx(20)
+    assert list(series.series("k", "a")[0]) == [0.5, 2.5]
+
+
+def test_vector_rates_match_single_rates():
+    series = RingSeries(rows=4, history=3, fields=("a", "b"))
+    fill(series, "x", range(1, 8))
+    fill(series, "y", [1, 3, 4, 6], step=(5, 7))
+    fill(series, "z", [2])
+    keys, rates = series.rates("a")
+    assert dict(zip(keys, rates)) == {key: series.rate(key, "a") for key in ("x", "y", "z")}
+    assert dict(zip(keys, rates)) == {"x": 10, "y": 5, "z": 0}
+
+
+def test_rows_bounded_and_reused():
+    series = RingSeries(rows=2, history=2, fields=("a", "b"))
+    for key in "abc":
+        series.append(key, 1.0, [1, 1])
+    assert len(series) == 2 and series.dropped == 1
+    series.release("a")
+    assert series.append("c", 1.0, [1, 1]) is not None
+    assert series.rate("c", "a") == 0.0 and len(series.series("c", "a")[0]) == 1
+
+
+def port_stat(port_no: int, time: float, tx_bytes: int):
+    values = dict.fromkeys(PORT_FIELDS, 0)
+    values["tx_bytes"] = tx_bytes
+    return SimpleNamespace(port_no=port_no, duration_sec=int(time),
+                           duration_nsec=int(round(time % 1 * 1e9)), **values)
+
+
+def flow_stat(ipv4_dst: str, time: float, byte_count: int):
+    return SimpleNamespace(table_id=0, priority=10, duration_sec=int(time), duration_nsec=0,
+                           match=parser.OFPMatch(eth_type=0x800, ipv4_dst=ipv4_dst),
+                           packet_count=byte_count // 100, byte_count=byte_count)
+
+
+def test_link_utilization_over_more_polls_than_history():
+    collector = StatsCollector({}, history=3, max_ports=8)
+    # 1 Mbit/s on port 1, then 4 Mbit/s from the sixth poll on.
+    sent = 0
+    for poll in range(1, 9):
+        sent += 125000 if poll < 6 else 500000
+        assert collector.port_stats_reply(1, [port_stat(1, poll, sent),
+                                              port_stat(2, poll, 0)]) == [1, 2]
+    times, values = collector.ports.series((1, 1), "tx_bytes")
+    assert list(times) == [6, 7, 8]
+    assert list(np.diff(values.astype(np.int64))) == [500000, 500000]
+    assert collector.link_utilization(1, 1, 10e6) == pytest.approx(0.4)
+    assert collector.link_utilization(1, 2, 10e6) == 0.0
+    assert collector.top_ports(1) == [((1, 1), 500000.0)]
+
+
+def test_flow_replies_release_missing_flows():
+    collector = StatsCollector({}, history=4, max_flows=8)
+    for t, count in ((1, 1000), (2, 5000)):
+        collector.flow_stats_reply(1, [flow_stat("10.0.0.1", t, count)], more=True)
+        collector.flow_stats_reply(1, [flow_stat("10.0.0.2", t, count * 2)])
+    top = collector.top_talkers(2)
+    assert [rate for _, rate in top] == [8000, 4000]
+    assert dict(top[0][0][3])["ipv4_dst"] == "10.0.0.2"
+
+    collector.flow_stats_reply(1, [flow_stat("10.0.0.1", 3, 9000)])
+    assert len(collector.flows) == 1
+    collector.port_stats_reply(1, [port_stat(1, 1, 0)])
+    collector.port_stats_reply(2, [port_stat(1, 1, 0)])
+    collector.forget(1)
+    assert len(collector.flows) == 0 and list(collector.ports.keys) == [(2, 1)]
@@ -0,0 +1,132 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import topology_store
+from topology_store import NO_ROW, TopologyStore
+
+
+def assert_same(store: TopologyStore, graph: nx.Graph):
+    """store holds the switches, links, ports and weights of graph"""
+    assert set(store) == set(graph)
+    assert len(store) == len(graph)
+    assert {frozenset(link) for link in store.links()} == {frozenset(e) for e in graph.edges}
+    for node in graph:
+        assert store.label(node) == graph.nodes[node]["id"]
+        assert sorted(store.neighbours(node)) == sorted(graph[node])
+        assert store.ports(node) == {peer: graph[node][peer]["ports"][node] for peer in graph[node]}
+    for u, v, data in graph.edges(data=True):
+        assert store.has_link(u, v) and store.has_link(v, u)
+        assert store.weight(u, v) == store.weight(v, u) == data["weight"]
+        assert store.port(u, v) == data["ports"][u]
+        assert store.peer(u, data["ports"][u]) == v
+        assert store.peer(v, data["ports"][v]) == u
+
+
+def assert_same_distances(store: TopologyStore, graph: nx.Graph, sources):
+    dist, pred = store.shortest_paths(sources)
+    for src, row_dist, row_pred in zip(sources, dist, pred):
+        expected = nx.single_source_dijkstra_path_length(graph, src, weight="weight")
+        for node in graph:
+            row = store.index[node]
+            if node not in expected:
+                assert row_dist[row] == np.inf and row_pred[row] == NO_ROW
+                continue
+            assert row_dist[row] == pytest.approx(expected[node])
+            if node != src:
+                # The predecessor ends a shortest path to it.
+                parent = int(store.dpids[row_pred[row]])
+                weight = graph[parent][node]["weight"]
+                assert expected[parent] + weight == pytest.approx(expected[node])
+
+
+def random_graph(rnd: random.Random, size: int = 30) -> nx.Graph:
+    graph = nx.connected_watts_strogatz_graph(size, 4, 0.3, seed=rnd.randrange(1000))
+    for node in graph:
+        graph.nodes[node]["id"] = node + 1
+    ports = {node: 0 for node in graph}
+    for u, v in graph.edges:
+        ports[u] += 1
+        ports[v] += 1
+        graph[u][v].update(weight=float(rnd.randint(1, 5)), ports={u: ports[u], v: ports[v]})
+    return graph
+
+
+def test_networkx_round_trip():
+    graph = random_graph(random.Random(1))
+    store = TopologyStore.from_networkx(graph)
+    assert_same(store, graph)
+    back = store.to_networkx()
+    assert nx.utils.graphs_equal(back, graph)
+
+
+def test_from_arrays_matches_add_link():
+    graph = random_graph(random.Random(2), 60)
+    store = TopologyStore.from_networkx(graph)
+    dpids = np.array(list(store), dtype=np.int64)
+    labels = np.array([store.label(dpid) for dpid in dpids])
+    bulk = TopologyStore.from_arrays(dpids, labels, *store.arcs())
+    assert_same(bulk, graph)
+    assert_same_distances(bulk, graph, list(graph)[:10])
+
+
+def test_random_changes_match_networkx():
+    rnd = random.Random(3)
+    graph = random_graph(rnd)
+    store = TopologyStore.from_networkx(graph)
+    next_dpid = 1000
+    for step in range(400):
+        nodes = list(graph)
+        op = rnd.random()
+        if op < 0.25 and graph.number_of_edges():
+            u, v = rnd.choice(list(graph.edges))
+            store.remove_link(u, v)
+            graph.remove_edge(u, v)
+        elif op < 0.6:
+            u, v = rnd.sample(nodes, 2)
+            weight = float(rnd.randint(1, 5))
+            # Ports past anything a switch already has, links grow its block.
+            port_u, port_v = 100 + step, 200 + step
+            store.add_link(u, v, port_u, port_v, weight)
+            graph.add_edge(u, v, weight=weight, ports={u: port_u, v: port_v})
+        elif op < 0.75 and graph.number_of_edges():
+            u, v = rnd.choice(list(graph.edges))
+            weight = float(rnd.randint(1, 5))
+            store.set_weight(u, v, weight)
+            graph[u][v]["weight"] = weight
+        elif op < 0.85 and len(nodes) > 5:
+            node = rnd.choice(nodes)
+            store.remove_switch(node)
+            graph.remove_node(node)
+        else:
+            store.add_switch(next_dpid, next_dpid)
+            graph.add_node(next_dpid, id=next_dpid)
+            next_dpid += 1
+        if step % 20 == 0:
+            assert_same(store, graph)
+            assert_same_distances(store, graph, rnd.sample(list(graph), 5))
+    assert_same(store, graph)
+    assert_same_distances(store, graph, list(graph))
+
+
+def test_copy_is_independent():
+    graph = random_graph(random.Random(4))
+    store = TopologyStore.from_networkx(graph)
+    copy = store.copy()
+    u, v = next(iter(graph.edges))
+    store.remove_link(u, v)
+    store.add_switch(999, 999)
+    assert_same(copy, graph)
+    assert_same_distances(copy, graph, [u, v])
+
+
+def test_distances_without_scipy(monkeypatch):
+    monkeypatch.setattr(topology_store, "dijkstra", None)
+    graph = random_graph(random.Random(5))
+    store = TopologyStore.from_networkx(graph)
+    u, v = next(iter(graph.edges))
+    store.remove_link(u, v)
+    graph.remove_edge(u, v)
+    assert_same_distances(store, graph, list(graph))
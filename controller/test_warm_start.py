@@ -0,0 +1,91 @@
+import logging
+import zlib
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import warm_start
+from topology_store import TopologyStore
+
+
+@pytest.fixture
+def state() -> warm_start.State:
+    graph = nx.connected_watts_strogatz_graph(20, 4, 0.3, seed=1)
+    for node in graph:
+        graph.nodes[node]["id"] = node + 100
+    for i, (u, v) in enumerate(graph.edges):
+        graph[u][v]["weight"] = 1 + i % 3
+    store = TopologyStore.from_networkx(graph)
+    # Switch 99 left, its label stays taken.
+    mpls_ids = {dpid: dpid + 100 for dpid in graph}
+    mpls_ids[99] = 199
+    ip_to_dpid = {f"10.0.0.{dpid + 1}": dpid for dpid in graph}
+    ip_to_dpid["10.0.1.1"] = 3
+    host_ports = {ip: 1 for ip in ip_to_dpid if ip != "10.0.1.1"}
+    return warm_start.capture(store, mpls_ids, 200, ip_to_dpid, host_ports)
+
+
+def test_round_trip(state):
+    decoded = warm_start.decode(warm_start.encode(state))
+    assert decoded.taken == state.taken
+    assert decoded.id_counter == 200
+    for name in ("switches", "arcs", "hosts"):
+        np.testing.assert_array_equal(getattr(decoded, name), getattr(state, name))
+
+    store = warm_start.topology(decoded)
+    assert 99 not in store and len(store) == 20
+    assert store.label(5) == 105
+    original = warm_start.topology(state).to_networkx()
+    assert nx.utils.graphs_equal(store.to_networkx(), original)
+    hosts = {ip: (dpid, port) for ip, dpid, port in warm_start.hosts(decoded)}
+    assert hosts["10.0.0.6"] == (5, 1)
+    # Learned by another cluster member.
+    assert hosts["10.0.1.1"] == (3, 0)
+
+
+def test_empty_state_round_trip():
+    state = warm_start.capture(TopologyStore(), {}, 1, {}, {})
+    decoded = warm_start.decode(warm_start.encode(state))
+    assert len(decoded.switches) == len(decoded.arcs) == len(decoded.hosts) == 0
+    assert len(warm_start.topology(decoded)) == 0
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:-1],
+    lambda data: data[:10],
+    lambda data: b"",
+    lambda data: data[:40] + bytes([data[40] ^ 1]) + data[41:],
+    lambda data: data + b"\0",
+])
+def test_rejects_corrupt_snapshot(state, corrupt):
+    with pytest.raises(ValueError):
+        warm_start.decode(corrupt(warm_start.encode(state)))
+
+
+def test_rejects_other_format(state):
+    data = warm_start.encode(state)
+    body = b"XXXX" + data[4:-warm_start.CHECKSUM.size]
+    resealed = body + warm_start.CHECKSUM.pack(zlib.crc32(body))
+    with pytest.raises(ValueError, match="format"):
+        warm_start.decode(resealed)
+
+
+def test_save_and_load(state, tmp_path):
+    path = str(tmp_path / "state" / "snapshot.bin")
+    warm_start.save(path, warm_start.encode(state))
+    assert sorted(p.name for p in (tmp_path / "state").iterdir()) == ["snapshot.bin"]
+    loaded = warm_start.load(path)
+    np.testing.assert_array_equal(loaded.arcs, state.arcs)
+
+
+def test_load_ignores_missing_and_corrupt(state, tmp_path, caplog):
+    path = tmp_path / "snapshot.bin"
+    assert warm_start.load(str(path)) is None
+    assert warm_start.load(None) is None
+    data = bytearray(warm_start.encode(state))
+    data[len(data) // 2] ^= 0xff
+    path.write_bytes(bytes(data))
+    with caplog.at_level(logging.WARNING):
+        assert warm_start.load(str(path)) is None
+    assert "checksum" in caplog.text
@@ -0,0 +1,395 @@
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import networkx as nx
+import numpy as np
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:
+    dijkstra = None
+
+# Predecessor of the source and of unreachable rows, as scipy's csgraph uses.
+NO_ROW = -9999
+# Link slots a switch starts with, its block doubles when they are used up.
+INITIAL_ROOM = 4
+
+
+class TopologyStore:
+    """Switches and links in dense integer arrays.
+
+    Every switch gets a row, reused after it leaves, and a block of link
+    slots in ``link_peer``/``link_port``/``link_weight``: the first
+    ``degree[row]`` slots from ``start[row]`` hold its links, each as the
+    peer's row, the local port towards it and the link weight. A block that
+    fills up moves to the end with twice the room, blocks left behind are
+    compacted away once they take more than half the slots. ``csr`` reads
+    the blocks off as CSR arrays for bulk shortest paths with scipy.
+
+    Links are stored in both directions, every change bumps ``version``.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.index: Dict[int, int] = {}
+        self.version = 0
+        self.dpids = np.full(capacity, -1, dtype=np.int64)
+        self.labels = np.zeros(capacity, dtype=np.int32)
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.degree = np.zeros(capacity, dtype=np.int32)
+        self.room = np.zeros(capacity, dtype=np.int32)
+        self.link_peer = np.full(capacity * INITIAL_ROOM, NO_ROW, dtype=np.int32)
+        self.link_port = np.zeros(capacity * INITIAL_ROOM, dtype=np.int32)
+        self.link_weight = np.zeros(capacity * INITIAL_ROOM, dtype=np.float64)
+        self.rows = 0
+        self._free_rows: List[int] = []
+        self._end = 0
+        self._wasted = 0
+        # (version, csr arrays, scipy matrix) of the last shortest_paths
+        self._csr = (-1, None, None)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, dpid: int) -> bool:
+        return dpid in self.index
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index)
+
+    def label(self, dpid: int) -> int:
+        return int(self.labels[self.index[dpid]])
+
+    def neighbours(self, dpid: int) -> List[int]:
+        row = self.index[dpid]
+        start = self.start[row]
+        return self.dpids[self.link_peer[start:start + self.degree[row]]].tolist()
+
+    def ports(self, dpid: int) -> Dict[int, int]:
+        """peer -> local port of every link of dpid"""
+        row = self.index.get(dpid)
+        if row is None:
+            return {}
+        start = self.start[row]
+        end = start + self.degree[row]
+        return dict(zip(self.dpids[self.link_peer[start:end]].tolist(),
+                        self.link_port[start:end].tolist()))
+
+    def peer(self, dpid: int, port_no: int) -> Optional[int]:
+        """Switch at the other end of port_no, None if it is not a link port"""
+        row = self.index.get(dpid)
+        if row is None:
+            return None
+        start = self.start[row]
+        found = np.flatnonzero(self.link_port[start:start + self.degree[row]] == port_no)
+        return int(self.dpids[self.link_peer[start + found[0]]]) if len(found) else None
+
+    def has_link(self, u: int, v: int) -> bool:
+        return self._slot(u, v) >= 0
+
+    def port(self, u: int, v: int) -> int:
+        slot = self._slot(u, v)
+        if slot < 0:
+            raise KeyError((u, v))
+        return int(self.link_port[slot])
+
+    def weight(self, u: int, v: int) -> float:
+        slot = self._slot(u, v)
+        if slot < 0:
+            raise KeyError((u, v))
+        return float(self.link_weight[slot])
+
+    def links(self) -> Iterator[Tuple[int, int]]:
+        """Every link once, as (u, v) with u < v"""
+        for dpid in self.index:
+            for peer in self.neighbours(dpid):
+                if dpid < peer:
+                    yield dpid, peer
+
+    def add_switch(self, dpid: int, label: int):
+        row = self.index.get(dpid)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = self.rows
+                self.rows += 1
+                if row == len(self.dpids):
+                    self._grow_rows(2 * row)
+            self.index[dpid] = row
+            self.dpids[row] = dpid
+            self.start[row] = self._allocate(INITIAL_ROOM)
+            self.degree[row] = 0
+            self.room[row] = INITIAL_ROOM
+        self.labels[row] = label
+        self.version += 1
+
+    def remove_switch(self, dpid: int):
+        row = self.index.get(dpid)
+        if row is None:
+            return
+        for peer in self.neighbours(dpid):
+            self._unlink(self.index[peer], row)
+        del self.index[dpid]
+        self.dpids[row] = -1
+        self.degree[row] = 0
+        self._wasted += int(self.room[row])
+        self.room[row] = 0
+        self._free_rows.append(row)
+        self.version += 1
+
+    def add_link(self, u: int, v: int, port_u: int, port_v: int, weight: float = 1.0):
+        """Add u-v or update its ports and weight, both switches must be there"""
+        row_u, row_v = self.index[u], self.index[v]
+        self._link(row_u, row_v, port_u, weight)
+        self._link(row_v, row_u, port_v, weight)
+        self.version += 1
+
+    def remove_link(self, u: int, v: int):
+        row_u, row_v = self.index[u], self.index[v]
+        if self._unlink(row_u, row_v):
+            self._unlink(row_v, row_u)
+            self.version += 1
+
+    def set_weight(self, u: int, v: int, weight: float):
+        self.link_weight[self._slot(u, v)] = weight
+        self.link_weight[self._slot(v, u)] = weight
+        self.version += 1
+
+    def csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """indptr, peer rows and weights of every row's links"""
+        indptr, slots = self._slots()
+        return indptr, self.link_peer[slots], self.link_weight[slots]
+
+    def arcs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """dpid, peer dpid, local port and weight of every link in both directions"""
+        indptr, slots = self._slots()
+        src = np.repeat(self.dpids[:self.rows], np.diff(indptr))
+        return src, self.dpids[self.link_peer[slots]], self.link_port[slots], self.link_weight[slots]
+
+    def shortest_paths(self, sources: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distances and predecessor rows from every source dpid to every row,
+        one row of each per source. The predecessor of the source and of
+        unreachable rows is NO_ROW.
+        """
+        rows = [self.index[src] for src in sources]
+        version, arrays, matrix = self._csr
+        if version != self.version:
+            arrays = self.csr()
+            if dijkstra is not None:
+                indptr, peers, weights = arrays
+                matrix = csr_matrix((weights, peers, indptr), shape=(self.rows, self.rows))
+            self._csr = (self.version, arrays, matrix)
+        if dijkstra is not None:
+            return dijkstra(matrix, indices=rows, return_predecessors=True)
+        indptr, peers, weights = arrays
+        dist = np.full((len(rows), self.rows), np.inf)
+        pred = np.full((len(rows), self.rows), NO_ROW, dtype=np.int32)
+        peers, weights = peers.tolist(), weights.tolist()
+        for i, row in enumerate(rows):
+            _dijkstra(indptr, peers, weights, row, dist[i], pred[i])
+        return dist, pred
+
+    def copy(self) -> "TopologyStore":
+        other = TopologyStore.__new__(TopologyStore)
+        other.__dict__.update(self.__dict__)
+        for name, value in self.__dict__.items():
+            if isinstance(value, (np.ndarray, dict, list)):
+                setattr(other, name, value.copy())
+        other._csr = (-1, None, None)
+        return other
+
+    def to_networkx(self) -> nx.Graph:
+        """The topology as the nx.Graph the controller used to keep, for debugging"""
+        graph = nx.Graph()
+        for dpid in self.index:
+            graph.add_node(dpid, id=self.label(dpid))
+        for u, v in self.links():
+            graph.add_edge(u, v, weight=self.weight(u, v),
+                           ports={u: self.port(u, v), v: self.port(v, u)})
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph, weight: str = "weight") -> "TopologyStore":
+        """Store for an nx.Graph, labels from the "id" node attribute and
+        ports from a "ports" edge attribute, numbered per switch if missing"""
+        store = cls(max(len(graph), 1))
+        for node, label in graph.nodes(data="id"):
+            store.add_switch(node, node if label is None else label)
+        for u, v, data in graph.edges(data=True):
+            ports = data.get("ports") or {u: store.degree[store.index[u]] + 1,
+                                          v: store.degree[store.index[v]] + 1}
+            store.add_link(u, v, ports[u], ports[v], data.get(weight, 1))
+        return store
+
+    @classmethod
+    def from_arrays(cls, dpids: np.ndarray, labels: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                    ports: np.ndarray, weights: np.ndarray) -> "TopologyStore":
+        """Store of the switches dpids with their labels and the links arcs()
+        returned, laid out in bulk instead of one add_link at a time"""
+        count = len(dpids)
+        store = cls(max(count, 1))
+        store.index = dict(zip(dpids.tolist(), range(count)))
+        store.rows = count
+        store.dpids[:count] = dpids
+        store.labels[:count] = labels
+        rows, peers = _rows(dpids, src), _rows(dpids, dst)
+
+        degree = np.bincount(rows, minlength=count)
+        room = np.full(count, INITIAL_ROOM, dtype=np.int64)
+        busy = degree > INITIAL_ROOM
+        room[busy] = 2 ** np.ceil(np.log2(degree[busy])).astype(np.int64)
+        start = np.zeros(count, dtype=np.int64)
+        np.cumsum(room[:-1], out=start[1:])
+        end = int(room.sum())
+
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        first = np.zeros(count, dtype=np.int64)
+        np.cumsum(degree[:-1], out=first[1:])
+        slots = start[rows] + np.arange(len(rows)) - first[rows]
+        size = max(end, len(store.link_peer))
+        store.link_peer = np.full(size, NO_ROW, dtype=np.int32)
+        store.link_port = np.zeros(size, dtype=np.int32)
+        store.link_weight = np.zeros(size, dtype=np.float64)
+        store.link_peer[slots] = peers[order]
+        store.link_port[slots] = ports[order]
+        store.link_weight[slots] = weights[order]
+        store.start[:count] = start
+        store.degree[:count] = degree
+        store.room[:count] = room
+        store._end = end
+        store.version = 1
+        return store
+
+    def _slots(self) -> Tuple[np.ndarray, np.ndarray]:
+        """indptr and link slots of every row's links, in row order"""
+        rows = self.rows
+        degree = self.degree[:rows].astype(np.int64)
+        indptr = np.zeros(rows + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        slots = np.repeat(self.start[:rows] - indptr[:-1], degree) + np.arange(indptr[-1])
+        return indptr, slots
+
+    def _slot(self, u: int, v: int) -> int:
+        row_u = self.index.get(u)
+        row_v = self.index.get(v)
+        if row_u is None or row_v is None:
+            return -1
+        return self._find(row_u, row_v)
+
+    def _find(self, row: int, peer: int) -> int:
+        start = self.start[row]
+        found = np.flatnonzero(self.link_peer[start:start + self.degree[row]] == peer)
+        return int(start + found[0]) if len(found) else -1
+
+    def _link(self, row: int, peer: int, port_no: int, weight: float):
+        slot = self._find(row, peer)
+        if slot < 0:
+            if self.degree[row] == self.room[row]:
+                self._move(row, 2 * int(self.room[row]))
+            slot = self.start[row] + self.degree[row]
+            self.degree[row] += 1
+            self.link_peer[slot] = peer
+        self.link_port[slot] = port_no
+        self.link_weight[slot] = weight
+
+    def _unlink(self, row: int, peer: int) -> bool:
+        slot = self._find(row, peer)
+        if slot < 0:
+            return False
+        last = self.start[row] + self.degree[row] - 1
+        for array in (self.link_peer, self.link_port, self.link_weight):
+            array[slot] = array[last]
+        self.link_peer[last] = NO_ROW
+        self.degree[row] -= 1
+        return True
+
+    def _move(self, row: int, room: int):
+        degree = self.degree[row]
+        start = self._allocate(room)
+        # Read after allocating, compacting may have moved the block.
+        old = self.start[row]
+        for array in (self.link_peer, self.link_port, self.link_weight):
+            array[start:start + degree] = array[old:old + degree]
+        self._wasted += int(self.room[row])
+        self.start[row] = start
+        self.room[row] = room
+
+    def _allocate(self, room: int) -> int:
+        if self._end + room > len(self.link_peer):
+            if self._wasted * 2 > self._end:
+                self._compact()
+            if self._end + room > len(self.link_peer):
+                size = max(2 * len(self.link_peer), self._end + room)
+                self.link_peer = _resized(self.link_peer, size, NO_ROW)
+                self.link_port = _resized(self.link_port, size, 0)
+                self.link_weight = _resized(self.link_weight, size, 0)
+        start = self._end
+        self._end += room
+        return start
+
+    def _compact(self):
+        """Pack the live blocks to the front, in row order"""
+        rows = self.rows
+        room = self.room[:rows].astype(np.int64)
+        starts = np.zeros(rows, dtype=np.int64)
+        np.cumsum(room[:-1], out=starts[1:])
+        end = int(room.sum())
+        slots = np.repeat(self.start[:rows] - starts, room) + np.arange(end)
+        for name, fill in (("link_peer", NO_ROW), ("link_port", 0), ("link_weight", 0)):
+            array = getattr(self, name)
+            packed = np.full(len(array), fill, dtype=array.dtype)
+            packed[:end] = array[slots]
+            setattr(self, name, packed)
+        self.start[:rows] = starts
+        self._end = end
+        self._wasted = 0
+
+    def _grow_rows(self, capacity: int):
+        self.dpids = _resized(self.dpids, capacity, -1)
+        self.labels = _resized(self.labels, capacity, 0)
+        self.start = _resized(self.start, capacity, 0)
+        self.degree = _resized(self.degree, capacity, 0)
+        self.room = _resized(self.room, capacity, 0)
+
+
+def _resized(array: np.ndarray, size: int, fill) -> np.ndarray:
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _rows(dpids: np.ndarray, wanted: np.ndarray) -> np.ndarray:
+    """Position in dpids of every dpid in wanted"""
+    order = np.argsort(dpids)
+    found = np.searchsorted(dpids, wanted, sorter=order)
+    rows = order[np.minimum(found, len(order) - 1)] if len(order) else found
+    if len(wanted) and not np.array_equal(dpids[rows], wanted):
+        raise ValueError("Links name switches that are not in the store")
+    return rows
+
+
+def _dijkstra(indptr: np.ndarray, peers: List[int], weights: List[float], source: int,
+              dist: np.ndarray, pred: np.ndarray):
+    """Single source Dijkstra over CSR arrays, for when scipy is missing"""
+    best = {source: 0.0}
+    parent = {}
+    done = set()
+    heap = [(0.0, source)]
+    bounds = indptr.tolist()
+    while heap:
+        d, row = heapq.heappop(heap)
+        if row in done:
+            continue
+        done.add(row)
+        for i in range(bounds[row], bounds[row + 1]):
+            peer = peers[i]
+            nd = d + weights[i]
+            if nd < best.get(peer, float("inf")):
+                best[peer] = nd
+                parent[peer] = row
+                heapq.heappush(heap, (nd, peer))
+    for row, d in best.items():
+        dist[row] = d
+    for row, p in parent.items():
+        pred[row] = p
@@ -1,20 +1,40 @@
-from typing import List, Tuple
+import socket
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from ryu.ofproto import ether
 from ryu.controller.controller import Datapath
 from ryu.lib.packet import packet, ethernet, arp
 from ryu.lib import mac
 import networkx as nx
 
+PROBE_MAC = 'fe:ee:ee:ee:ee:ef'
+PROBE_IP = '10.0.0.100'
+# MPLS labels are 20 bits.
+MPLS_LABEL_MAX = 0xfffff
+# Offset of the target address of an ARP request in its Ethernet frame
+ARP_TPA = 38
 
-def construct_mpls(dp: Datapath, mpls_id: int) -> List:
-    f = dp.ofproto_parser.OFPMatchField.make(
-        dp.ofproto.OXM_OF_MPLS_LABEL, mpls_id)
 
+def construct_mpls(dp: Datapath, mpls_id: int) -> List:
     actions = [dp.ofproto_parser.OFPActionPushMpls(ether.ETH_TYPE_MPLS),
-               dp.ofproto_parser.OFPActionSetField(f)]
+               dp.ofproto_parser.OFPActionSetField(mpls_label=mpls_id)]
     return actions
 
 
+def read_path(ofproto, actions: List) -> Tuple[Tuple[int, ...], Optional[int], Optional[int]]:
+    """Labels pushed, output port and group of actions read back from a
+    switch, the reverse of ActionCache.path"""
+    labels, port, group_id = [], None, None
+    for action in actions:
+        if action.type == ofproto.OFPAT_SET_FIELD and action.key == "mpls_label":
+            labels.append(action.value)
+        elif action.type == ofproto.OFPAT_OUTPUT:
+            port = action.port
+        elif action.type == ofproto.OFPAT_GROUP:
+            group_id = action.group_id
+    return tuple(labels), port, group_id
+
+
 def get_shortest_path(graph: nx.Graph, src: int, dst: int) -> Tuple[int, List[int]]:
     path = nx.shortest_path(graph, src, dst, weight="weight")[1:]
     first = path[0]
@@ -22,14 +42,26 @@ def get_shortest_path(graph: nx.Graph, src: int, dst: int) -> Tuple[int, List[in
     return first, path[:-1]
 
 
-def build_arp(id: int) -> bytearray:
-    dst_ip = f"10.0.0.{id}"
-    e = ethernet.ethernet('ff:ff:ff:ff:ff:ff', 'fe:ee:ee:ee:ee:ef', ether.ETH_TYPE_ARP)
+def build_arp(id: int) -> bytes:
+    return build_arp_request(f"10.0.0.{id}")
+
+
+@lru_cache(maxsize=1)
+def arp_request_template() -> bytes:
+    """ARP request from the controller probe address to 0.0.0.0"""
+    e = ethernet.ethernet('ff:ff:ff:ff:ff:ff', PROBE_MAC, ether.ETH_TYPE_ARP)
     a = arp.arp(hwtype=1, proto=ether.ETH_TYPE_IP, hlen=6, plen=4,
-                opcode=arp.ARP_REQUEST, src_mac='fe:ee:ee:ee:ee:ef', src_ip='10.0.0.100',
-                dst_mac='00:00:00:00:00:00', dst_ip=dst_ip)
+                opcode=arp.ARP_REQUEST, src_mac=PROBE_MAC, src_ip=PROBE_IP,
+                dst_mac='00:00:00:00:00:00', dst_ip='0.0.0.0')
     p = packet.Packet()
     p.add_protocol(e)
     p.add_protocol(a)
     p.serialize()
-    return p.data
+    return bytes(p.data)
+
+
+def build_arp_request(dst_ip: str) -> bytes:
+    """ARP probe for dst_ip, the serialized template with the address put
+    in, so nothing grows with the number of targets"""
+    frame = arp_request_template()
+    return frame[:ARP_TPA] + socket.inet_aton(dst_ip) + frame[ARP_TPA + 4:]
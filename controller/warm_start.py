@@ -0,0 +1,172 @@
+import ipaddress
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from ryu.controller.controller import Datapath
+
+from topology_store import TopologyStore
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b"WSNP"
+FORMAT = 1
+# magic, format, seconds since the epoch it was taken, next free MPLS label,
+# then the number of switches, arcs and hosts that follow
+HEADER = struct.Struct("<4sHdIIII")
+CHECKSUM = struct.Struct("<I")
+# Every label ever handed out, up marks the switches in the graph.
+SWITCH = np.dtype([("dpid", "<u8"), ("label", "<u4"), ("up", "u1")])
+# Links once per direction, as TopologyStore.arcs returns them.
+ARC = np.dtype([("dpid", "<u8"), ("peer", "<u8"), ("port", "<u4"), ("weight", "<f8")])
+# IPv4 address, switch and port of every host, port 0 when another
+# cluster member learned it.
+HOST = np.dtype([("ip", "<u4"), ("dpid", "<u8"), ("port", "<u4")])
+
+
+class State(NamedTuple):
+    """What the controller needs to route again right after a restart"""
+    taken: float
+    id_counter: int
+    switches: np.ndarray
+    arcs: np.ndarray
+    hosts: np.ndarray
+
+
+class TableReader:
+    """Reads the flow and group tables of switches back through multipart
+    requests, for reconciling them after a restart"""
+
+    def __init__(self):
+        self.requests = 0
+        # dpid -> {xid still being answered: parts so far}
+        self._reads: Dict[int, Dict[int, List]] = {}
+        # dpid -> (flow stats xid, group desc xid)
+        self._xids: Dict[int, Tuple[int, int]] = {}
+        self._done: Dict[int, Dict[int, List]] = {}
+
+    def read(self, dp: Datapath):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        requests = [parser.OFPFlowStatsRequest(dp, 0, ofproto.OFPTT_ALL),
+                    parser.OFPGroupDescStatsRequest(dp, 0, ofproto.OFPG_ALL)]
+        for msg in requests:
+            dp.set_xid(msg)
+            dp.send_msg(msg)
+        self.requests += len(requests)
+        self._xids[dp.id] = tuple(msg.xid for msg in requests)
+        self._reads[dp.id] = {msg.xid: [] for msg in requests}
+        self._done[dp.id] = {}
+
+    def expects(self, dpid: int, xid: int) -> bool:
+        return xid in self._reads.get(dpid, ())
+
+    def reply(self, dpid: int, xid: int, body: List, more: bool) -> Optional[Tuple[List, List]]:
+        """Add one part of a reply, return the flow stats and group descs
+        once both replies are complete"""
+        reads = self._reads[dpid]
+        reads[xid].extend(body)
+        if more:
+            return None
+        self._done[dpid][xid] = reads.pop(xid)
+        if reads:
+            return None
+        del self._reads[dpid]
+        done = self._done.pop(dpid)
+        flows, groups = self._xids.pop(dpid)
+        return done[flows], done[groups]
+
+    def forget(self, dpid: int):
+        self._reads.pop(dpid, None)
+        self._xids.pop(dpid, None)
+        self._done.pop(dpid, None)
+
+
+def capture(graph: TopologyStore, mpls_ids: Dict[int, int], id_counter: int,
+            ip_to_dpid: Dict[str, int], host_ports: Dict[str, int]) -> State:
+    switches = np.array([(dpid, label, dpid in graph) for dpid, label in mpls_ids.items()],
+                        dtype=SWITCH)
+    src, dst, ports, weights = graph.arcs()
+    arcs = np.empty(len(src), dtype=ARC)
+    arcs["dpid"], arcs["peer"], arcs["port"], arcs["weight"] = src, dst, ports, weights
+    hosts = np.array([(int(ipaddress.IPv4Address(ip)), dpid, host_ports.get(ip, 0))
+                      for ip, dpid in ip_to_dpid.items()], dtype=HOST)
+    return State(time.time(), id_counter, switches, arcs, hosts)
+
+
+def topology(state: State) -> TopologyStore:
+    up = state.switches[state.switches["up"] != 0]
+    arcs = state.arcs
+    return TopologyStore.from_arrays(up["dpid"].astype(np.int64), up["label"],
+                                     arcs["dpid"].astype(np.int64), arcs["peer"].astype(np.int64),
+                                     arcs["port"], arcs["weight"])
+
+
+def hosts(state: State) -> Iterator[Tuple[str, int, int]]:
+    """Address, switch and port of every host"""
+    for ip, dpid, port_no in state.hosts.tolist():
+        yield str(ipaddress.IPv4Address(ip)), dpid, port_no
+
+
+def encode(state: State) -> bytes:
+    header = HEADER.pack(MAGIC, FORMAT, state.taken, state.id_counter,
+                         len(state.switches), len(state.arcs), len(state.hosts))
+    data = b"".join((header, state.switches.astype(SWITCH).tobytes(),
+                     state.arcs.astype(ARC).tobytes(), state.hosts.astype(HOST).tobytes()))
+    return data + CHECKSUM.pack(zlib.crc32(data))
+
+
+def decode(data: bytes) -> State:
+    if len(data) < HEADER.size + CHECKSUM.size:
+        raise ValueError("Snapshot is truncated")
+    body, (checksum,) = data[:-CHECKSUM.size], CHECKSUM.unpack(data[-CHECKSUM.size:])
+    if zlib.crc32(body) != checksum:
+        raise ValueError("Snapshot checksum does not match")
+    magic, version, taken, id_counter, switches, arcs, hosts = HEADER.unpack_from(body)
+    if magic != MAGIC or version != FORMAT:
+        raise ValueError(f"Not a format {FORMAT} snapshot")
+    if len(body) != HEADER.size + switches * SWITCH.itemsize + arcs * ARC.itemsize + hosts * HOST.itemsize:
+        raise ValueError("Snapshot length does not match its header")
+    offset = HEADER.size
+    arrays = []
+    for dtype, count in ((SWITCH, switches), (ARC, arcs), (HOST, hosts)):
+        arrays.append(np.frombuffer(body, dtype=dtype, count=count, offset=offset))
+        offset += count * dtype.itemsize
+    return State(taken, id_counter, *arrays)
+
+
+def save(path: str, data: bytes):
+    """Replace path with data atomically, a crash leaves the old or the new
+    snapshot but never a torn one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def load(path: str) -> Optional[State]:
+    """State saved in path, None if there is none or it cannot be used"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = decode(f.read())
+    except (OSError, ValueError) as e:
+        LOG.warning("warm start: ignoring snapshot %s: %s", path, e)
+        return None
+    LOG.info("warm start: %d switches, %d links and %d hosts from %.0f s ago",
+             int(state.switches["up"].sum()), len(state.arcs) // 2, len(state.hosts),
+             time.time() - state.taken)
+    return state
@@ -1,16 +1,32 @@
 import json
+import logging
 import os
 import time
 from mininet.util import custom
 from mininet.topo import Topo
-from mininet.log import  info, debug
+from mininet.log import  info, debug, lg
 from mininet.net import Mininet
-from mininet.node import (RemoteController, OVSController, CPULimitedHost)
+from mininet.node import (RemoteController, OVSController, CPULimitedHost,
+                          OVSSwitch)
 from mininet.link import TCLink, TCIntf
 
+from .events import EventFeeder, check_events, event_handlers, read_events
+from .executor import EventExecutor
+from .recovery import Recovery
+from .store import ResultStore, Tailer
+from .topologies import from_file, link_entries
+from .traffic import MESH_PER_HOST, Traffic
 from .minished import scheduler
 
 EVENTS_FILE = 'events.json'
+LINKS_FILE = 'links.json'
+TIMINGS_FILE = 'output/event-timings.csv'
+RESULTS_FILE = 'output/iperf-results.csv'
+# Columnar store iperf reports are ingested into while the emulation runs.
+RESULTS_STORE = 'output/results'
+RECOVERY_FILE = 'output/recovery.csv'
+# Threads scheduled events run on, 0 runs them inline in the scheduler.
+EVENT_WORKERS = 0
 
 NODES_NUMBER = 10
 SWITCH_NUMBER = 6
@@ -48,6 +64,20 @@ TEST_PAIRS = [
 ]
 
 
+def export_link_properties(path=LINKS_FILE, links=LINKS_SWITCH_SWITCH):
+    """
+    Write switch to switch link properties for the controller routing metrics
+    :param path: file to write, read by the controller as LINK_PROPERTIES_FILE
+    :param links: links in LINKS_SWITCH_SWITCH format, switch sN has datapath id N
+    """
+    entries = [dict(src=switch, dst=link['switch'], bw=link['bw'],
+                    delay=link['delay'], loss=link['loss'])
+               for switch, switch_links in links.items()
+               for link in switch_links]
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=2)
+
+
 class CustomTopo(Topo):
     def __init__(self, **params):
         super(CustomTopo, self).__init__(**params)
@@ -77,143 +107,234 @@ class CustomTopo(Topo):
                     **linkopts)
 
 
+class GeneratedTopo(Topo):
+    """
+    Topology from a min_env.topologies.TopologySpec. Link options are drawn
+    when the spec is built, so this only replays its switches, hosts and
+    links.
+    """
+
+    def __init__(self, spec, host_cpu=.1, **params):
+        self.spec = spec
+        self.host_cpu = host_cpu
+        super(GeneratedTopo, self).__init__(**params)
+
+    def build(self, **params):
+        spec = self.spec
+        add_switch, add_host, add_link = self.addSwitch, self.addHost, self.addLink
+        host_opts = dict(cpu=self.host_cpu / max(len(spec.hosts), 1))
+        for switch in spec.switches:
+            add_switch(switch)
+        for host in spec.hosts:
+            add_host(host, **host_opts)
+        for a, b, linkopts in spec.links:
+            add_link(a, b, **linkopts)
+
+
 class Emulation(Mininet):
-    def __init__(self, events_file=None, *args, **kwargs):
+    def __init__(self, events_file=None, workers=EVENT_WORKERS, *args, **kwargs):
         super(Emulation, self).__init__(*args, **kwargs)
         self.scheduler = scheduler(time.time, time.sleep)
-        if events_file:
-            json_events = json.load(open(events_file))
+        self.executor = EventExecutor(workers, time.time)
+        self.traffic = Traffic(self)
+        self.results = ResultStore(RESULTS_STORE)
+        self.tailer = Tailer(self.traffic.output_dir, self.results)
+        self.recovery = Recovery(self)
+        self.feeder = None
+        if events_file and events_file.endswith('.jsonl'):
+            # Streamed from start(), times count from when the network is up.
+            # Checked through once first, a bad line fails before the run.
+            handlers = event_handlers(self)
+            check_events(events_file, handlers)
+            self.feeder = EventFeeder(self.scheduler, read_events(events_file, handlers),
+                                      handlers, self.executor.submit)
+        elif events_file:
+            with open(events_file) as f:
+                json_events = json.load(f)
             self.load_events(json_events)
 
     def load_events(self, json_events):
+        handlers = event_handlers(self)
+        log_events = lg.isEnabledFor(logging.DEBUG)
+        now = self.scheduler.timefunc()
         for event in json_events:
             event_type = event['type']
-            if 'bunch' in event_type:
-                getattr(self, event_type)(event)
-                continue
-            debug("processing event: time "
-                  "{time}, type {type}, params {params}\n".format(**event))
-            self.scheduler.enter(event['time'], 1, getattr(self, event_type),
-                                 kwargs=event['params'])
+            handler = handlers.get(event_type)
+            if handler is None:
+                raise ValueError('unknown event type {}'.format(event_type))
+            if log_events:
+                debug("processing event: time "
+                      "{time}, type {type}, params {params}\n".format(**event))
+            scheduled = now + event['time']
+            self.scheduler.enterabs(
+                scheduled, 1, self.executor.submit,
+                argument=(scheduled, handler, event['params']))
 
     def test_network(self, **kwargs):
         """
-        Call iperf each host on each host
+        Start iperf from each host to each other host in the background
         :param kwargs: named arguments
             :hosts: list of all hosts in network
             :duration: duration of iperf
+            :protocol: tcp or udp (default tcp)
+            :bw: for udp, bandwidth to send at in bits/sec
+            :per_host: clients and server sessions per host at once (default 1)
+            :parallel: clients running at once in total (default no limit)
+        :return: Mesh to wait on, its samples are in self.traffic.results
         """
-        mapper = {
-            'tcp': ('iperf -s -i 1 -t {} -P {} -y C',
-                    'iperf -t {duration} -c {server_ip}'),
-            'udp': ('iperf -u -s -i 1 -t {} -P {} -y C',
-                    'iperf -u -t {duration} -c {server_ip} -b {bw}')
-        }
         kwargs.setdefault('protocol', 'tcp')
         kwargs.setdefault('duration', 10)
         kwargs.setdefault('bw', 100000)
+        kwargs.setdefault('per_host', MESH_PER_HOST)
         info('***iperf event at t={time}: {args}\n'.format(time=time.time(),
                                                            args=kwargs))
-        server_cmd, client_cmd = mapper[kwargs['protocol']]
-
-        if not os.path.exists("output"):
-            os.makedirs("output")
-        hosts = kwargs.pop('hosts')
-        template = 'output/iperf-{protocol}-server-{host}.txt'
-        filenames = [template.format(host=host, **kwargs) for host in hosts]
-        host_objects = [self.get(host) for host in hosts]
-        for (server, filename) in zip(host_objects, filenames):
-            cmd = server_cmd.format(kwargs['duration'], len(hosts) - 1)
-            server.sendCmd('{} &>{} &'.format(cmd, filename))
-            server.waiting = False
-        time.sleep(2)
-        for server in host_objects:
-            for client in host_objects:
-                if not server == client:
-                    cmd = client_cmd.format(server_ip=server.IP(), **kwargs)
-                    client.sendCmd('{} &>/dev/null &'.format(cmd))
-                    client.waiting = False
+        return self.traffic.full_mesh(kwargs['hosts'], kwargs['protocol'],
+                                      kwargs['duration'], kwargs['bw'],
+                                      kwargs['per_host'], kwargs.get('parallel'),
+                                      self._mesh_done)
+
+    def _mesh_done(self, mesh):
+        runs = set(mesh.runs)
+        failed = [run for run in self.traffic.results.failed() if run.run in runs]
+        info('***iperf mesh done at t={time}: {runs} runs, {failed} failed, '
+             'took {took:.1f}s\n'.format(time=mesh.finished, runs=len(runs),
+                                         failed=len(failed),
+                                         took=mesh.finished - mesh.started))
 
     def iperf(self, **kwargs):
         """
         Command to start a transfer between src and dst.
+        Returns once the client runs, its results are collected into
+        self.traffic.results when it exits.
         :param kwargs: named arguments
             src: name of the source node.
             dst: name of the destination node.
             protocol: tcp or udp (default tcp).
             duration: duration of the transfert in seconds (default 10s).
             bw: for udp, bandwidth to send at in bits/sec (default 1 Mbit/sec)
+        :return: run id
         """
         kwargs.setdefault('protocol', 'TCP')
         kwargs.setdefault('duration', 10)
         kwargs.setdefault('bw', 100000)
         info('***iperf event at t={time}: {args}\n'.format(time=time.time(),
                                                            args=kwargs))
-
-        if not os.path.exists("output"):
-            os.makedirs("output")
-        server_output = "output/iperf-{protocol}-server-{src}-{dst}.txt".format(
-            **kwargs)
-        client_output = "output/iperf-{protocol}-client-{src}-{dst}.txt".format(
-            **kwargs)
-        info('output filenames: {client} {server}\n'.format(
-            client=client_output, server=server_output))
-
-        client, server = self.get(kwargs['src'], kwargs['dst'])
-        if kwargs['protocol'].upper() == 'UDP':
-            iperf_server_cmd = 'iperf -u -s -i 1 -t {} -P 1'.format(
-                kwargs['duration'] + 2)
-            iperf_client_cmd = 'iperf -u -t {duration} -c {server_ip} -b {bw}'.format(
-                server_ip=server.IP(), **kwargs)
-
-        elif kwargs['protocol'].upper() == 'TCP':
-            iperf_server_cmd = 'iperf -s -i 1 -t {} -P 1'.format(
-                kwargs['duration'] + 2)
-            iperf_client_cmd = 'iperf -t {duration} -c {server_ip}'.format(
-                server_ip=server.IP(), **kwargs)
-        else:
+        if kwargs['protocol'].upper() not in ('TCP', 'UDP'):
             raise Exception('Unexpected protocol:{protocol}'.format(**kwargs))
 
-        server.sendCmd('{cmd} &>{output} &'.format(cmd=iperf_server_cmd,
-                                                   output=server_output))
-        info('iperf server command: {cmd} -s -i 1 &>{output} &\n'.format(
-            cmd=iperf_server_cmd,
-            output=server_output))
-        # This is a patch to allow sendingCmd while iperf is running
-        # in background.CONS: we can not know when
-        # iperf finishes and get their output
-        server.waiting = False
-
-        if kwargs['protocol'].lower() == 'tcp':
-            while 'Connected' not in client.cmd(
-                    'sh -c "echo A | telnet -e A %s 5001"' % server.IP()):
-                info('Waiting for iperf to start up...\n')
-                time.sleep(.5)
-
-        info('iperf client command: {cmd} &>{output} &\n'.format(
-            cmd=iperf_client_cmd, output=client_output))
-        client.sendCmd('{cmd} &>{output} &'.format(
-            cmd=iperf_client_cmd, output=client_output))
-        # This is a patch to allow sendingCmd while iperf is running
-        # in background.CONS: we  can not know when
-        # iperf finishes and get their output
-        client.waiting = False
+        late = self.traffic.start_servers([kwargs['dst']], kwargs['protocol'])
+        if late:
+            info('iperf server on {} is not listening\n'.format(kwargs['dst']))
+        return self.traffic.start_client(kwargs['src'], kwargs['dst'], kwargs['protocol'],
+                                         kwargs['duration'], kwargs['bw'])
+
+    def ping(self, **kwargs):
+        """
+        Start a ping probe that link events are measured against
+        :param kwargs: named arguments
+            src: name of the source node.
+            dst: name of the destination node.
+            duration: seconds to ping for (default 60s).
+            interval: seconds between requests (default 10ms).
+        :return: path of the probe output
+        """
+        info('***ping event at t={time}: {args}\n'.format(time=time.time(), args=kwargs))
+        return self.recovery.probe(kwargs['src'], kwargs['dst'], kwargs.get('duration', 60),
+                                   kwargs.get('interval'))
+
+    def link_down(self, **kwargs):
+        """
+        Take the link between two nodes down
+        :param kwargs: named arguments
+            src: name of one end.
+            dst: name of the other end.
+        """
+        info('***link down event at t={time}: {args}\n'.format(time=time.time(), args=kwargs))
+        self.recovery.link(kwargs['src'], kwargs['dst'], 'down')
+
+    def link_up(self, **kwargs):
+        """
+        Bring the link between two nodes back up
+        :param kwargs: named arguments
+            src: name of one end.
+            dst: name of the other end.
+        """
+        info('***link up event at t={time}: {args}\n'.format(time=time.time(), args=kwargs))
+        self.recovery.link(kwargs['src'], kwargs['dst'], 'up')
 
     def start(self):
         super(Emulation, self).start()
+        self.tailer.start()
+        if self.feeder is not None:
+            self.feeder.start()
         self.scheduler.run()
+        self.executor.join()
+        self.traffic.wait()
+        self.recovery.wait()
+        self.tailer.stop()
+        self.report_timings()
+        self.traffic.results.write_csv(RESULTS_FILE)
+        self.report_recovery()
+
+    def stop(self):
+        self.executor.shutdown()
+        self.traffic.stop()
+        self.recovery.stop()
+        super(Emulation, self).stop()
+
+    def report_timings(self, path=TIMINGS_FILE):
+        """
+        Log how late events started and write the per event timings
+        :param path: csv file, one row per event
+        """
+        info('***event lateness: {}\n'.format(self.executor.lateness()))
+        if self.executor.timings:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            self.executor.write_timings(path)
+
+    def report_recovery(self, path=RECOVERY_FILE):
+        """
+        Log the worst recovery time of the link-down events and write the
+        outage every probe saw
+        :param path: csv file, one row per link-down event and probe
+        """
+        if not self.recovery.probes:
+            return
+        outages = self.recovery.write_csv(path)
+        lost = [o for o in outages if o.lost is None or o.lost]
+        if lost:
+            times = [o.recovery for o in lost if o.recovery is not None]
+            info('***recovery: {} of {} probes lost requests, slowest {}s, '
+                 '{} never recovered\n'.format(len(lost), len(outages),
+                                              max(times) if times else None,
+                                              len(lost) - len(times)))
 
 
-def main(cpu=.08, remote=False):
+def main(cpu=.08, remote=False, workers=EVENT_WORKERS, topology=None):
     """
     Test link and CPU badwidth limits
     :param cpu: cpu limit as fraction of overall CPU time
-    :param remote: True to use remote controller"""
+    :param remote: True to use remote controller
+    :param workers: threads to run events on, 0 runs them inline
+    :param topology: TopologySpec or a topology JSON file for
+        min_env.topologies.from_file, CustomTopo if None"""
     intf = custom(TCIntf)
-    myTopo = CustomTopo()
     host = custom(CPULimitedHost, sched='cfs', cpu=cpu)
     contr = RemoteController if remote else OVSController
+    if topology is None:
+        myTopo = CustomTopo()
+        if remote:
+            export_link_properties()
+    else:
+        spec = from_file(topology) if isinstance(topology, str) else topology
+        myTopo = GeneratedTopo(spec)
+        if remote:
+            with open(LINKS_FILE, 'w') as f:
+                json.dump(link_entries(spec), f, indent=2)
+    # Configure all switches with one ovs-vsctl call instead of one each.
+    switch = custom(OVSSwitch, batch=True)
     net = Emulation(
-        topo=myTopo, intf=intf, host=host, controller=contr,
-        link=TCLink)
+        workers=workers, topo=myTopo, intf=intf, host=host, controller=contr,
+        link=TCLink, switch=switch)
     net.start()
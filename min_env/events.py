@@ -0,0 +1,153 @@
+import json
+from numbers import Number
+
+__all__ = ["read_events", "check_events", "event_handlers", "EventFeeder", "convert_events",
+           "EVENT_TYPES"]
+
+# Emulation methods an event file may name, nothing else of Mininet's.
+EVENT_TYPES = ('test_network', 'iperf', 'ping', 'link_down', 'link_up')
+
+# Seconds of events kept in the scheduler ahead of the clock.
+LOOKAHEAD = 30.0
+# Most events loaded into the scheduler by one feed.
+WINDOW = 10000
+# Priority of the feeder, lower than the events it feeds so it runs first.
+FEED_PRIORITY = 0
+
+
+def read_events(path, types=EVENT_TYPES):
+    """
+    Parse a JSON Lines event file one line at a time
+    :param path: file with one {"time", "type", "params"} object per line,
+        sorted by time; blank lines and lines starting with # are skipped
+    :param types: event types allowed, event_handlers of the target
+    :return: iterator of (line number, event dict)
+    """
+    last = float('-inf')
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                event = json.loads(line)
+                time = event['time']
+                event_type = event['type']
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError('{}:{}: bad event: {}'.format(path, number, e))
+            if not isinstance(time, Number) or not isinstance(event_type, str):
+                raise ValueError('{}:{}: time must be a number and type a string'.format(
+                    path, number))
+            if event_type not in types:
+                raise ValueError('{}:{}: unknown event type {}'.format(path, number, event_type))
+            if time < last:
+                raise ValueError('{}:{}: event at {} comes after {}, the file must be '
+                                 'sorted by time'.format(path, number, time, last))
+            last = time
+            event.setdefault('params', {})
+            yield number, event
+
+
+def check_events(path, types=EVENT_TYPES):
+    """
+    Read a JSON Lines event file through once, so a bad line fails before
+    the emulation starts rather than when the feeder reaches it
+    :param path: file for read_events
+    :param types: event types allowed, event_handlers of the target
+    :return: number of events in the file
+    """
+    count = 0
+    for _ in read_events(path, types):
+        count += 1
+    return count
+
+
+def event_handlers(target, types=EVENT_TYPES):
+    """
+    Resolve the methods of target events may name once, event types are
+    looked up here and any other type is unknown
+    :param target: object whose methods events name, Emulation
+    :param types: method names allowed as event types
+    :return: dict type -> bound method
+    """
+    return {name: getattr(target, name) for name in types if hasattr(target, name)}
+
+
+class EventFeeder(object):
+    """
+    Moves events from an iterator into a scheduler a window at a time.
+
+    Only events due within ``lookahead`` seconds, and at most ``window`` of
+    them, are in the scheduler at once. The feeder schedules itself again
+    by the time half of what it loaded has run, so memory stays bounded
+    however long the file is.
+    """
+
+    def __init__(self, scheduler, events, handlers, submit,
+                 lookahead=LOOKAHEAD, window=WINDOW):
+        """
+        :param scheduler: min_env.minished.scheduler
+        :param events: iterator of (line number, event dict) from read_events
+        :param handlers: dict type -> method from event_handlers
+        :param submit: called as submit(scheduled time, method, params) when due
+        """
+        self.scheduler = scheduler
+        self.events = iter(events)
+        self.handlers = handlers
+        self.submit = submit
+        self.lookahead = lookahead
+        self.window = window
+        self.origin = None
+        self.loaded = 0
+        self._next = None
+
+    def start(self, origin=None):
+        """
+        Load the first window, event times count from origin
+        :param origin: scheduler time of event time 0, now by default
+        """
+        self.origin = self.scheduler.timefunc() if origin is None else origin
+        self._advance()
+        self.feed()
+
+    def feed(self):
+        now = self.scheduler.timefunc() - self.origin
+        limit = now + self.lookahead
+        times = []
+        while self._next is not None and len(times) < self.window:
+            number, event = self._next
+            if event['time'] > limit:
+                break
+            handler = self.handlers.get(event['type'])
+            if handler is None:
+                raise ValueError('line {}: unknown event type {}'.format(number, event['type']))
+            scheduled = self.origin + event['time']
+            self.scheduler.enterabs(scheduled, 1, self.submit,
+                                    argument=(scheduled, handler, event['params']))
+            times.append(event['time'])
+            self._advance()
+        self.loaded += len(times)
+        if self._next is None:
+            return
+        if times:
+            refill = times[len(times) // 2]
+        else:
+            refill = self._next[1]['time'] - self.lookahead
+        self.scheduler.enterabs(self.origin + max(refill, now), FEED_PRIORITY, self.feed)
+
+    def _advance(self):
+        self._next = next(self.events, None)
+
+
+def convert_events(src, dst):
+    """
+    Rewrite a JSON list event file as time sorted JSON Lines
+    :param src: file with a JSON list of events
+    :param dst: JSON Lines file for read_events
+    """
+    with open(src) as f:
+        events = json.load(f)
+    events.sort(key=lambda event: event['time'])
+    with open(dst, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
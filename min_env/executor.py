@@ -0,0 +1,139 @@
+import csv
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+__all__ = ["EventExecutor", "event_hosts"]
+
+LOG = logging.getLogger(__name__)
+
+# Keyword arguments of Emulation events that name the nodes they touch.
+HOST_KEYS = ('src', 'dst', 'host', 'hosts')
+
+Timing = namedtuple('Timing', 'name, hosts, scheduled, started, finished, error')
+
+
+def event_hosts(kwargs):
+    """
+    Nodes an event runs commands on
+    :param kwargs: event params
+    :return: sorted tuple of node names
+    """
+    hosts = set()
+    for key in HOST_KEYS:
+        value = kwargs.get(key)
+        if isinstance(value, str):
+            hosts.add(value)
+        elif value:
+            hosts.update(value)
+    return tuple(sorted(hosts))
+
+
+class EventExecutor(object):
+    """
+    Runs scheduled actions and records how late each of them started.
+
+    With workers=0 actions run inline in the scheduler thread, as before.
+    Otherwise they are handed to a thread pool and the scheduler goes on to
+    the next event right away. Events touching the same node still run one
+    after another in schedule order: every event waits for the previous
+    event of each of its nodes, so sendCmd never overlaps on a node.
+    """
+
+    def __init__(self, workers=0, timefunc=time.time):
+        self.workers = workers
+        self.timefunc = timefunc
+        self.timings = []
+        self._lock = threading.Lock()
+        # node name -> future of the last event submitted for it
+        self._last = {}
+        self._futures = set()
+        self._pool = ThreadPoolExecutor(workers) if workers else None
+
+    def submit(self, scheduled, action, kwargs):
+        """
+        Run action(**kwargs), due at scheduled
+        :param scheduled: time the event was scheduled for, in timefunc's clock
+        :param action: bound Emulation method
+        :param kwargs: event params
+        """
+        hosts = event_hosts(kwargs)
+        if self._pool is None:
+            self._run(scheduled, action, kwargs, hosts, ())
+            return
+        after = [self._last[host] for host in hosts if host in self._last]
+        future = self._pool.submit(self._run, scheduled, action, kwargs, hosts, after)
+        for host in hosts:
+            self._last[host] = future
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def join(self):
+        """Wait for every submitted action to finish"""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            wait(futures)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def lateness(self):
+        """
+        Summary of start lateness over all events
+        :return: dict with count, errors and p50/p99/max lateness in seconds
+        """
+        with self._lock:
+            late = sorted(t.started - t.scheduled for t in self.timings)
+            errors = sum(1 for t in self.timings if t.error)
+        if not late:
+            return {'count': 0, 'errors': errors}
+        return {
+            'count': len(late),
+            'errors': errors,
+            'p50': late[len(late) // 2],
+            'p99': late[min(int(len(late) * .99), len(late) - 1)],
+            'max': late[-1],
+        }
+
+    def write_timings(self, path):
+        """
+        Write one csv row per event: name, hosts, scheduled, started,
+        finished, lateness and error
+        """
+        with self._lock:
+            timings = sorted(self.timings, key=lambda t: t.scheduled)
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(Timing._fields[:-1] + ('lateness', 'error'))
+            for t in timings:
+                writer.writerow([t.name, ' '.join(t.hosts), t.scheduled, t.started,
+                                 t.finished, t.started - t.scheduled, t.error or ''])
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run(self, scheduled, action, kwargs, hosts, after):
+        if after:
+            wait(after)
+        started = self.timefunc()
+        error = None
+        try:
+            action(**kwargs)
+        except Exception as e:
+            error = repr(e)
+            if self._pool is None:
+                raise
+            LOG.exception('event %s on %s failed', action.__name__, hosts)
+        finally:
+            timing = Timing(action.__name__, hosts, scheduled, started,
+                            self.timefunc(), error)
+            with self._lock:
+                self.timings.append(timing)
@@ -1,6 +1,7 @@
 import time
 import heapq
 from collections import namedtuple
+from itertools import count
 try:
     import threading
 except ImportError:
@@ -24,16 +25,43 @@ class Event(namedtuple('Event', 'time, priority, action, argument, kwargs')):
 
 _sentinel = object()
 
+# Index of the event in a heap entry (time, priority, sequence, event).
+_EVENT = 3
+# Rebuild the heap once cancelled entries outnumber live ones and there
+# are at least this many of them.
+_COMPACT_MIN = 1024
+# Weight of the newest sample in the sleep overshoot average.
+_OVERSHOOT_WEIGHT = 0.125
+
 
 class scheduler:
+    """Event scheduler with the interface of the standard sched module.
+
+    Cancelled events are only dropped from the index of pending events and
+    skipped when they reach the top of the heap, so cancel is O(1) and the
+    heap is compacted when it is mostly dead. run() takes every due event
+    in one go and learns how much the delay function oversleeps, waking up
+    that much earlier. Events with the same time and priority run in the
+    order they were entered.
+    """
 
     def __init__(self, timefunc=_time, delayfunc=time.sleep):
         """Initialize a new instance, passing the time and delay
         functions"""
         self._queue = []
+        # id(event) -> heap entry, for every event in the heap that is still to run
+        self._entries = {}
+        # id(event) -> entry of the batch run() took off the heap and did
+        # not run yet
+        self._running = {}
+        # Cancelled entries still in the heap.
+        self._cancelled = 0
+        self._sequence = count()
         self._lock = threading.RLock()
         self.timefunc = timefunc
         self.delayfunc = delayfunc
+        # Average of how much later than asked the delay function returned.
+        self.overshoot = 0.0
 
     def enterabs(self, time, priority, action, argument=(), kwargs=_sentinel):
         """Enter a new event in the queue at an absolute time.
@@ -44,7 +72,9 @@ class scheduler:
             kwargs = {}
         event = Event(time, priority, action, argument, kwargs)
         with self._lock:
-            heapq.heappush(self._queue, event)
+            entry = (time, priority, next(self._sequence), event)
+            self._entries[id(event)] = entry
+            heapq.heappush(self._queue, entry)
         return event  # The ID
 
     def enter(self, delay, priority, action, argument=(), kwargs=_sentinel):
@@ -60,59 +90,118 @@ class scheduler:
         If the event is not in the queue, this raises ValueError.
         """
         with self._lock:
-            self._queue.remove(event)
-            heapq.heapify(self._queue)
+            entry = self._entries.get(id(event))
+            if entry is None or entry[_EVENT] is not event:
+                entry = self._running.get(id(event))
+                if entry is None or entry[_EVENT] is not event:
+                    raise ValueError("event is not in the queue")
+                # Off the heap already, run() skips it.
+                del self._running[id(event)]
+                return
+            del self._entries[id(event)]
+            self._cancelled += 1
+            if self._cancelled >= _COMPACT_MIN and self._cancelled * 2 > len(self._queue):
+                self._compact()
 
     def empty(self):
         """Check whether the queue is empty."""
         with self._lock:
-            return not self._queue
+            return not self._entries and not self._running
+
+    def __len__(self):
+        return len(self._entries) + len(self._running)
 
     def run(self, blocking=True):
         """Execute events until the queue is empty.
         If blocking is False executes the scheduled events due to
         expire soonest (if any) and then return the deadline of the
         next scheduled call in the scheduler.
-        When there is a positive delay until the first event, the
-        delay function is called and the event is left in the queue;
-        otherwise, the event is removed from the queue and executed
-        (its action function is called, passing it the argument).  If
-        the delay function returns prematurely, it is simply
-        restarted.
+        All events due at the same moment are taken off the queue under
+        one lock and run in order, an event cancelled by an earlier
+        action of the batch is skipped. Events entered by an action run
+        in the next batch. When there is a positive delay until the first
+        event, the delay function is called with that delay less the
+        average overshoot, and the event is left in the queue.
         It is legal for both the delay function and the action
         function to modify the queue or to raise an exception;
-        exceptions are not caught but the scheduler's state remains
-        well-defined so run() may be called again.
-        A questionable hack is added to allow other threads to run:
-        just after an event is executed, a delay of 0 is executed, to
-        avoid monopolizing the CPU when other threads are also
-        runnable.
+        exceptions are not caught, the rest of the batch is put back
+        on the queue, so run() may be called again.
+        The delay function is called with 0 after every batch, not every
+        event, to let other threads run.
         """
         # localize variable access to minimize overhead
         # and to improve thread safety
         lock = self._lock
         q = self._queue
+        entries = self._entries
+        running = self._running
         delayfunc = self.delayfunc
         timefunc = self.timefunc
         pop = heapq.heappop
         while True:
+            batch = []
             with lock:
-                if not q:
-                    break
-                time, priority, action, argument, kwargs = q[0]
                 now = timefunc()
-                if time > now:
-                    delay = True
-                else:
-                    delay = False
-                    pop(q)
-            if delay:
-                if not blocking:
-                    return time - now
-                delayfunc(time - now)
-            else:
-                action(*argument, **kwargs)
+                while q and (q[0][0] <= now or entries.get(id(q[0][_EVENT])) is not q[0]):
+                    entry = pop(q)
+                    key = id(entry[_EVENT])
+                    if entries.get(key) is entry:
+                        del entries[key]
+                        running[key] = entry
+                        batch.append(entry)
+                    else:
+                        self._cancelled -= 1
+                if not batch:
+                    if not q:
+                        break
+                    time = q[0][0]
+            if batch:
+                self._dispatch(batch)
                 delayfunc(0)   # Let other threads run
+                continue
+            delay = time - now
+            if not blocking:
+                return delay
+            self._sleep(delay)
+
+    def _dispatch(self, batch):
+        running = self._running
+        for i, entry in enumerate(batch):
+            event = entry[_EVENT]
+            if running.pop(id(event), None) is not entry:
+                # Cancelled by an earlier action of this batch.
+                continue
+            try:
+                event.action(*event.argument, **event.kwargs)
+            except BaseException:
+                self._requeue(batch[i + 1:])
+                raise
+
+    def _requeue(self, batch):
+        with self._lock:
+            for entry in batch:
+                key = id(entry[_EVENT])
+                if self._running.get(key) is entry:
+                    del self._running[key]
+                    self._entries[key] = entry
+                    heapq.heappush(self._queue, entry)
+
+    def _sleep(self, delay):
+        """Sleep until delay seconds from now, waking up early by the
+        overshoot seen so far"""
+        asked = max(delay - self.overshoot, 0)
+        start = self.timefunc()
+        self.delayfunc(asked)
+        late = self.timefunc() - start - asked
+        self.overshoot = max(self.overshoot + _OVERSHOOT_WEIGHT * (late - self.overshoot), 0.0)
+
+    def _compact(self):
+        entries = self._entries
+        self._queue[:] = [entry for entry in self._queue
+                          if entries.get(id(entry[_EVENT])) is entry]
+        heapq.heapify(self._queue)
+        # Recounted from the index, the heap holds only live entries now.
+        self._cancelled = len(self._queue) - len(entries)
 
     @property
     def queue(self):
@@ -120,9 +209,6 @@ class scheduler:
         Events are named tuples with fields for:
             time, priority, action, arguments, kwargs
         """
-        # Use heapq to sort the queue rather than using 'sorted(self._queue)'.
-        # With heapq, two events scheduled at the same time will show in
-        # the actual order they would be retrieved.
         with self._lock:
-            events = self._queue[:]
-        return list(map(heapq.heappop, [events]*len(events)))
+            entries = sorted([*self._entries.values(), *self._running.values()])
+        return [entry[_EVENT] for entry in entries]
@@ -0,0 +1,140 @@
+import csv
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+__all__ = ["Recovery", "parse_ping", "outage"]
+
+OUTPUT_DIR = 'output'
+# -D stamps every reply with the time it arrived, so gaps can be lined up
+# with the link events. Intervals below 0.2 s need root, as Mininet has.
+PING_CMD = 'ping -D -n -i {interval} -w {duration} {dst_ip}'
+PING_INTERVAL = 0.01
+REPLY = re.compile(r'^\[(?P<time>\d+\.\d+)\].*icmp_seq=(?P<seq>\d+)')
+
+Reply = namedtuple('Reply', 'time, seq')
+LinkEvent = namedtuple('LinkEvent', 'time, src, dst, status')
+# recovery is seconds from the event to the first reply after the gap, 0.0
+# when no request was lost and None when the probe never got a reply again.
+Outage = namedtuple('Outage', 'src, dst, down_at, link, lost, recovery')
+
+
+def parse_ping(lines):
+    """
+    Parse ping -D output
+    :param lines: iterable of text lines
+    :return: list of Reply, lines that are not replies are skipped
+    """
+    replies = []
+    for line in lines:
+        match = REPLY.match(line)
+        if match:
+            replies.append(Reply(float(match.group('time')), int(match.group('seq'))))
+    return replies
+
+
+def outage(replies, at):
+    """
+    Requests lost around at and how long until replies came back
+    :param replies: Reply list of one probe in arrival order
+    :param at: time of the link event
+    :return: (lost, recovery) as in Outage, None if the probe had no reply
+        before at
+    """
+    before = [r for r in replies if r.time <= at]
+    if not before:
+        return None
+    last = before[-1]
+    after = [r for r in replies[len(before):] if r.seq > last.seq]
+    if not after:
+        return None, None
+    first = after[0]
+    lost = first.seq - last.seq - 1
+    return lost, first.time - at if lost else 0.0
+
+
+class Recovery(object):
+    """
+    Ping probes between hosts and the link events they are measured against.
+
+    Every probe writes its ping -D output into a file under output_dir. Links
+    are taken down and up with configLinkStatus and the time of each change
+    is kept, so after the run every link-down event can be lined up with the
+    gap it caused in each probe.
+    """
+
+    def __init__(self, net, output_dir=OUTPUT_DIR, interval=PING_INTERVAL):
+        self.net = net
+        self.output_dir = output_dir
+        self.interval = interval
+        self.events = []
+        # (src, dst) -> (ping process, output file path)
+        self.probes = {}
+        self._lock = threading.Lock()
+
+    def probe(self, src, dst, duration=60, interval=None):
+        """
+        Start pinging dst from src for duration seconds
+        :return: path of the output file
+        """
+        cmd = PING_CMD.format(interval=interval or self.interval, duration=int(duration),
+                              dst_ip=self.net.get(dst).IP())
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        path = os.path.join(self.output_dir, 'ping-{}-{}.txt'.format(src, dst))
+        with open(path, 'w') as output:
+            proc = self.net.get(src).popen(cmd, stdout=output, shell=True)
+        with self._lock:
+            self.probes[(src, dst)] = (proc, path)
+        return path
+
+    def link(self, src, dst, status):
+        """
+        Set the link between src and dst 'up' or 'down' and note when
+        """
+        self.net.configLinkStatus(src, dst, status)
+        with self._lock:
+            self.events.append(LinkEvent(time.time(), src, dst, status))
+
+    def wait(self):
+        with self._lock:
+            procs = [proc for proc, _ in self.probes.values()]
+        for proc in procs:
+            proc.wait()
+
+    def stop(self):
+        with self._lock:
+            procs = [proc for proc, _ in self.probes.values()]
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    def outages(self):
+        """
+        :return: list of Outage, one per link-down event and probe that was
+            running when it happened
+        """
+        with self._lock:
+            probes = sorted((key, path) for key, (_, path) in self.probes.items())
+            downs = [e for e in self.events if e.status == 'down']
+        result = []
+        for (src, dst), path in probes:
+            with open(path) as f:
+                replies = parse_ping(f)
+            for event in downs:
+                found = outage(replies, event.time)
+                if found is not None:
+                    link = '{}-{}'.format(event.src, event.dst)
+                    result.append(Outage(src, dst, event.time, link, *found))
+        return result
+
+    def write_csv(self, path):
+        outages = self.outages()
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(Outage._fields)
+            writer.writerows(outages)
+        return outages
@@ -0,0 +1,316 @@
+import glob
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from .traffic import parse_csv
+
+__all__ = ["ResultStore", "Tailer", "file_meta"]
+
+# Rows collected before they are turned into a chunk of arrays.
+BATCH = 4096
+# Reports spanning more than this many report intervals are whole-run summaries.
+SUMMARY_SPAN = 1.5
+INTERVAL = 1.0
+TAIL_INTERVAL = 1.0
+
+COLUMNS = (
+    ('run', np.int32), ('src', np.int32), ('dst', np.int32), ('protocol', np.int32),
+    ('time', np.float64), ('start', np.float32), ('end', np.float32),
+    ('bytes', np.int64), ('bps', np.float64), ('jitter', np.float32),
+    ('lost', np.int64), ('total', np.int64), ('loss', np.float32),
+)
+
+# iperf-{protocol}-{client|server}-{src}[-{dst}[-{run}]].txt
+FILE_NAME = re.compile(r'iperf-(?P<protocol>[a-zA-Z]+)-(?P<role>client|server)-'
+                       r'(?P<src>[^-]+)(?:-(?P<dst>[^-]+))?(?:-(?P<run>\d+))?\.txt$')
+
+
+def file_meta(path):
+    """
+    Protocol, role, src, dst and run id from an iperf output file name
+    :return: dict, None if the name does not look like iperf output
+    """
+    match = FILE_NAME.search(os.path.basename(path))
+    if match is None:
+        return None
+    meta = match.groupdict()
+    meta['protocol'] = meta['protocol'].lower()
+    if meta['role'] == 'server' and meta['dst'] is None:
+        # One server for all clients, the file is named after the server host.
+        meta['src'], meta['dst'] = None, meta['src']
+    meta['run'] = int(meta['run']) if meta['run'] else None
+    return meta
+
+
+def parse_time(stamp):
+    """iperf's YYYYMMDDHHMMSS[.mmm] timestamp as a number, sortable but not epoch seconds"""
+    try:
+        return float(stamp)
+    except ValueError:
+        return np.nan
+
+
+class ResultStore(object):
+    """
+    Columnar store of iperf reports.
+
+    Rows are appended in batches of ``batch`` into chunks of NumPy arrays,
+    one array per column, with src, dst and protocol stored as codes into
+    ``names``.
+    Chunks are written to ``directory`` as .npz when one is given, chunks
+    an earlier run left there are removed unless ``keep`` is set. Queries
+    run on one merged copy sorted by (protocol, src, dst, run, time). It is
+    rebuilt only after new chunks arrived, so a pair's rows are one
+    contiguous slice found by binary search.
+    """
+
+    def __init__(self, directory=None, batch=BATCH, interval=INTERVAL, keep=False):
+        self.directory = directory
+        self.batch = batch
+        self.interval = interval
+        self.names = []
+        self._codes = {}
+        self._rows = []
+        self._chunks = []
+        self._index = None
+        self._lock = threading.RLock()
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        elif directory and not keep:
+            # Numbering starts over, load would mix them into this run.
+            for path in glob.glob(os.path.join(directory, 'chunk-*.npz')):
+                os.remove(path)
+            if os.path.exists(os.path.join(directory, 'names.json')):
+                os.remove(os.path.join(directory, 'names.json'))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(chunk['run']) for chunk in self._chunks) + len(self._rows)
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def extend(self, samples):
+        """Append iperf samples (min_env.traffic.Sample)"""
+        code = self.code
+        with self._lock:
+            for s in samples:
+                self._rows.append((
+                    s.run, code(s.src if s.src is not None else s.local_ip),
+                    code(s.dst if s.dst is not None else s.remote_ip), code(s.protocol),
+                    parse_time(s.time), s.start, s.end, s.bytes, s.bps,
+                    np.nan if s.jitter is None else s.jitter,
+                    -1 if s.lost is None else s.lost, -1 if s.total is None else s.total,
+                    np.nan if s.loss is None else s.loss))
+            if len(self._rows) >= self.batch:
+                self.flush()
+
+    def flush(self):
+        """Turn buffered rows into a chunk"""
+        with self._lock:
+            if not self._rows:
+                return
+            rows = list(zip(*self._rows))
+            self._rows = []
+            chunk = {name: np.array(values, dtype=dtype)
+                     for (name, dtype), values in zip(COLUMNS, rows)}
+            self._chunks.append(chunk)
+            self._index = None
+            if self.directory:
+                self._save(chunk, len(self._chunks) - 1)
+
+    def columns(self):
+        """
+        All rows as column arrays sorted by (protocol, src, dst, run, time)
+        :return: dict column -> array
+        """
+        with self._lock:
+            self.flush()
+            if self._index is None:
+                self._index = self._merge()
+            return self._index
+
+    def select(self, src=None, dst=None, protocol=None, run=None, kind='all'):
+        """
+        Rows of one pair, protocol or run
+        :param kind: 'interval' for interval reports, 'summary' for whole-run
+            reports, 'all' for both
+        :return: dict column -> array
+        """
+        cols = self.columns()
+        lo, hi = 0, len(cols['run'])
+        # Narrow down along the sort order while the leading keys are given.
+        for key, value in (('protocol', protocol), ('src', src), ('dst', dst), ('run', run)):
+            if value is None:
+                break
+            if key != 'run':
+                value = self._codes.get(value, -1)
+            lo, hi = self._range(cols[key], lo, hi, value)
+        mask = np.ones(hi - lo, dtype=bool)
+        for key, value in (('protocol', protocol), ('src', src), ('dst', dst), ('run', run)):
+            if value is not None:
+                if key != 'run':
+                    value = self._codes.get(value, -1)
+                mask &= cols[key][lo:hi] == value
+        mask &= self._kind(cols, lo, hi, kind)
+        return {name: column[lo:hi][mask] for name, column in cols.items()}
+
+    def aggregate(self, func, field='bps', kind='interval', protocol=None):
+        """
+        func applied to the values of field of every (src, dst, protocol)
+        :param func: called with one array per group
+        :return: dict (src, dst, protocol) -> func result
+        """
+        cols = self.columns()
+        mask = self._kind(cols, 0, len(cols['run']), kind)
+        if protocol is not None:
+            mask &= cols['protocol'] == self._codes.get(protocol, -1)
+        keys = np.stack([cols['protocol'][mask], cols['src'][mask], cols['dst'][mask]])
+        values = cols[field][mask]
+        if not len(values):
+            return {}
+        # Rows are sorted by protocol, src, dst already, groups are runs of equal keys.
+        starts = np.flatnonzero(np.r_[True, np.any(keys[:, 1:] != keys[:, :-1], axis=0)])
+        ends = np.r_[starts[1:], len(values)]
+        names = self.names
+        return {(names[keys[1, a]], names[keys[2, a]], names[keys[0, a]]): func(values[a:b])
+                for a, b in zip(starts, ends)}
+
+    def percentiles(self, field='bps', q=(50, 90, 99), kind='interval', protocol=None):
+        """
+        Percentiles of field per (src, dst, protocol)
+        :return: dict (src, dst, protocol) -> array of len(q) percentiles
+        """
+        return self.aggregate(lambda values: np.percentile(values, q), field, kind, protocol)
+
+    def throughput(self, protocol=None):
+        """
+        Mean bits per second of the whole-run reports per (src, dst, protocol)
+        """
+        return self.aggregate(lambda values: float(values.mean()), 'bps', 'summary', protocol)
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """Open a store written by an earlier run"""
+        store = cls(directory, keep=True, **kwargs)
+        with open(os.path.join(directory, 'names.json')) as f:
+            for name in json.load(f):
+                store.code(name)
+        for path in sorted(glob.glob(os.path.join(directory, 'chunk-*.npz'))):
+            with np.load(path) as data:
+                store._chunks.append({name: data[name] for name, _ in COLUMNS})
+        return store
+
+    def _save(self, chunk, number):
+        np.savez(os.path.join(self.directory, 'chunk-{:06d}.npz'.format(number)), **chunk)
+        path = os.path.join(self.directory, 'names.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.names, f)
+        os.replace(path + '.tmp', path)
+
+    def _merge(self):
+        if not self._chunks:
+            return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+        cols = {name: np.concatenate([chunk[name] for chunk in self._chunks])
+                for name, _ in COLUMNS}
+        order = np.lexsort((cols['time'], cols['run'], cols['dst'], cols['src'],
+                            cols['protocol']))
+        return {name: column[order] for name, column in cols.items()}
+
+    def _kind(self, cols, lo, hi, kind):
+        if kind == 'all':
+            return np.ones(hi - lo, dtype=bool)
+        span = cols['end'][lo:hi] - cols['start'][lo:hi]
+        summary = (cols['start'][lo:hi] == 0) & (span > self.interval * SUMMARY_SPAN)
+        return summary if kind == 'summary' else ~summary
+
+    @staticmethod
+    def _range(column, lo, hi, value):
+        part = column[lo:hi]
+        return (lo + int(np.searchsorted(part, value, 'left')),
+                lo + int(np.searchsorted(part, value, 'right')))
+
+
+class Tailer(object):
+    """
+    Follows iperf output files in a directory and feeds new reports to a
+    ResultStore. Each file is read from where the last pass stopped, and a
+    trailing partial line waits for the next pass.
+    """
+
+    def __init__(self, directory, store, pattern='iperf-*.txt', interval=TAIL_INTERVAL):
+        self.directory = directory
+        self.store = store
+        self.pattern = pattern
+        self.interval = interval
+        # path -> (offset read up to, partial last line, meta)
+        self.files = {}
+        self._runs = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Read what was appended to every file since the last poll
+        :return: number of reports ingested
+        """
+        ingested = 0
+        for path in glob.glob(os.path.join(self.directory, self.pattern)):
+            state = self.files.get(path)
+            if state is None:
+                meta = file_meta(path)
+                if meta is None:
+                    continue
+                if meta['run'] is None:
+                    self._runs -= 1
+                    # Old style names carry no run id, number them below zero.
+                    meta['run'] = self._runs
+                state = (0, b'', meta)
+            offset, partial, meta = state
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size < offset:
+                # Rewritten from the start.
+                offset, partial = 0, b''
+            if size == offset:
+                self.files[path] = (offset, partial, meta)
+                continue
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = partial + f.read(size - offset)
+            lines = data.split(b'\n')
+            partial = lines.pop()
+            self.files[path] = (size, partial, meta)
+            samples = parse_csv((line.decode(errors='replace') for line in lines),
+                                meta['run'], meta['src'], meta['dst'], meta['protocol'])
+            self.store.extend(samples)
+            ingested += len(samples)
+        return ingested
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='results-tailer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop following, ingest what is left and flush the store"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.poll()
+        self.store.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from min_env.events import (EventFeeder, check_events, convert_events, event_handlers,
+                            read_events)
+from min_env.minished import scheduler
+
+
+def write(tmp_path, *lines):
+    path = tmp_path / 'events.jsonl'
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_reads_events_with_line_numbers(tmp_path):
+    path = write(tmp_path,
+                 '# header',
+                 '{"time": 0, "type": "ping"}',
+                 '',
+                 '{"time": 1.5, "type": "iperf", "params": {"bw": 10}}',
+                 '{"time": 1.5, "type": "link_down", "params": {}}')
+    assert list(read_events(path)) == [
+        (2, {'time': 0, 'type': 'ping', 'params': {}}),
+        (4, {'time': 1.5, 'type': 'iperf', 'params': {'bw': 10}}),
+        (5, {'time': 1.5, 'type': 'link_down', 'params': {}}),
+    ]
+
+
+@pytest.mark.parametrize('line', [
+    '{"time": 0, "type": "ping"',
+    '{"type": "ping"}',
+    '{"time": 0}',
+    '[0, "ping"]',
+    '"ping"',
+    '{"time": "0", "type": "ping"}',
+    '{"time": null, "type": "ping"}',
+    '{"time": 0, "type": 1}',
+])
+def test_rejects_bad_event(tmp_path, line):
+    path = write(tmp_path, '{"time": 0, "type": "ping"}', line)
+    events = read_events(path)
+    assert next(events)[0] == 1
+    with pytest.raises(ValueError, match=':2:'):
+        next(events)
+
+
+def test_rejects_unsorted_file(tmp_path):
+    path = write(tmp_path,
+                 '{"time": 2, "type": "ping"}',
+                 '{"time": 1, "type": "ping"}')
+    with pytest.raises(ValueError, match='sorted by time'):
+        list(read_events(path))
+
+
+def test_rejects_unknown_type(tmp_path):
+    path = write(tmp_path,
+                 '{"time": 0, "type": "ping"}',
+                 '{"time": 1, "type": "bunch_iperf"}')
+    events = read_events(path)
+    assert next(events)[0] == 1
+    with pytest.raises(ValueError, match=':2: unknown event type bunch_iperf'):
+        next(events)
+    assert [number for number, _ in read_events(path, types=('ping', 'bunch_iperf'))] == [1, 2]
+
+
+def test_check_reads_whole_file(tmp_path):
+    lines = ['{"time": %d, "type": "ping"}' % i for i in range(100)]
+    assert check_events(write(tmp_path, *lines)) == 100
+    # A bad line at the end fails the check, nothing has run yet.
+    path = write(tmp_path, *lines + ['{"time": 100, "type": "stop"}'])
+    with pytest.raises(ValueError, match=':101: unknown event type stop'):
+        check_events(path, event_handlers(Target()))
+
+
+def test_convert_sorts_events(tmp_path):
+    src = tmp_path / 'events.json'
+    src.write_text(json.dumps([{'time': 3, 'type': 'ping'}, {'time': 1, 'type': 'iperf'}]))
+    dst = str(tmp_path / 'events.jsonl')
+    convert_events(str(src), dst)
+    assert [event['time'] for _, event in read_events(dst)] == [1, 3]
+
+
+class Target(object):
+
+    def ping(self, **kwargs):
+        pass
+
+    def link_up(self, **kwargs):
+        pass
+
+    def stop(self):
+        pass
+
+
+def test_handlers_are_allowlisted():
+    target = Target()
+    handlers = event_handlers(target)
+    assert handlers == {'ping': target.ping, 'link_up': target.link_up}
+    assert 'stop' not in handlers
+
+
+def test_feeder_rejects_unknown_type(tmp_path):
+    path = write(tmp_path, '{"time": 0, "type": "stop"}')
+    s = scheduler(lambda: 0.0, lambda delay: None)
+    # Allowed in the file, not a method of the target.
+    feeder = EventFeeder(s, read_events(path, types=('stop',)), event_handlers(Target()), None)
+    with pytest.raises(ValueError, match='unknown event type stop'):
+        feeder.start()
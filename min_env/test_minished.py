@@ -0,0 +1,159 @@
+import random
+import sched
+
+import pytest
+
+from min_env import minished
+from min_env.minished import scheduler
+
+
+class Clock(object):
+    """Virtual time, sleeping moves it forward"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+def make():
+    clock = Clock()
+    return scheduler(clock.time, clock.sleep), clock
+
+
+def test_order_matches_sched():
+    rnd = random.Random(1)
+    events = [(rnd.randint(0, 20), rnd.randint(0, 3), i) for i in range(500)]
+    ran = {}
+    for name, module in (('minished', minished), ('sched', sched)):
+        clock = Clock()
+        s = module.scheduler(clock.time, clock.sleep)
+        ran[name] = []
+        for time, priority, i in events:
+            s.enterabs(time, priority, ran[name].append, (i,))
+        s.run()
+    assert ran['minished'] == ran['sched']
+    # Same time and priority run in the order they were entered.
+    assert ran['minished'] == [i for _, _, i in sorted(events)]
+
+
+def test_runs_at_event_time():
+    s, clock = make()
+    seen = []
+    s.enter(5, 1, lambda: seen.append(clock.now))
+    s.enter(2, 1, lambda: seen.append(clock.now))
+    assert s.run(blocking=False) == 2
+    assert seen == []
+    s.run()
+    assert seen == [2, 5]
+    assert s.empty() and len(s) == 0
+
+
+def test_events_entered_by_actions_run_later():
+    s, clock = make()
+    ran = []
+
+    def first():
+        ran.append('first')
+        s.enterabs(0, 0, ran.append, ('entered',))
+
+    s.enterabs(0, 1, first)
+    s.enterabs(0, 1, ran.append, ('second',))
+    s.run()
+    assert ran == ['first', 'second', 'entered']
+
+
+def test_cancel():
+    s, clock = make()
+    ran = []
+    events = [s.enterabs(i, 1, ran.append, (i,)) for i in range(10)]
+    for event in events[::2]:
+        s.cancel(event)
+    with pytest.raises(ValueError):
+        s.cancel(events[0])
+    assert len(s) == 5
+    assert s.queue == events[1::2]
+    s.run()
+    assert ran == [1, 3, 5, 7, 9]
+    with pytest.raises(ValueError):
+        s.cancel(events[1])
+
+
+def test_cancel_equal_event():
+    s, clock = make()
+    ran = []
+    kept = s.enterabs(1, 1, ran.append, ('kept',))
+    other = s.enterabs(1, 1, ran.append, ('other',))
+    # Events compare by time and priority, cancel must find this very one.
+    s.cancel(other)
+    assert s.queue == [kept]
+    assert s.queue[0] is kept
+    s.run()
+    assert ran == ['kept']
+
+
+def test_cancel_during_batch():
+    s, clock = make()
+    ran = []
+    later = []
+    s.enterabs(1, 1, lambda: s.cancel(later[0]))
+    later.append(s.enterabs(1, 2, ran.append, ('cancelled',)))
+    s.enterabs(1, 3, ran.append, ('kept',))
+    s.run()
+    assert ran == ['kept']
+    assert s.empty()
+    assert s._cancelled == 0
+
+
+def test_compaction_keeps_count():
+    s, clock = make()
+    ran = []
+    count = 3 * minished._COMPACT_MIN
+    events = [s.enterabs(i, 1, ran.append, (i,)) for i in range(count)]
+    for event in events[:-10]:
+        s.cancel(event)
+    assert len(s._queue) < count
+    assert s._cancelled >= 0
+    assert len(s) == 10
+    s.run()
+    assert ran == list(range(count - 10, count))
+    assert s._cancelled == 0 and not s._queue
+
+
+def test_compaction_during_batch():
+    s, clock = make()
+    ran = []
+    pending = [s.enterabs(2, 1, ran.append, (i,)) for i in range(2 * minished._COMPACT_MIN)]
+
+    def cancel_all():
+        for event in pending:
+            s.cancel(event)
+
+    s.enterabs(1, 1, cancel_all)
+    s.enterabs(1, 2, ran.append, ('same batch',))
+    s.enterabs(3, 1, ran.append, ('last',))
+    s.run()
+    assert ran == ['same batch', 'last']
+    assert s._cancelled == 0 and s.empty()
+
+
+def test_exception_requeues_rest_of_batch():
+    s, clock = make()
+    ran = []
+
+    def fail():
+        raise RuntimeError('boom')
+
+    s.enterabs(1, 1, ran.append, ('before',))
+    s.enterabs(1, 2, fail)
+    s.enterabs(1, 3, ran.append, ('after',))
+    with pytest.raises(RuntimeError):
+        s.run()
+    assert ran == ['before']
+    assert len(s) == 1
+    s.run()
+    assert ran == ['before', 'after']
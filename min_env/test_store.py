@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+
+from min_env.store import ResultStore, Tailer, file_meta
+from min_env.traffic import parse_csv
+
+
+def tcp_line(second, start, end, bytes_):
+    """iperf -y C client report, 9 fields"""
+    return '2026010112{:04d},10.0.0.1,40000,10.0.0.2,5001,3,{:.1f}-{:.1f},{},{}'.format(
+        second, start, end, bytes_, bytes_ * 8 // max(int(end - start), 1))
+
+
+def udp_line(second, start, end, bytes_, lost, total):
+    """iperf -y C UDP client line with the server report, 14 fields"""
+    return ('2026010112{:04d},10.0.0.1,40000,10.0.0.2,5001,3,{:.1f}-{:.1f},{},{},'
+            '0.015,{},{},{:.3f},0').format(second, start, end, bytes_, bytes_ * 8,
+                                            lost, total, 100.0 * lost / total)
+
+
+def write(directory, name, *lines):
+    with open(os.path.join(directory, name), 'a') as f:
+        f.write(''.join(line + '\n' for line in lines))
+
+
+def samples(count, run=1):
+    return parse_csv([tcp_line(i, i, i + 1, 1000 + i) for i in range(count)],
+                     run, 'h1', 'h2', 'tcp')
+
+
+def test_chunks_flushed_per_batch(tmp_path):
+    directory = str(tmp_path / 'store')
+    store = ResultStore(directory, batch=4)
+    for i in range(10):
+        store.extend(samples(1, run=i))
+    assert len(store) == 10
+    assert sorted(os.listdir(directory)) == ['chunk-000000.npz', 'chunk-000001.npz',
+                                             'names.json']
+    store.flush()
+    assert len(store._chunks) == 3 and len(store) == 10
+    assert len(ResultStore.load(directory)) == 10
+
+
+def test_columns_sorted_after_reopen(tmp_path):
+    output = str(tmp_path / 'output')
+    os.makedirs(output)
+    write(output, 'iperf-udp-client-h2-h1-2.txt', udp_line(1, 0, 1, 125000, 3, 85))
+    write(output, 'iperf-tcp-client-h2-h1-4.txt', tcp_line(2, 1, 2, 2000), tcp_line(1, 0, 1, 1000))
+    write(output, 'iperf-tcp-client-h1-h2-3.txt', tcp_line(1, 0, 1, 3000))
+    write(output, 'iperf-tcp-client-h1-h2-1.txt', tcp_line(2, 1, 2, 4000), tcp_line(1, 0, 1, 5000),
+          tcp_line(3, 0, 2, 9000))
+    directory = str(tmp_path / 'store')
+    store = ResultStore(directory, batch=2)
+    tailer = Tailer(output, store)
+    assert tailer.poll() == 7
+    tailer.stop()
+
+    cols = ResultStore.load(directory).columns()
+    keys = list(zip(cols['protocol'], cols['src'], cols['dst'], cols['run'], cols['time']))
+    # Names are sorted by their codes, in the order they were first seen.
+    assert keys == sorted(keys)
+    names = store.names
+    rows = [(names[protocol], names[src], names[dst], run, time)
+            for protocol, src, dst, run, time in keys]
+    assert sorted(rows) == [
+        ('tcp', 'h1', 'h2', 1, 20260101120001.0),
+        ('tcp', 'h1', 'h2', 1, 20260101120002.0),
+        ('tcp', 'h1', 'h2', 1, 20260101120003.0),
+        ('tcp', 'h1', 'h2', 3, 20260101120001.0),
+        ('tcp', 'h2', 'h1', 4, 20260101120001.0),
+        ('tcp', 'h2', 'h1', 4, 20260101120002.0),
+        ('udp', 'h2', 'h1', 2, 20260101120001.0),
+    ]
+    first = rows.index(('tcp', 'h1', 'h2', 1, 20260101120001.0))
+    assert list(cols['bytes'][first:first + 4]) == [5000, 4000, 9000, 3000]
+    udp = ResultStore.load(directory).select(protocol='udp')
+    assert list(udp['lost']) == [3] and list(udp['total']) == [85]
+    # Reports of TCP have no UDP fields.
+    assert np.isnan(cols['jitter'][first]) and cols['lost'][first] == -1
+
+
+def test_tailer_waits_for_whole_lines(tmp_path):
+    store = ResultStore()
+    tailer = Tailer(str(tmp_path), store)
+    name = 'iperf-tcp-client-h1-h2-1.txt'
+    line = tcp_line(1, 0, 1, 1000)
+    with open(str(tmp_path / name), 'w') as f:
+        f.write(line[:20])
+    assert tailer.poll() == 0
+    with open(str(tmp_path / name), 'a') as f:
+        f.write(line[20:] + '\n' + tcp_line(2, 1, 2, 2000)[:30])
+    assert tailer.poll() == 1
+    assert tailer.poll() == 0
+    with open(str(tmp_path / name), 'a') as f:
+        f.write(tcp_line(2, 1, 2, 2000)[30:] + '\n')
+    assert tailer.poll() == 1
+    assert list(store.columns()['bytes']) == [1000, 2000]
+
+
+def test_old_chunks_removed_unless_kept(tmp_path):
+    directory = str(tmp_path / 'store')
+    store = ResultStore(directory, batch=1)
+    for sample in samples(3):
+        store.extend([sample])
+    assert len(os.listdir(directory)) == 4
+    assert len(ResultStore(directory, keep=True)._chunks) == 0
+    assert len(ResultStore.load(directory)) == 3
+    ResultStore(directory)
+    assert os.listdir(directory) == []
+
+
+def test_file_meta():
+    assert file_meta('out/iperf-UDP-client-h1-h2-7.txt') == {
+        'protocol': 'udp', 'role': 'client', 'src': 'h1', 'dst': 'h2', 'run': 7}
+    assert file_meta('iperf-tcp-server-h3.txt') == {
+        'protocol': 'tcp', 'role': 'server', 'src': None, 'dst': 'h3', 'run': None}
+    assert file_meta('notes.txt') is None
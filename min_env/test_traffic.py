@@ -0,0 +1,114 @@
+import csv
+
+import pytest
+
+from min_env.traffic import Results, Run, Sample, mesh_rounds, parse_csv
+
+# iperf 2 -y C client output, as Traffic saves it.
+TCP_OUTPUT = '''\
+20260101120001,10.0.0.1,49574,10.0.0.2,5001,3,0.0-1.0,1179648,9437184
+20260101120002,10.0.0.1,49574,10.0.0.2,5001,3,1.0-2.0,1310720,10485760
+20260101120002,10.0.0.1,49574,10.0.0.2,5001,3,0.0-2.0,2490368,9961472
+'''
+UDP_OUTPUT = '''\
+20260101120001,10.0.0.1,41322,10.0.0.2,5001,3,0.0-1.0,131040,1048320
+20260101120002,10.0.0.1,41322,10.0.0.2,5001,3,0.0-2.0,262080,1048320
+WARNING: did not receive ack of last datagram after 10 tries.
+20260101120002,10.0.0.2,5001,10.0.0.1,41322,3,0.0-2.0,259140,1036560,0.017,2,178,1.124,1
+'''
+
+
+def test_parse_tcp_reports():
+    samples = parse_csv(TCP_OUTPUT.splitlines(), 4, 'h1', 'h2', 'tcp')
+    assert [(s.start, s.end, s.bytes, s.bps) for s in samples] == [
+        (0.0, 1.0, 1179648, 9437184.0), (1.0, 2.0, 1310720, 10485760.0),
+        (0.0, 2.0, 2490368, 9961472.0)]
+    first = samples[0]
+    assert first == Sample(4, 'h1', 'h2', 'tcp', '20260101120001', '10.0.0.1', '10.0.0.2',
+                           0.0, 1.0, 1179648, 9437184.0, None, None, None, None, None)
+
+
+def test_parse_udp_server_report():
+    samples = parse_csv(UDP_OUTPUT.splitlines(), 2, 'h1', 'h2', 'udp')
+    # Two 9 field client reports, the warning is skipped.
+    assert len(samples) == 3
+    assert all(s.jitter is None for s in samples[:2])
+    report = samples[2]
+    assert (report.local_ip, report.remote_ip) == ('10.0.0.2', '10.0.0.1')
+    assert (report.jitter, report.lost, report.total, report.loss, report.out_of_order) == (
+        0.017, 2, 178, 1.124, 1)
+
+
+@pytest.mark.parametrize('line', [
+    '------------------------------------------------------------',
+    'Client connecting to 10.0.0.2, TCP port 5001',
+    '20260101120001,10.0.0.1,49574,10.0.0.2,5001,3,0.0-1.0,1179648',
+    '20260101120001,10.0.0.1,49574,10.0.0.2,5001,3,0.0-1.0,1179648,9437184,0',
+    '20260101120001,10.0.0.1,49574,10.0.0.2,5001,3,sum,1179648,9437184',
+    '20260101120001,10.0.0.1,49574,10.0.0.2,5001,3,0.0-1.0,1e6,9437184',
+    '20260101120002,10.0.0.2,5001,10.0.0.1,41322,3,0.0-2.0,259140,1036560,0.017,x,178,1.124,1',
+    '',
+])
+def test_skips_lines_that_are_not_reports(line):
+    assert parse_csv([line]) == []
+
+
+def results():
+    results = Results()
+    results.add(Run(1, 'h1', 'h2', 'tcp', 0.0, 2.5, 0, 'a.txt'),
+                parse_csv(TCP_OUTPUT.splitlines(), 1, 'h1', 'h2', 'tcp'))
+    results.add(Run(2, 'h1', 'h2', 'udp', 0.0, 2.5, 0, 'b.txt'),
+                parse_csv(UDP_OUTPUT.splitlines(), 2, 'h1', 'h2', 'udp'))
+    results.add(Run(3, 'h1', 'h2', 'tcp', 0.0, 2.5, 0, 'c.txt'),
+                parse_csv([TCP_OUTPUT.splitlines()[2].replace('9961472', '8000000')],
+                          3, 'h1', 'h2', 'tcp'))
+    # Killed after one report, and one that never printed any.
+    results.add(Run(4, 'h2', 'h1', 'tcp', 0.0, 7.0, -9, 'd.txt'),
+                parse_csv(TCP_OUTPUT.splitlines()[:1], 4, 'h2', 'h1', 'tcp'))
+    results.add(Run(5, 'h3', 'h1', 'tcp', 0.0, 0.1, 0, 'e.txt'), [])
+    return results
+
+
+def test_results_select():
+    r = results()
+    assert len(r.select()) == 8
+    assert {s.run for s in r.select(protocol='udp')} == {2}
+    assert {s.run for s in r.select(src='h1', dst='h2', protocol='tcp')} == {1, 3}
+    assert len(r.select(run=1)) == 3
+
+
+def test_results_summary_and_throughput():
+    r = results()
+    summary = r.summary()
+    assert sorted(summary) == [1, 2, 3, 4]
+    assert (summary[1].start, summary[1].end) == (0.0, 2.0)
+    # For UDP the server report of the same span wins, it has the loss.
+    assert summary[2].loss == 1.124
+    assert r.throughput(protocol='tcp') == {('h1', 'h2'): (9961472 + 8000000) / 2,
+                                            ('h2', 'h1'): 9437184}
+    assert r.throughput(protocol='udp') == {('h1', 'h2'): 1036560}
+
+
+def test_results_failed():
+    assert [run.run for run in results().failed()] == [4, 5]
+
+
+def test_results_write_csv(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    results().write_csv(path)
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(Sample._fields)
+    assert len(rows) == 9
+    assert rows[1][:4] == ['1', 'h1', 'h2', 'tcp']
+
+
+def test_mesh_rounds_cover_every_pair_once():
+    hosts = ['h1', 'h2', 'h3', 'h4']
+    rounds = mesh_rounds(hosts)
+    assert len(rounds) == 3
+    pairs = [pair for pairs in rounds for pair in pairs]
+    assert sorted(pairs) == sorted((a, b) for a in hosts for b in hosts if a != b)
+    for pairs in rounds:
+        assert sorted(src for src, _ in pairs) == hosts
+        assert sorted(dst for _, dst in pairs) == hosts
@@ -0,0 +1,281 @@
+import json
+import math
+import random
+
+import networkx as nx
+
+__all__ = ["TopologySpec", "fat_tree", "leaf_spine", "waxman", "erdos_renyi",
+           "from_graph", "from_links", "from_file", "to_networkx", "link_entries"]
+
+# Link models: every value is a constant or a distribution, see sample().
+# bw in Mbit/s, delay in ms, loss in percent.
+SWITCH_LINK = {'bw': 1000, 'delay': 1, 'loss': 0, 'max_queue_size': 30}
+HOST_LINK = {'bw': 100, 'delay': 1, 'loss': 0, 'max_queue_size': 10}
+
+
+def sample(value, rnd):
+    """
+    Draw one value
+    :param value: a constant, or a dict with dist set to
+        uniform (low, high), normal (mean, std), lognormal (mean, sigma,
+        of the underlying normal) or choice (values); min and max clip it
+    :param rnd: random.Random
+    """
+    if not isinstance(value, dict):
+        return value
+    dist = value['dist']
+    if dist == 'uniform':
+        drawn = rnd.uniform(value['low'], value['high'])
+    elif dist == 'normal':
+        drawn = rnd.gauss(value['mean'], value['std'])
+    elif dist == 'lognormal':
+        drawn = rnd.lognormvariate(value['mean'], value['sigma'])
+    elif dist == 'choice':
+        drawn = rnd.choice(value['values'])
+    else:
+        raise ValueError('Unknown distribution {}'.format(dist))
+    if 'min' in value:
+        drawn = max(drawn, value['min'])
+    if 'max' in value:
+        drawn = min(drawn, value['max'])
+    if dist != 'choice':
+        drawn = max(drawn, 0)
+    return drawn
+
+
+def delay_ms(delay):
+    """Mininet style delay ('5ms', '1s', '250us') or a number of ms, in ms"""
+    if isinstance(delay, (int, float)):
+        return float(delay)
+    for suffix, scale in (('us', .001), ('ms', 1), ('s', 1000)):
+        if delay.endswith(suffix):
+            return float(delay[:-len(suffix)]) * scale
+    return float(delay)
+
+
+def link_params(model, rnd, **overrides):
+    """
+    TCLink options drawn from a link model
+    :return: dict with bw, delay (Mininet string), loss and max_queue_size
+    """
+    params = {key: sample(value, rnd) for key, value in model.items()}
+    params.update(overrides)
+    params['delay'] = '{:g}ms'.format(round(delay_ms(params.get('delay', 0)), 3))
+    if 'max_queue_size' in params:
+        params['max_queue_size'] = int(params['max_queue_size'])
+    return params
+
+
+class TopologySpec(object):
+    """
+    Switches, hosts and links of a topology with their TCLink options drawn.
+
+    Switch sN has datapath id N and host hN is the Nth host, the names
+    CustomTopo and the controller use. Links are kept as (node, node,
+    options) so a Mininet topology can add them in one pass.
+    """
+
+    def __init__(self, name='topology'):
+        self.name = name
+        self.switches = []
+        self.hosts = []
+        self.links = []
+
+    def add_switch(self):
+        self.switches.append('s{}'.format(len(self.switches) + 1))
+        return self.switches[-1]
+
+    def add_host(self):
+        self.hosts.append('h{}'.format(len(self.hosts) + 1))
+        return self.hosts[-1]
+
+    def add_link(self, a, b, params):
+        self.links.append((a, b, params))
+
+    def __repr__(self):
+        return '<{} {}: {} switches, {} hosts, {} links>'.format(
+            type(self).__name__, self.name, len(self.switches), len(self.hosts),
+            len(self.links))
+
+
+def _attach_hosts(spec, switches, hosts_per_switch, host_link, rnd):
+    for switch in switches:
+        for _ in range(hosts_per_switch):
+            spec.add_link(spec.add_host(), switch, link_params(host_link, rnd))
+
+
+def fat_tree(k=4, switch_link=SWITCH_LINK, host_link=HOST_LINK, seed=0):
+    """
+    k-ary fat tree: (k/2)^2 core switches and k pods of k/2 aggregation and
+    k/2 edge switches, k/2 hosts on every edge switch, k^3/4 hosts in all
+    """
+    if k % 2:
+        raise ValueError('fat tree arity must be even, got {}'.format(k))
+    rnd = random.Random(seed)
+    spec = TopologySpec('fat-tree-{}'.format(k))
+    half = k // 2
+    core = [spec.add_switch() for _ in range(half * half)]
+    edges = []
+    for _ in range(k):
+        aggregation = [spec.add_switch() for _ in range(half)]
+        pod_edges = [spec.add_switch() for _ in range(half)]
+        for i, agg in enumerate(aggregation):
+            for switch in core[i * half:(i + 1) * half]:
+                spec.add_link(agg, switch, link_params(switch_link, rnd))
+            for edge in pod_edges:
+                spec.add_link(edge, agg, link_params(switch_link, rnd))
+        edges += pod_edges
+    _attach_hosts(spec, edges, half, host_link, rnd)
+    return spec
+
+
+def leaf_spine(spines=2, leaves=4, hosts_per_leaf=2, switch_link=SWITCH_LINK,
+               host_link=HOST_LINK, seed=0):
+    """Every leaf switch linked to every spine switch, hosts on the leaves"""
+    rnd = random.Random(seed)
+    spec = TopologySpec('leaf-spine-{}x{}'.format(spines, leaves))
+    spine_switches = [spec.add_switch() for _ in range(spines)]
+    leaf_switches = [spec.add_switch() for _ in range(leaves)]
+    for leaf in leaf_switches:
+        for spine in spine_switches:
+            spec.add_link(leaf, spine, link_params(switch_link, rnd))
+    _attach_hosts(spec, leaf_switches, hosts_per_leaf, host_link, rnd)
+    return spec
+
+
+def _connected(graph, rnd):
+    """Join every component to the largest one with one extra edge"""
+    components = sorted(nx.connected_components(graph), key=len, reverse=True)
+    main = list(components[0])
+    for component in components[1:]:
+        graph.add_edge(rnd.choice(main), rnd.choice(list(component)))
+    return graph
+
+
+def from_graph(graph, hosts_per_switch=1, switch_link=SWITCH_LINK, host_link=HOST_LINK,
+               seed=0, name='graph', delay_scale=None):
+    """
+    Spec with one switch per node of a networkx graph
+    :param delay_scale: when set, a link's delay is the distance between the
+        pos attributes of its nodes times delay_scale ms instead of drawn
+    """
+    rnd = random.Random(seed)
+    spec = TopologySpec(name)
+    switches = {node: spec.add_switch() for node in graph.nodes}
+    for u, v in graph.edges:
+        overrides = {}
+        if delay_scale is not None and 'pos' in graph.nodes[u]:
+            overrides['delay'] = math.dist(graph.nodes[u]['pos'], graph.nodes[v]['pos']) * delay_scale
+        spec.add_link(switches[u], switches[v], link_params(switch_link, rnd, **overrides))
+    _attach_hosts(spec, switches.values(), hosts_per_switch, host_link, rnd)
+    return spec
+
+
+def waxman(switches=20, beta=0.4, alpha=0.1, hosts_per_switch=1, switch_link=SWITCH_LINK,
+           host_link=HOST_LINK, seed=0, delay_scale=None):
+    """
+    Waxman graph on the unit square, made connected. Two switches at
+    distance d are linked with probability beta * exp(-d / (alpha * L)),
+    L the largest distance, as in networkx.waxman_graph
+    :param delay_scale: ms of delay per unit of distance, drawn if None
+    """
+    rnd = random.Random(seed)
+    graph = _connected(nx.waxman_graph(switches, beta=beta, alpha=alpha, seed=seed), rnd)
+    return from_graph(graph, hosts_per_switch, switch_link, host_link, seed,
+                      'waxman-{}'.format(switches), delay_scale)
+
+
+def erdos_renyi(switches=20, p=0.1, hosts_per_switch=1, switch_link=SWITCH_LINK,
+                host_link=HOST_LINK, seed=0):
+    """G(n, p) random graph of switches, made connected"""
+    rnd = random.Random(seed)
+    graph = _connected(nx.gnp_random_graph(switches, p, seed=seed), rnd)
+    return from_graph(graph, hosts_per_switch, switch_link, host_link, seed,
+                      'erdos-renyi-{}'.format(switches))
+
+
+def from_links(switch_links, host_links, name='links'):
+    """
+    Spec from the LINKS_SWITCH_SWITCH / LINKS_SWITCH_HOST format of
+    min_env.env, switch and host numbers are kept
+    """
+    spec = TopologySpec(name)
+    numbers = set(switch_links) | set(host_links)
+    numbers |= {link['switch'] for links in switch_links.values() for link in links}
+    hosts = {link['host'] for links in host_links.values() for link in links}
+    while len(spec.switches) < max(numbers):
+        spec.add_switch()
+    while len(spec.hosts) < max(hosts, default=0):
+        spec.add_host()
+    rnd = random.Random(0)
+    for switch, links in host_links.items():
+        for link in links:
+            params = {key: value for key, value in link.items() if key != 'host'}
+            spec.add_link('h{}'.format(link['host']), 's{}'.format(switch),
+                          link_params(params, rnd))
+    for switch, links in switch_links.items():
+        for link in links:
+            params = {key: value for key, value in link.items() if key != 'switch'}
+            spec.add_link('s{}'.format(switch), 's{}'.format(link['switch']),
+                          link_params(params, rnd))
+    return spec
+
+
+GENERATORS = {
+    'fat_tree': fat_tree,
+    'leaf_spine': leaf_spine,
+    'waxman': waxman,
+    'erdos_renyi': erdos_renyi,
+}
+
+
+def from_file(path):
+    """
+    Spec from a JSON file: {"type": "fat_tree", "k": 8, ...} with the
+    arguments of one of the generators, or {"type": "links",
+    "switch_links": {...}, "host_links": {...}} in the env.py link format
+    """
+    with open(path) as f:
+        description = json.load(f)
+    kind = description.pop('type')
+    if kind == 'links':
+        def numbered(links):
+            return {int(switch): value for switch, value in links.items()}
+        return from_links(numbered(description['switch_links']),
+                          numbered(description.get('host_links', {})), path)
+    if kind not in GENERATORS:
+        raise ValueError('Unknown topology type {}, expected one of {}'.format(
+            kind, ['links'] + list(GENERATORS)))
+    return GENERATORS[kind](**description)
+
+
+def _number(name):
+    return int(name[1:])
+
+
+def to_networkx(spec, hosts=False):
+    """
+    The topology as the controller sees it: datapath ids as nodes, edges
+    with bw (Mbit/s), delay (ms) and loss (%)
+    :param hosts: also add hosts as 'hN' nodes with kind='host'
+    """
+    graph = nx.Graph(name=spec.name)
+    graph.add_nodes_from((_number(s) for s in spec.switches), kind='switch')
+    if hosts:
+        graph.add_nodes_from(spec.hosts, kind='host')
+    for a, b, params in spec.links:
+        a_host, b_host = a.startswith('h'), b.startswith('h')
+        if (a_host or b_host) and not hosts:
+            continue
+        graph.add_edge(a if a_host else _number(a), b if b_host else _number(b),
+                       bw=float(params.get('bw', 0)), delay=delay_ms(params.get('delay', 0)),
+                       loss=float(params.get('loss', 0)))
+    return graph
+
+
+def link_entries(spec):
+    """Switch to switch links in the format of env.export_link_properties"""
+    return [dict(src=_number(a), dst=_number(b), bw=params.get('bw'),
+                 delay=params.get('delay'), loss=params.get('loss', 0))
+            for a, b, params in spec.links
+            if a.startswith('s') and b.startswith('s')]
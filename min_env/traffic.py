@@ -0,0 +1,460 @@
+import csv
+import os
+import queue
+import selectors
+import threading
+import time
+from collections import namedtuple
+from subprocess import PIPE, STDOUT
+
+__all__ = ["Traffic", "Results", "Mesh", "parse_csv", "mesh_rounds"]
+
+OUTPUT_DIR = 'output'
+IPERF_PORT = 5001
+# Line buffered, so the listening banner is seen as soon as it is printed.
+# No -y C: iperf 2 does not print the banner in CSV mode, and one server
+# takes every client of its host, so its reports could not be told apart.
+# The client CSV has them all, for UDP the server report is its 14 field
+# line.
+SERVER_CMD = 'stdbuf -oL iperf -s -p {port}'
+CLIENT_CMD = 'iperf -c {server_ip} -p {port} -t {duration} -i 1 -y C'
+UDP_OPTS = ' -u'
+UDP_CLIENT_OPTS = ' -u -b {bw}'
+READY_BANNER = b'listening'
+# Seconds a server gets to print its banner, and a client gets past its
+# duration before it is killed.
+READY_TIMEOUT = 5.0
+GRACE = 5.0
+# iperf clients a host runs, and sessions its server takes, at once during a
+# full mesh.
+MESH_PER_HOST = 1
+
+# One row of iperf -y C output. jitter (ms), lost, total, loss (%) and
+# out_of_order are only in UDP server reports, None otherwise.
+Sample = namedtuple('Sample', 'run, src, dst, protocol, time, local_ip, remote_ip, '
+                              'start, end, bytes, bps, jitter, lost, total, loss, '
+                              'out_of_order')
+Run = namedtuple('Run', 'run, src, dst, protocol, started, finished, returncode, output')
+
+
+def parse_csv(lines, run=0, src=None, dst=None, protocol='tcp'):
+    """
+    Parse iperf -y C output
+    :param lines: iterable of text lines
+    :param run: run id the samples are tagged with
+    :return: list of Sample, lines that are not reports are skipped
+    """
+    samples = []
+    for row in csv.reader(lines):
+        if len(row) not in (9, 14):
+            continue
+        try:
+            start, end = (float(x) for x in row[6].split('-'))
+            udp = [float(row[9]), int(row[10]), int(row[11]), float(row[12]),
+                   int(row[13])] if len(row) == 14 else [None] * 5
+            samples.append(Sample(run, src, dst, protocol, row[0], row[1], row[3],
+                                  start, end, int(row[7]), float(row[8]), *udp))
+        except ValueError:
+            continue
+    return samples
+
+
+def mesh_rounds(hosts):
+    """
+    Full mesh of (src, dst) pairs in len(hosts) - 1 rounds, every host
+    sends to exactly one host and receives from exactly one in each round
+    """
+    count = len(hosts)
+    return [[(hosts[i], hosts[(i + shift) % count]) for i in range(count)]
+            for shift in range(1, count)]
+
+
+class Results(object):
+    """Samples and per run outcome of every iperf client"""
+
+    def __init__(self):
+        self.samples = []
+        self.runs = []
+        self._lock = threading.Lock()
+
+    def add(self, run, samples):
+        with self._lock:
+            self.runs.append(run)
+            self.samples.extend(samples)
+
+    def select(self, src=None, dst=None, protocol=None, run=None):
+        with self._lock:
+            samples = list(self.samples)
+        return [s for s in samples
+                if (src is None or s.src == src) and (dst is None or s.dst == dst)
+                and (protocol is None or s.protocol == protocol)
+                and (run is None or s.run == run)]
+
+    def summary(self, **filters):
+        """
+        Whole-run report of every run, the longest interval it printed;
+        for UDP the server report, which carries loss and jitter
+        :return: dict run id -> Sample
+        """
+        best = {}
+        for s in self.select(**filters):
+            key = (s.end - s.start, s.jitter is not None)
+            if s.run not in best or key > best[s.run][0]:
+                best[s.run] = (key, s)
+        return {run: s for run, (_, s) in best.items()}
+
+    def throughput(self, **filters):
+        """
+        :return: dict (src, dst) -> mean bits per second over its runs
+        """
+        rates = {}
+        for s in self.summary(**filters).values():
+            rates.setdefault((s.src, s.dst), []).append(s.bps)
+        return {pair: sum(r) / len(r) for pair, r in rates.items()}
+
+    def failed(self):
+        """Runs that exited with an error, were killed or printed no report"""
+        reported = {s.run for s in self.select()}
+        with self._lock:
+            return [r for r in self.runs if r.returncode or r.run not in reported]
+
+    def write_csv(self, path):
+        with open(path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(Sample._fields)
+            writer.writerows(self.select())
+
+
+class Mesh(object):
+    """
+    A full mesh running in the background. runs grows as its clients
+    start, their samples are in Traffic.results as they finish
+    """
+
+    def __init__(self, hosts, per_host):
+        self.hosts = hosts
+        self.per_host = per_host
+        self.total = len(hosts) * (len(hosts) - 1)
+        self.runs = []
+        # hosts whose server did not print its banner in time
+        self.late = []
+        self.started = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Wait until every client of the mesh finished
+        :return: True if the mesh is done
+        """
+        return self.done.wait(timeout)
+
+
+class _Stream(object):
+    """A pipe the reader thread copies into an output file"""
+
+    def __init__(self, proc, path, run=None):
+        self.proc = proc
+        self.output = open(path, 'wb')
+        self.path = path
+        self.run = run
+        self.ready = threading.Event()
+
+
+class Traffic(object):
+    """
+    Starts iperf servers and clients on Mininet hosts without polling.
+
+    Servers and clients are started with popen, so they never touch the
+    node shell sendCmd uses. One reader thread watches all their pipes
+    with a selector. It copies output into files under output_dir, marks
+    a server ready when its listening banner shows up, and, when a
+    client's pipe closes, parses its CSV into results.
+    """
+
+    def __init__(self, net, output_dir=OUTPUT_DIR, port=IPERF_PORT,
+                 ready_timeout=READY_TIMEOUT, grace=GRACE):
+        self.net = net
+        self.output_dir = output_dir
+        self.port = port
+        self.ready_timeout = ready_timeout
+        self.grace = grace
+        self.results = Results()
+        # (host name, protocol) -> server stream
+        self.servers = {}
+        # run id -> (client stream, deadline) of clients still running
+        self.running = {}
+        # full meshes started, done or not
+        self.meshes = []
+        self._runs = 0
+        self._lock = threading.Lock()
+        # notified whenever a client finishes
+        self._finish = threading.Condition(self._lock)
+        self._stopped = False
+        self._selector = None
+        self._added = queue.Queue()
+        self._wakeup = None
+        self._thread = None
+
+    def start_servers(self, hosts, protocol='tcp'):
+        """
+        Start a server on every host that has none for protocol yet, wait
+        until they all listen
+        :return: hosts whose server did not print its banner in time
+        """
+        protocol = protocol.lower()
+        started = []
+        for name in hosts:
+            with self._lock:
+                stream = self.servers.get((name, protocol))
+                new = stream is None
+                if new:
+                    cmd = SERVER_CMD.format(port=self.port)
+                    if protocol == 'udp':
+                        cmd += UDP_OPTS
+                    path = self._path('iperf-{}-server-{}.txt'.format(protocol, name))
+                    proc = self.net.get(name).popen(cmd, stdout=PIPE, stderr=STDOUT, shell=True)
+                    stream = self.servers[(name, protocol)] = _Stream(proc, path)
+            if new:
+                self._watch(stream)
+            started.append((name, stream))
+        deadline = time.time() + self.ready_timeout
+        late = []
+        for name, stream in started:
+            if (not stream.ready.wait(max(deadline - time.time(), 0))
+                    or stream.proc.poll() is not None):
+                late.append(name)
+        return late
+
+    def start_client(self, src, dst, protocol='tcp', duration=10, bw=100000):
+        """
+        Start one client, its server must be running
+        :return: run id
+        """
+        protocol = protocol.lower()
+        server = self.net.get(dst)
+        cmd = CLIENT_CMD.format(server_ip=server.IP(), port=self.port, duration=duration)
+        if protocol == 'udp':
+            cmd += UDP_CLIENT_OPTS.format(bw=bw)
+        with self._lock:
+            self._runs += 1
+            run = self._runs
+        path = self._path('iperf-{}-client-{}-{}-{}.txt'.format(protocol, src, dst, run))
+        proc = self.net.get(src).popen(cmd, stdout=PIPE, stderr=STDOUT, shell=True)
+        stream = _Stream(proc, path, Run(run, src, dst, protocol, time.time(), None, None, path))
+        with self._lock:
+            self.running[run] = (stream, time.time() + duration + self.grace)
+        self._watch(stream)
+        return run
+
+    def start(self, src, dst, protocol='tcp', duration=10, bw=100000):
+        """
+        Start a server on dst if needed and a client on src, return once
+        the client runs
+        :return: run id
+        """
+        self.start_servers([dst], protocol)
+        return self.start_client(src, dst, protocol, duration, bw)
+
+    def run(self, pairs, protocol='tcp', duration=10, bw=100000, parallel=None):
+        """
+        Run clients for pairs, at most parallel at a time, and wait for them
+        :param pairs: (src, dst) host names
+        :param parallel: clients running at once, all of them by default
+        :return: run ids
+        """
+        pairs = list(pairs)
+        self.start_servers(sorted({dst for _, dst in pairs}), protocol)
+        parallel = parallel or len(pairs)
+        runs = []
+        for src, dst in pairs:
+            self._wait_for(lambda: len(self.running) < parallel)
+            runs.append(self.start_client(src, dst, protocol, duration, bw))
+        self._wait_for(lambda: all(run not in self.running for run in runs))
+        return runs
+
+    def full_mesh(self, hosts, protocol='tcp', duration=10, bw=100000,
+                  per_host=MESH_PER_HOST, parallel=None, callback=None):
+        """
+        Every host sends to every other, started in the background. No host
+        runs more than per_host clients and per_host server sessions at a
+        time, a client starts as soon as its source and destination have a
+        slot free. Takes about (len(hosts) - 1) / per_host * duration
+        seconds, a client is killed grace seconds past its duration
+        :param per_host: clients and server sessions per host at once
+        :param parallel: clients running at once in total, no limit by default
+        :param callback: called with the mesh once it is done
+        :return: Mesh, returned right away
+        """
+        mesh = Mesh(list(hosts), per_host)
+        with self._lock:
+            self.meshes.append(mesh)
+        thread = threading.Thread(target=self._mesh, name='traffic-mesh', daemon=True,
+                                  args=(mesh, protocol, duration, bw, parallel, callback))
+        thread.start()
+        return mesh
+
+    def wait(self, timeout=None):
+        """
+        Wait until every mesh is done and every running client finished or
+        was killed at its deadline
+        :return: True if none is left running
+        """
+        end = None if timeout is None else time.time() + timeout
+        for mesh in list(self.meshes):
+            if not mesh.wait(None if end is None else max(end - time.time(), 0)):
+                return False
+        return self._wait_for(lambda: not self.running, end)
+
+    def stop(self):
+        """Kill servers and clients and stop the reader thread"""
+        with self._lock:
+            procs = [s.proc for s in self.servers.values()]
+            procs += [s.proc for s, _ in self.running.values()]
+            self.servers.clear()
+            self._stopped = True
+            self._finish.notify_all()
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+        self.wait()
+        if self._thread is not None:
+            self._added.put(None)
+            os.write(self._wakeup[1], b'x')
+            self._thread.join()
+            self._thread = None
+
+    def _mesh(self, mesh, protocol, duration, bw, parallel, callback):
+        hosts = mesh.hosts
+        per_host = mesh.per_host
+        mesh.late = self.start_servers(hosts, protocol)
+        # Destinations of every source in round order, so hosts take turns
+        # as servers the way mesh_rounds pairs them.
+        todo = {src: [] for src in hosts}
+        for pairs in mesh_rounds(hosts):
+            for src, dst in pairs:
+                todo[src].append(dst)
+        clients = dict.fromkeys(hosts, 0)
+        sessions = dict.fromkeys(hosts, 0)
+        limit = parallel or mesh.total
+        # run id -> (src, dst) of the mesh's clients still running
+        active = {}
+        while not self._stopped:
+            for src in hosts:
+                dsts = todo[src]
+                while (dsts and clients[src] < per_host and len(active) < limit
+                       and not self._stopped):
+                    dst = next((d for d in dsts if sessions[d] < per_host), None)
+                    if dst is None:
+                        break
+                    dsts.remove(dst)
+                    run = self.start_client(src, dst, protocol, duration, bw)
+                    mesh.runs.append(run)
+                    active[run] = (src, dst)
+                    clients[src] += 1
+                    sessions[dst] += 1
+            if not active:
+                break
+            self._wait_for(lambda: self._stopped or any(run not in self.running for run in active))
+            with self._lock:
+                finished = [run for run in active if run not in self.running]
+            for run in finished:
+                src, dst = active.pop(run)
+                clients[src] -= 1
+                sessions[dst] -= 1
+        mesh.finished = time.time()
+        mesh.done.set()
+        if callback is not None:
+            callback(mesh)
+
+    def _wait_for(self, predicate, end=None):
+        """
+        Wait until predicate, checked with the lock held, is true, killing
+        clients that run past their deadline
+        :return: False if end passed first
+        """
+        with self._lock:
+            while not predicate():
+                now = time.time()
+                if end is not None and now >= end:
+                    return False
+                for run, (stream, deadline) in list(self.running.items()):
+                    if deadline is not None and deadline <= now:
+                        # Its pipe closes, the reader thread finishes it.
+                        if stream.proc.poll() is None:
+                            stream.proc.kill()
+                        self.running[run] = (stream, None)
+                deadline = min((d for _, d in self.running.values() if d is not None), default=end)
+                if end is not None:
+                    deadline = min(deadline, end)
+                self._finish.wait(None if deadline is None else max(deadline - now, 0))
+        return True
+
+    def _path(self, name):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        return os.path.join(self.output_dir, name)
+
+    def _watch(self, stream):
+        with self._lock:
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wakeup = os.pipe()
+                self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+                self._thread = threading.Thread(target=self._read, name='traffic-reader',
+                                                daemon=True)
+                self._thread.start()
+        self._added.put(stream)
+        os.write(self._wakeup[1], b'x')
+
+    def _read(self):
+        selector = self._selector
+        while True:
+            for key, _ in selector.select():
+                if key.data is None:
+                    os.read(self._wakeup[0], 4096)
+                    while not self._added.empty():
+                        stream = self._added.get()
+                        if stream is None:
+                            self._close_reader()
+                            return
+                        selector.register(stream.proc.stdout, selectors.EVENT_READ, stream)
+                    continue
+                stream = key.data
+                data = os.read(key.fd, 65536)
+                if data:
+                    stream.output.write(data)
+                    if not stream.ready.is_set() and READY_BANNER in data:
+                        stream.output.flush()
+                        stream.ready.set()
+                    continue
+                selector.unregister(key.fileobj)
+                self._finished(stream)
+
+    def _finished(self, stream):
+        stream.output.close()
+        stream.proc.stdout.close()
+        returncode = stream.proc.wait()
+        stream.ready.set()
+        if stream.run is None:
+            with self._lock:
+                for key, server in list(self.servers.items()):
+                    if server is stream:
+                        del self.servers[key]
+            return
+        run = stream.run._replace(finished=time.time(), returncode=returncode)
+        with open(stream.path) as f:
+            samples = parse_csv(f, run.run, run.src, run.dst, run.protocol)
+        self.results.add(run, samples)
+        with self._lock:
+            self.running.pop(run.run, None)
+            self._finish.notify_all()
+
+    def _close_reader(self):
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                self._selector.unregister(key.fileobj)
+                self._finished(key.data)
+        self._selector.close()
+        for fd in self._wakeup:
+            os.close(fd)